@@ -0,0 +1,184 @@
+"""
+@background: turn a function into a tracked background job.
+
+    @background
+    def send_emails(name):
+        ...
+
+    job = send_emails("EmailSender")   # returns a JobHandle right away
+    job.id, job.status, job.result, job.error, job.duration
+
+Jobs run on one shared, bounded thread pool instead of a new thread per call.
+When all workers are busy and the queue is full, submitting raises PoolFull
+(so a request handler can answer 503 instead of piling up work).
+Exceptions are captured on the handle and logged, never lost.
+"""
+import functools
+import logging
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PoolFull(RuntimeError):
+    """The pool is at its limit of running + queued jobs"""
+
+
+class JobHandle:
+    """Status, timing and outcome of one background job"""
+
+    def __init__(self, name: str):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.traceback: Optional[str] = None
+        self._done = threading.Event()
+
+    @property
+    def wait_time(self) -> Optional[float]:
+        """Seconds spent in the queue"""
+        return None if self.started_at is None else self.started_at - self.submitted_at
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Seconds spent running"""
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        """Block until the job finished; return its result (RuntimeError if it failed)"""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Job {self.id} still {self.status}")
+        if self.status == "failed":
+            raise RuntimeError(f"Job {self.id} failed: {self.error}")
+        return self.result
+
+    def to_dict(self) -> Dict:
+        def rounded(value):
+            return None if value is None else round(value, 3)
+
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "wait_time": rounded(self.wait_time),
+            "duration": rounded(self.duration),
+            "result": self.result if isinstance(self.result, (str, int, float, bool, list, dict, type(None)))
+            else repr(self.result),
+            "error": self.error,
+        }
+
+
+class BackgroundPool:
+    """
+    Shared worker pool: max_workers threads and at most max_queue waiting jobs.
+    The last keep_finished finished jobs stay queryable by ID.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 100, keep_finished: int = 1000):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="background")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._jobs: "OrderedDict[str, JobHandle]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable, args: tuple = (), kwargs: Optional[Dict] = None,
+               name: Optional[str] = None) -> JobHandle:
+        """Queue func(*args, **kwargs); raises PoolFull instead of growing without limit"""
+        if not self._slots.acquire(blocking=False):
+            raise PoolFull(f"{self.max_workers} jobs running and {self.max_queue} queued")
+
+        job = JobHandle(name or getattr(func, "__name__", "job"))
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_old()
+        try:
+            self._executor.submit(self._run, job, func, args, kwargs or {})
+        except RuntimeError:
+            # Executor already shut down
+            self._slots.release()
+            with self._lock:
+                self._jobs.pop(job.id, None)
+            raise
+        return job
+
+    def _run(self, job: JobHandle, func: Callable, args, kwargs):
+        job.started_at = time.time()
+        job.status = "running"
+        try:
+            job.result = func(*args, **kwargs)
+            job.status = "completed"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.traceback = traceback.format_exc()
+            job.status = "failed"
+            logger.error(f"❌ Background job {job.name} ({job.id}) failed:\n{job.traceback}")
+        finally:
+            job.finished_at = time.time()
+            job._done.set()
+            self._slots.release()
+
+    def _forget_old(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done()]
+        for job_id in finished[:max(len(finished) - self.keep_finished, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[JobHandle]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[JobHandle]:
+        """All tracked jobs, newest first"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def stats(self) -> Dict:
+        jobs = self.jobs()
+        counts = {status: 0 for status in ("queued", "running", "completed", "failed")}
+        for job in jobs:
+            counts[job.status] += 1
+        return {"max_workers": self.max_workers, "max_queue": self.max_queue, **counts}
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+default_pool = BackgroundPool()
+
+
+def background(func: Optional[Callable] = None, *, pool: Optional[BackgroundPool] = None,
+               name: Optional[str] = None):
+    """
+    Decorator: calling the function queues it on the pool and returns a JobHandle.
+    Use as @background or @background(pool=..., name=...). The plain synchronous
+    function stays available as func.__wrapped__.
+    """
+    def decorate(target: Callable):
+        @functools.wraps(target)
+        def submit(*args, **kwargs) -> JobHandle:
+            return (pool or default_pool).submit(target, args, kwargs, name=name or target.__name__)
+        return submit
+
+    if func is not None:
+        return decorate(func)
+    return decorate
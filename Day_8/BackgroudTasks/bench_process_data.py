@@ -0,0 +1,75 @@
+"""
+Benchmark: per-record Python loop vs batched NumPy processing
+
+Usage: python bench_process_data.py [records] [batch_size]
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+
+from data_pipeline import (INPUT_COLUMNS, OUTPUT_COLUMNS, BatchWriter, generate_batches,
+                           iter_batches, transform_batch, transform_record)
+
+
+def write_input(path: str, records: int):
+    """Create a CSV input file with synthetic records"""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(INPUT_COLUMNS)
+        for batch in generate_batches(records):
+            writer.writerows([int(row[0]), row[1], int(row[2]), row[3]] for row in batch.tolist())
+
+
+def per_record_loop(source: str, output: str) -> int:
+    """The old loop shape: one record at a time, progress every 50 records"""
+    status = {"progress": 0}
+    processed = 0
+    with open(source, newline="") as f_in, open(output, "w", newline="") as f_out:
+        reader = csv.DictReader(f_in)
+        writer = csv.DictWriter(f_out, fieldnames=OUTPUT_COLUMNS)
+        writer.writeheader()
+        for i, row in enumerate(reader):
+            record = {key: float(row[key]) for key in INPUT_COLUMNS}
+            writer.writerow(transform_record(record))
+            if i % 50 == 0:
+                status["progress"] = i
+            processed += 1
+    return processed
+
+
+def batched(source: str, output: str, batch_size: int) -> int:
+    status = {"progress": 0}
+    processed = 0
+    with BatchWriter(output) as writer:
+        for batch in iter_batches(source, batch_size):
+            writer.write(transform_batch(batch))
+            processed += len(batch)
+            status["progress"] = processed
+    return processed
+
+
+def timed(label: str, func, *args) -> float:
+    started = time.perf_counter()
+    processed = func(*args)
+    elapsed = time.perf_counter() - started
+    rate = processed / elapsed
+    print(f"{label:<22} {processed:>9} records  {elapsed:8.3f}s  {rate:>12,.0f} records/s")
+    return rate
+
+
+if __name__ == "__main__":
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, "input.csv")
+        write_input(source, records)
+
+        print(f"📊 Processing {records} records (batch size {batch_size})")
+        loop_rate = timed("per-record loop", per_record_loop, source, os.path.join(folder, "loop.csv"))
+        csv_rate = timed("batched -> CSV", batched, source, os.path.join(folder, "out.csv"), batch_size)
+        db_rate = timed("batched -> SQLite", batched, source, os.path.join(folder, "out.db"), batch_size)
+
+        print(f"🚀 Speedup: {csv_rate / loop_rate:.1f}x (CSV), {db_rate / loop_rate:.1f}x (SQLite)")
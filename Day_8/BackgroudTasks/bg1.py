@@ -1,18 +1,34 @@
 from flask import Flask, jsonify
-import threading, time
+import time
+from background import PoolFull, background, default_pool
 
 app = Flask(__name__)
 
+@background
 def background_task(name):
     print(f"⏳ Background task {name} started...")
     time.sleep(5)
     print(f"✅ Background task {name} completed!")
+    return f"{name} finished"
 
 @app.route('/start-task')
 def start_task():
-    thread = threading.Thread(target=background_task, args=("EmailSender",))
-    thread.start()
-    return jsonify({"message": "Task started in background!"})
+    try:
+        job = background_task("EmailSender")
+    except PoolFull:
+        return jsonify({"error": "Too many background jobs, try again later"}), 503
+    return jsonify({"message": "Task started in background!", "job_id": job.id})
+
+@app.route('/job/<job_id>')
+def job_status(job_id):
+    job = default_pool.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs')
+def list_jobs():
+    return jsonify({"pool": default_pool.stats(), "jobs": [job.to_dict() for job in default_pool.jobs()]})
 
 if __name__ == "__main__":
     app.run(debug=True)
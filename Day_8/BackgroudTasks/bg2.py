@@ -1,10 +1,25 @@
-from flask import Flask, jsonify, request, render_template_string
+from flask import Flask, Response, jsonify, request, render_template_string, send_file
 import threading
+import queue
 import time
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from functools import partial
 import logging
-from typing import Dict
+import json
+import os
+import socket
+import sys
+import traceback
+from typing import Dict, List
+from scheduler import TaskScheduler
+from task_store import create_task_store
+from task_metrics import TaskMetrics
+from task_graph import GraphRunner, graph_progress
+from shutdown import ShutdownCoordinator, ShuttingDown
+from data_pipeline import BatchWriter, count_records, generate_batches, iter_batches, summarize, transform_batch
+from report_engine import REPORTS, run_report
+from cleanup_engine import clean_directory, empty_stats, format_bytes, incremental_vacuum, merge_stats, trim_rows
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -12,8 +27,81 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
-# In-memory storage for task status (use database in production)
-task_status: Dict[str, Dict] = {}
+# Shared task registry, so every worker process sees the same tasks
+# sqlite:///tasks.db (default) or redis://localhost:6379/0
+TASK_STORE_URL = os.environ.get('TASK_STORE_URL', 'sqlite:///tasks.db')
+task_store = create_task_store(TASK_STORE_URL, cache_ttl=float(os.environ.get('TASK_CACHE_TTL', 1.0)))
+
+# Graceful shutdown on SIGTERM: seconds to wait for running tasks, and whether they
+# stop at their next checkpoint ("interrupt", resumed on the next start) or may finish ("drain").
+# Keep the deadline below the server's graceful timeout (gunicorn: 30s), or the worker is killed first
+SHUTDOWN_DEADLINE = float(os.environ.get('SHUTDOWN_DEADLINE', 25))
+SHUTDOWN_MODE = os.environ.get('SHUTDOWN_MODE', 'interrupt')
+shutdown = ShutdownCoordinator(deadline=SHUTDOWN_DEADLINE)
+
+# Worker pool size (per process)
+TASK_WORKERS = int(os.environ.get('TASK_WORKERS', 4))
+
+# Seconds between checkpoints of long-running tasks
+CHECKPOINT_INTERVAL = float(os.environ.get('CHECKPOINT_INTERVAL', 5))
+
+# Heartbeats: a task beats every time it checks for cancellation; the beat is
+# written to its shared record at most every HEARTBEAT_INTERVAL seconds
+HEARTBEAT_INTERVAL = float(os.environ.get('HEARTBEAT_INTERVAL', 2))
+# A running task without a heartbeat for this long is reported as stuck
+HEARTBEAT_TIMEOUT = float(os.environ.get('HEARTBEAT_TIMEOUT', 30))
+# How often the watchdog looks (stuck tasks are found within TIMEOUT + INTERVAL)
+WATCHDOG_INTERVAL = float(os.environ.get('WATCHDOG_INTERVAL', 5))
+# Re-queue stuck tasks on a fresh worker thread (the stuck thread is abandoned)
+WATCHDOG_REQUEUE = os.environ.get('WATCHDOG_REQUEUE', '').lower() in ('1', 'true', 'yes')
+
+# Identifies this worker process in task records (host:pid)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Folders are absolute (next to this file unless set in the environment), so what gets
+# read, written or deleted does not depend on the directory the server was started from
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Data processing configuration
+DATA_BATCH_SIZE = int(os.environ.get('DATA_BATCH_SIZE', 10000))
+PROCESSED_FOLDER = os.path.join(APP_DIR, 'processed')  # task outputs are always written inside this folder
+# Inputs the data task may read (CSV files or SQLite databases), by name: the task data
+# names one ({"source": "orders"}), never a path. JSON, e.g. {"orders": "/srv/data/orders.db"}
+DATA_SOURCES = json.loads(os.environ.get('DATA_SOURCES', '{}'))
+
+# Cleanup policy: folder, days to keep, action ("delete", or "archive" = gzip into CLEANUP_ARCHIVE_FOLDER)
+REPORTS_FOLDER = os.path.join(APP_DIR, 'reports')
+CLEANUP_ARCHIVE_FOLDER = os.path.abspath(os.environ.get('CLEANUP_ARCHIVE_FOLDER', os.path.join(APP_DIR, 'archive')))
+CLEANUP_POLICY = [
+    (os.path.abspath(os.environ.get('CLEANUP_UPLOADS_FOLDER', os.path.join(APP_DIR, 'uploads'))),
+     int(os.environ.get('UPLOAD_RETENTION_DAYS', 30)), "archive"),
+    (os.path.abspath(os.environ.get('CLEANUP_LOGS_FOLDER', os.path.join(APP_DIR, 'logs'))),
+     int(os.environ.get('LOG_RETENTION_DAYS', 14)), "delete"),
+    (CLEANUP_ARCHIVE_FOLDER, int(os.environ.get('ARCHIVE_RETENTION_DAYS', 365)), "delete"),
+    (REPORTS_FOLDER, int(os.environ.get('REPORT_RETENTION_DAYS', 30)), "delete"),
+]
+CLEANUP_BATCH_SIZE = int(os.environ.get('CLEANUP_BATCH_SIZE', 500))
+CLEANUP_WORKERS = int(os.environ.get('CLEANUP_WORKERS', 4))
+# Email logs written by the email marketing app (bg6.py)
+EMAIL_DB = os.environ.get('EMAIL_DB', 'email_tasks.db')
+EMAIL_LOG_RETENTION_DAYS = int(os.environ.get('EMAIL_LOG_RETENTION_DAYS', 90))
+
+# Report configuration (email_logs / task store / processed orders databases); written to REPORTS_FOLDER
+REPORT_CHUNK_SIZE = int(os.environ.get('REPORT_CHUNK_SIZE', 10000))
+DEFAULT_REPORT = os.environ.get('DEFAULT_REPORT', 'email-daily')
+
+# Seconds between events on /task/<id>/stream
+TASK_STREAM_INTERVAL = float(os.environ.get('TASK_STREAM_INTERVAL', 0.5))
+
+# Scheduler configuration (shared by all workers through this SQLite file)
+SCHEDULER_DB = os.environ.get('SCHEDULER_DB', 'scheduler.db')
+# The nightly cleanup deletes and archives files (CLEANUP_POLICY), so it is opt-in:
+# NIGHTLY_CLEANUP=1, or enable the job later with PUT /schedules/nightly-cleanup
+NIGHTLY_CLEANUP = os.environ.get('NIGHTLY_CLEANUP', '').lower() in ('1', 'true', 'yes')
+DEFAULT_SCHEDULES = [
+    # name, task type, schedule, enabled
+    ("nightly-cleanup", "cleanup", {"cron": os.environ.get('NIGHTLY_CLEANUP_CRON', '0 3 * * *')}, NIGHTLY_CLEANUP),
+]
 
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
@@ -32,6 +120,10 @@ HTML_TEMPLATE = '''
         .running { background: #17a2b8; }
         .completed { background: #28a745; }
         .failed { background: #dc3545; }
+        .cancelled, .waiting { background: #6c757d; }
+        .interrupted { background: #fd7e14; }
+        .skipped { background: #adb5bd; }
+        .graph-node { margin: 5px 0 5px 15px; }
         .task-info { background: white; padding: 15px; margin: 10px 0; border-left: 4px solid #007bff; }
     </style>
 </head>
@@ -44,6 +136,14 @@ HTML_TEMPLATE = '''
         <button class="btn" onclick="startTask('report')">📊 Generate Report</button>
         <button class="btn" onclick="startTask('data')">🔄 Process Data</button>
         <button class="btn" onclick="startTask('cleanup')">🧹 Cleanup Files</button>
+        <button class="btn btn-success" onclick="startPipeline()">🔗 Process → Report → Email</button>
+    </div>
+
+    <div class="card">
+        <h2>⏰ Scheduled Jobs</h2>
+        <div id="schedulesList">
+            <p>No scheduled jobs</p>
+        </div>
     </div>
 
     <div class="card">
@@ -71,11 +171,48 @@ HTML_TEMPLATE = '''
             });
         }
 
+        function startPipeline() {
+            fetch('/start-pipeline', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({
+                    name: 'process-report-email',
+                    nodes: {
+                        process: {task_type: 'data', data: {records: 100000}},
+                        cleanup: {task_type: 'cleanup'},
+                        report: {task_type: 'report', depends_on: ['process']},
+                        email: {task_type: 'email', depends_on: ['report'], data: {emails: 20}}
+                    }
+                })
+            })
+            .then(response => response.json())
+            .then(data => {
+                alert(data.message || data.error);
+                if(data.task_id) {
+                    updateTaskList();
+                    setInterval(updateTaskList, 2000);
+                }
+            });
+        }
+
+        function renderGraphNodes(task, byId) {
+            return task.order.map(name => {
+                const node = byId[task.nodes[name].task_id] || task.nodes[name];
+                const after = task.nodes[name].depends_on.length ? ` ← ${task.nodes[name].depends_on.join(', ')}` : '';
+                return `<div class="graph-node"><span class="status ${node.status}">${node.status.toUpperCase()}</span>
+                        <strong>${name}</strong>${after} - ${node.progress || 0}%${node.result ? ' - ' + node.result : ''}</div>`;
+            }).join('');
+        }
+
         function updateTaskList() {
             fetch('/tasks')
                 .then(response => response.json())
-                .then(tasks => {
+                .then(allTasks => {
                     const tasksList = document.getElementById('tasksList');
+                    // Pipeline steps are shown inside their pipeline card
+                    const byId = {};
+                    allTasks.forEach(task => byId[task.id] = task);
+                    const tasks = allTasks.filter(task => !task.graph_id);
                     if (tasks.length === 0) {
                         tasksList.innerHTML = '<p>No active tasks</p>';
                         return;
@@ -88,206 +225,629 @@ HTML_TEMPLATE = '''
                             <p><strong>Started:</strong> ${task.start_time}</p>
                             <p><strong>Progress:</strong> ${task.progress}%</p>
                             ${task.result ? `<p><strong>Result:</strong> ${task.result}</p>` : ''}
+                            ${task.type === 'graph' ? renderGraphNodes(task, byId) : ''}
+                            ${task.download ? `<p><a href="${task.download}">⬇️ Download report</a></p>` : ''}
+                            ${task.stuck ? `<p><strong>⚠️ No heartbeat for ${task.stuck_for}s</strong>${task.requeue_count ? ` - re-queued ${task.requeue_count}x` : ''}</p>` : ''}
+                            ${task.resumed ? `<p><strong>🔁 Resumed from checkpoint</strong> (${task.resume_count}x)${task.skipped_total ? ` - skipped ${task.skipped_work} of ${task.skipped_total} already done` : ''}</p>` : ''}
                             ${task.status === 'running' ? `<p><strong>⏳ Running for:</strong> ${task.duration}s</p>` : ''}
                         </div>
                     `).join('');
                 });
         }
 
+        function updateSchedules() {
+            fetch('/schedules')
+                .then(response => response.json())
+                .then(jobs => {
+                    const list = document.getElementById('schedulesList');
+                    if (jobs.length === 0) {
+                        list.innerHTML = '<p>No scheduled jobs</p>';
+                        return;
+                    }
+
+                    list.innerHTML = jobs.map(job => `
+                        <div class="task-info">
+                            <h3>${job.name} <span class="status ${job.enabled ? 'running' : 'pending'}">${job.enabled ? 'ENABLED' : 'PAUSED'}</span></h3>
+                            <p><strong>Task:</strong> ${job.task_type}</p>
+                            <p><strong>Schedule:</strong> ${job.schedule.cron ? 'cron ' + job.schedule.cron : 'every ' + job.schedule.interval + 's'}</p>
+                            <p><strong>Last run:</strong> ${job.last_run || '-'} ${job.last_status ? '(' + job.last_status + ')' : ''}</p>
+                            <p><strong>Next run:</strong> ${job.next_run || '-'}</p>
+                            <button class="btn ${job.enabled ? 'btn-danger' : 'btn-success'}" onclick="toggleSchedule('${job.name}', ${!job.enabled})">${job.enabled ? 'Pause' : 'Resume'}</button>
+                        </div>
+                    `).join('');
+                });
+        }
+
+        function toggleSchedule(name, enabled) {
+            fetch(`/schedules/${name}`, {
+                method: 'PATCH',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({enabled: enabled})
+            }).then(() => updateSchedules());
+        }
+
         // Load tasks on page load
         updateTaskList();
+        updateSchedules();
     </script>
 </body>
 </html>
 '''
 
+def _owner_alive(owner: str) -> bool:
+    """Is the worker process that owns a task still running? (unknown hosts count as alive)"""
+    if not owner or ":" not in owner:
+        return False
+    host, pid = owner.rsplit(":", 1)
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+def processed_path(name: str) -> str:
+    """Path of a task output inside PROCESSED_FOLDER; ValueError for names that point outside it"""
+    root = os.path.realpath(PROCESSED_FOLDER)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root or path == root:
+        raise ValueError(f"output must be a file name inside {os.path.basename(PROCESSED_FOLDER)}/")
+    return path
+
 class BackgroundTaskManager:
-    def __init__(self):
+    def __init__(self, workers: int = 4, checkpoint_interval: float = 5.0,
+                 heartbeat_interval: float = 2.0, heartbeat_timeout: float = 30.0,
+                 watchdog_interval: float = 5.0, requeue_stuck: bool = False):
         self.tasks = {}
-
-    def start_task(self, task_type: str, task_data: Dict = None) -> str:
-        """Start a new background task and return its ID"""
-        task_id = str(uuid.uuid4())
-        
-        # Define task based on type
+        self.checkpoint_interval = checkpoint_interval
+        self._last_checkpoint: Dict[str, float] = {}
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.watchdog_interval = watchdog_interval
+        self.requeue_stuck = requeue_stuck
+        # Tasks running in this process, by worker thread ident
+        self._running: Dict[int, Dict] = {}
+        self._running_lock = threading.Lock()
+        self._retired = set()
+        self._current = threading.local()
+        self.graphs = GraphRunner(
+            task_store, resolve=self._resolve, enqueue=self._enqueue,
+            task_types=["email", "report", "data", "cleanup"], owner=WORKER_ID
+        )
+        # Bounded worker pool fed by a FIFO queue
+        self.queue = queue.Queue()
+        self.metrics = TaskMetrics(workers)
+        self._worker_count = 0
+        for _ in range(workers):
+            self._spawn_worker()
+        threading.Thread(target=self._watchdog_loop, name="task-watchdog", daemon=True).start()
+
+    def _spawn_worker(self):
+        threading.Thread(target=self._worker_loop, name=f"task-worker-{self._worker_count}", daemon=True).start()
+        self._worker_count += 1
+
+    def _resolve(self, task_type: str):
+        """Return (display name, target method) for a task type"""
         if task_type == "email":
-            name = "📧 Bulk Email Sender"
-            target = self._send_bulk_emails
+            return "📧 Bulk Email Sender", self._send_bulk_emails
         elif task_type == "report":
-            name = "📊 Financial Report Generator"
-            target = self._generate_report
+            return "📊 Financial Report Generator", self._generate_report
         elif task_type == "data":
-            name = "🔄 Data Processing"
-            target = self._process_data
+            return "🔄 Data Processing", self._process_data
         elif task_type == "cleanup":
-            name = "🧹 System Cleanup"
-            target = self._cleanup_files
-        else:
-            raise ValueError(f"Unknown task type: {task_type}")
+            return "🧹 System Cleanup", self._cleanup_files
+        raise ValueError(f"Unknown task type: {task_type}")
+
+    def start_task(self, task_type: str, task_data: Dict = None) -> str:
+        """Queue a new background task and return its ID"""
+        shutdown.check_accepting()
+        task_id = str(uuid.uuid4())
+        name, target = self._resolve(task_type)
 
         # Initialize task status
-        task_status[task_id] = {
+        task_store.create({
             "id": task_id,
             "name": name,
             "type": task_type,
-            "status": "running",
+            "status": "pending",
             "progress": 0,
             "start_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "result": None,
+            "owner": WORKER_ID,
+            "attempt": 0,
             "data": task_data or {}
-        }
+        })
 
-        # Start the thread
-        thread = threading.Thread(
-            target=target,
-            args=(task_id, task_data or {}),
-            daemon=True
-        )
-        thread.start()
-
-        logger.info(f"Started task {task_id}: {name}")
+        self._enqueue(task_id, task_type, task_data or {})
+        logger.info(f"Queued task {task_id}: {name}")
         return task_id
 
+    def start_graph(self, spec: Dict) -> str:
+        """Submit a task graph (pipeline) as one job and return the graph ID"""
+        shutdown.check_accepting()
+        graph_id = self.graphs.submit(spec)
+        logger.info(f"Started pipeline {graph_id} with {len(spec.get('nodes') or {})} steps")
+        return graph_id
+
+    def _enqueue(self, task_id: str, task_type: str, data: Dict, attempt: int = 0):
+        """Hand a task to the worker pool"""
+        _, target = self._resolve(task_type)
+        self.metrics.task_queued(task_type)
+        self.queue.put((task_id, task_type, target, data, attempt, time.time()))
+
+    def resume_unfinished(self) -> int:
+        """Re-queue tasks interrupted by a shutdown or left pending/running by a worker process that no longer exists"""
+        resumed = 0
+        for task in task_store.list(fresh=True):
+            if task["status"] == "interrupted":
+                pass  # released on purpose by a worker that shut down
+            elif task["status"] not in ("pending", "running") or _owner_alive(task.get("owner")):
+                continue
+            if task["type"] == "graph":
+                # Pipelines move forward when their steps finish - just take ownership
+                task_store.update(task["id"], owner=WORKER_ID)
+                continue
+            # Claim it: only one restarting worker wins the compare-and-set on the old owner
+            claimed = task_store.set_status(
+                task["id"], "pending", expected=task["status"], match={"owner": task.get("owner")},
+                owner=WORKER_ID, resumed=True, resume_count=task.get("resume_count", 0) + 1
+            )
+            if claimed:
+                self._enqueue(task["id"], task["type"], task.get("data") or {}, task.get("attempt", 0))
+                resumed += 1
+                logger.info(f"🔁 Resuming task {task['id']} ({task['name']}) left by {task.get('owner')}")
+        return resumed
+
+    def stop(self, drain: bool = False):
+        """Shutdown started: interrupt this process's queued tasks, and its running ones unless draining"""
+        statuses = ("pending",) if drain else ("pending", "running")
+        interrupted = [task["id"] for task in task_store.list(fresh=True)
+                       if task["status"] in statuses and task.get("owner") == WORKER_ID and task["type"] != "graph"]
+        for task_id in interrupted:
+            task_store.set_status(task_id, "interrupted", expected=statuses, match={"owner": WORKER_ID})
+        logger.info(f"🛑 Interrupted {len(interrupted)} tasks, they resume on the next start")
+
+    def interrupt(self, task_ids: List[str]):
+        """Tasks still running at the shutdown deadline: leave them for the next start"""
+        for task_id in task_ids:
+            task_store.set_status(task_id, "interrupted", expected="running", match={"owner": WORKER_ID})
+
+    def flush(self):
+        """Shutdown: store the latest heartbeat of tasks still running (beats are throttled in memory)"""
+        with self._running_lock:
+            running = [dict(entry) for entry in self._running.values()]
+        for entry in running:
+            if entry["beat"] > entry["stored"]:
+                task_store.set_status(entry["task_id"], None, match={"attempt": entry["attempt"]},
+                                      heartbeat=entry["beat"])
+
+    # ----- checkpoint API used by the tasks -----
+
+    def checkpoint_due(self, task_id: str) -> bool:
+        """True when the checkpoint interval has passed since the last save (always while shutting down)"""
+        if shutdown.stopping.is_set():
+            return True
+        return time.time() - self._last_checkpoint.get(task_id, 0) >= self.checkpoint_interval
+
+    def checkpoint(self, task_id: str, cursor: Dict, done: int, total: int, aggregates: Dict = None):
+        """Persist where a task is (cursor), how far it got and its partial aggregates"""
+        task_store.save_checkpoint(task_id, {
+            "cursor": cursor,
+            "done": done,
+            "total": total,
+            "aggregates": aggregates,
+            "saved_at": time.time()
+        })
+        self._last_checkpoint[task_id] = time.time()
+
+    def restore(self, task_id: str):
+        """Return the last checkpoint of a task (and note on the task how much work it skips)"""
+        state = task_store.load_checkpoint(task_id)
+        # Don't checkpoint again right away
+        self._last_checkpoint[task_id] = time.time()
+        if state:
+            task_store.update(task_id, skipped_work=state["done"], skipped_total=state["total"])
+            logger.info(f"🔁 Task {task_id} resumes at {state['done']}/{state['total']}")
+        return state
+
+    def _worker_loop(self):
+        """Take tasks off the queue and run them one at a time"""
+        ident = threading.get_ident()
+        while ident not in self._retired:
+            task_id, task_type, target, data, attempt, queued_at = self.queue.get()
+            try:
+                # Cancelled while waiting in the queue
+                started = time.time()
+                if not task_store.set_status(task_id, "running", expected="pending",
+                                             owner=WORKER_ID, attempt=attempt, heartbeat=started, stuck=False):
+                    self.metrics.task_skipped(task_type)
+                    self._notify_graph(task_store.get(task_id, fresh=True))
+                    continue
+
+                with shutdown.track(task_id):
+                    self.metrics.task_started(task_type, started - queued_at)
+                    self._current.attempt = attempt
+                    with self._running_lock:
+                        self._running[ident] = {"task_id": task_id, "type": task_type, "attempt": attempt,
+                                                "beat": started, "stored": started, "stuck": False}
+                    try:
+                        target(task_id, data)
+                    except Exception as e:
+                        task_store.set_status(task_id, "failed", match=self._attempt_match(),
+                                              result=f"Unexpected error: {str(e)}")
+                        logger.error(f"❌ Task {task_id} crashed: {str(e)}")
+                    finally:
+                        with self._running_lock:
+                            self._running.pop(ident, None)
+                        task = task_store.get(task_id, fresh=True) or {}
+                        if task.get("attempt", 0) != attempt:
+                            # The watchdog re-queued this task; the newer attempt owns it now
+                            logger.warning(f"⚠️ Abandoned attempt {attempt} of task {task_id} finally returned")
+                            self.metrics.task_finished(task_type, "failed", time.time() - started)
+                        else:
+                            status = task.get("status", "failed")
+                            if status in ("completed", "failed", "cancelled"):
+                                task_store.delete_checkpoint(task_id)
+                            self._last_checkpoint.pop(task_id, None)
+                            self.metrics.task_finished(task_type, status, time.time() - started)
+                            self._notify_graph(task)
+            finally:
+                self.queue.task_done()
+
+    def _attempt_match(self) -> Dict:
+        """Match for writes from the current worker thread: only while its attempt still owns the task"""
+        return {"attempt": getattr(self._current, "attempt", 0)}
+
+    # ----- heartbeats and watchdog -----
+
+    def _heartbeat(self, task_id: str):
+        """Note that the current worker thread is alive (throttled write to the shared record)"""
+        now = time.time()
+        with self._running_lock:
+            entry = self._running.get(threading.get_ident())
+            if entry is None or entry["task_id"] != task_id:
+                return
+            entry["beat"] = now
+            recovered = entry["stuck"]
+            entry["stuck"] = False
+            if not recovered and now - entry["stored"] < self.heartbeat_interval:
+                return
+            entry["stored"] = now
+        fields = {"heartbeat": now}
+        if recovered:
+            logger.info(f"💓 Task {task_id} is sending heartbeats again")
+            fields["stuck"] = False
+        task_store.set_status(task_id, None, expected="running", match=self._attempt_match(), **fields)
+
+    def _watchdog_loop(self):
+        while True:
+            time.sleep(self.watchdog_interval)
+            try:
+                self.check_stuck()
+            except Exception as e:
+                logger.error(f"❌ Watchdog check failed: {str(e)}")
+
+    def check_stuck(self) -> List[str]:
+        """Flag running tasks whose heartbeat is stale, with a stack dump of their worker thread"""
+        now = time.time()
+        with self._running_lock:
+            stale = [(ident, dict(entry)) for ident, entry in self._running.items()
+                     if not entry["stuck"] and now - entry["beat"] > self.heartbeat_timeout]
+            for ident, _ in stale:
+                self._running[ident]["stuck"] = True
+
+        frames = sys._current_frames()
+        flagged = []
+        for ident, entry in stale:
+            task_id, silent = entry["task_id"], now - entry["beat"]
+            frame = frames.get(ident)
+            stack = "".join(traceback.format_stack(frame)[-20:]) if frame else "(thread has exited)\n"
+            logger.warning(f"⚠️ Task {task_id} sent no heartbeat for {silent:.0f}s - worker thread stack:\n{stack}")
+            self.metrics.task_stuck(entry["type"])
+            task_store.set_status(
+                task_id, None, expected="running", match={"attempt": entry["attempt"]},
+                stuck=True, stuck_for=round(silent, 1), stuck_at=now, stack=stack
+            )
+            flagged.append(task_id)
+            if self.requeue_stuck:
+                self._requeue(ident, entry)
+        return flagged
+
+    def _requeue(self, ident: int, entry: Dict):
+        """Give a stuck task to a fresh worker thread; the stuck thread exits if it ever returns"""
+        task = task_store.get(entry["task_id"], fresh=True) or {}
+        attempt = entry["attempt"] + 1
+        claimed = task_store.set_status(
+            entry["task_id"], "pending", expected="running", match={"attempt": entry["attempt"]},
+            attempt=attempt, owner=WORKER_ID, requeue_count=task.get("requeue_count", 0) + 1
+        )
+        if claimed:
+            with self._running_lock:
+                self._running.pop(ident, None)
+            self._retired.add(ident)
+            self._spawn_worker()
+            self._enqueue(entry["task_id"], entry["type"], task.get("data") or {}, attempt)
+            logger.info(f"🔁 Re-queued stuck task {entry['task_id']} as attempt {attempt}")
+
+    def _notify_graph(self, task: Dict):
+        """Let the pipeline of a finished step queue its dependents (or skip them on failure)"""
+        if task and task.get("graph_id") and task.get("status") in ("completed", "failed", "cancelled"):
+            try:
+                self.graphs.node_finished(task)
+            except Exception as e:
+                logger.error(f"❌ Pipeline {task['graph_id']} update failed: {str(e)}")
+
     def _send_bulk_emails(self, task_id: str, data: Dict):
         """Simulate sending bulk emails"""
         try:
             emails = data.get('emails', 100)
+            state = self.restore(task_id)
+            first = state["cursor"]["next"] if state else 0
             logger.info(f"⏳ Starting bulk email send for {emails} emails...")
             
-            for i in range(emails):
-                if task_status[task_id]["status"] == "cancelled":
+            for i in range(first, emails):
+                if self._is_cancelled(task_id):
                     break
                     
                 # Simulate email sending
                 time.sleep(0.1)
                 progress = (i + 1) / emails * 100
-                task_status[task_id]["progress"] = round(progress, 1)
+                task_store.update(task_id, progress=round(progress, 1))
+                if self.checkpoint_due(task_id):
+                    self.checkpoint(task_id, {"next": i + 1}, i + 1, emails)
                 
                 # Simulate occasional failures
                 if i == int(emails * 0.8):  # 80% through
                     logger.info("📨 Simulating email server delay...")
                     time.sleep(2)
 
-            task_status[task_id].update({
-                "status": "completed",
-                "progress": 100,
-                "result": f"Successfully sent {emails} emails"
-            })
-            logger.info(f"✅ Bulk email task {task_id} completed!")
+            attachments = [value["report"] for value in (data.get('inputs') or {}).values()
+                           if isinstance(value, dict) and value.get("report")]
+            if task_store.set_status(
+                task_id, "completed", expected="running", match=self._attempt_match(),
+                progress=100,
+                result=f"Successfully sent {emails} emails" + (f" with {', '.join(attachments)}" if attachments else ""),
+                output={"sent": emails, "attachments": attachments}
+            ):
+                logger.info(f"✅ Bulk email task {task_id} completed!")
 
         except Exception as e:
-            task_status[task_id].update({
-                "status": "failed",
-                "result": f"Failed: {str(e)}"
-            })
+            task_store.set_status(task_id, "failed", match=self._attempt_match(), result=f"Failed: {str(e)}")
             logger.error(f"❌ Email task {task_id} failed: {str(e)}")
 
     def _generate_report(self, task_id: str, data: Dict):
-        """Simulate generating a complex report"""
+        """Stream aggregates from a SQLite database into a CSV/JSON report, chunk by chunk"""
         try:
-            logger.info("⏳ Generating financial report...")
-            
-            steps = ["Collecting data", "Processing numbers", "Generating charts", "Creating PDF"]
-            for i, step in enumerate(steps):
-                if task_status[task_id]["status"] == "cancelled":
-                    break
-                    
-                logger.info(f"📊 {step}...")
-                time.sleep(1.5)
-                task_status[task_id]["progress"] = (i + 1) / len(steps) * 100
-                task_status[task_id]["result"] = f"Current: {step}"
-
-            task_status[task_id].update({
-                "status": "completed",
-                "progress": 100,
-                "result": "Financial report generated: Q3-2024-Report.pdf"
-            })
-            logger.info(f"✅ Report generation {task_id} completed!")
+            # A SQLite output of an upstream data step (pipeline) becomes the orders source;
+            # only outputs inside PROCESSED_FOLDER are read
+            upstream = [processed_path(value["path"]) for value in (data.get('inputs') or {}).values()
+                        if isinstance(value, dict) and str(value.get("path", "")).endswith(".db")]
+            report = data.get('report') or ("orders-by-bucket" if upstream else DEFAULT_REPORT)
+            if report not in REPORTS:
+                raise ValueError(f"Unknown report: {report}")
+            definition = REPORTS[report]
+            # Databases are chosen by name ({"source": "email"}), never by a path from the request
+            sources = {**DATA_SOURCES, "email": EMAIL_DB, "tasks": getattr(task_store, "database", None)}
+            if 'database' in data:
+                raise ValueError("Reports take a named source, not a database path")
+            source = data.get('source')
+            if source is not None and source not in sources:
+                raise ValueError(f"Unknown report source: {source}")
+            database = sources[source] if source else (upstream[0] if upstream else sources.get(definition["source"]))
+            if not database:
+                raise ValueError(f"No database configured for the {report} report")
+
+            fmt = data.get('format', 'csv')
+            output = os.path.join(REPORTS_FOLDER, f"{task_id}.{fmt}")
+            logger.info(f"⏳ Generating report '{definition['title']}' from {database}...")
+
+            def on_progress(done, total):
+                task_store.update(task_id, progress=round(done / total * 100, 1) if total else 100,
+                                  result=f"Current: {done}/{total} rows")
+
+            stats = run_report(database, definition, output, fmt, chunk_size=int(data.get('chunk_size', REPORT_CHUNK_SIZE)),
+                               should_stop=lambda: self._is_cancelled(task_id), on_progress=on_progress)
+            if stats is None:
+                task_store.update(task_id, result="Report cancelled")
+                return
+
+            if task_store.set_status(
+                task_id, "completed", expected="running", match=self._attempt_match(),
+                progress=100,
+                result=f"{definition['title']} report generated: {os.path.basename(output)} "
+                       f"({stats['rows']} rows -> {stats['lines']} lines)",
+                download=f"/reports/{task_id}/download",
+                output={"report": os.path.basename(output), "path": output, "records": stats["rows"]}
+            ):
+                logger.info(f"✅ Report generation {task_id} completed!")
 
         except Exception as e:
-            task_status[task_id].update({
-                "status": "failed",
-                "result": f"Report generation failed: {str(e)}"
-            })
+            task_store.set_status(task_id, "failed", match=self._attempt_match(), result=f"Report generation failed: {str(e)}")
 
     def _process_data(self, task_id: str, data: Dict):
-        """Simulate data processing"""
+        """Process records in fixed-size batches with vectorized NumPy transforms"""
         try:
-            records = data.get('records', 500)
-            logger.info(f"⏳ Processing {records} records...")
-            
-            for i in range(records):
-                if task_status[task_id]["status"] == "cancelled":
-                    break
-                    
-                if i % 50 == 0:  # Update progress every 50 records
-                    progress = (i + 1) / records * 100
-                    task_status[task_id]["progress"] = round(progress, 1)
-                
-                # Simulate record processing
-                time.sleep(0.02)
+            source = data.get('source')
+            if source is not None:
+                if source not in DATA_SOURCES:
+                    raise ValueError(f"Unknown data source: {source}")
+                source = DATA_SOURCES[source]
+            table = data.get('table', 'records')
+            batch_size = int(data.get('batch_size', DATA_BATCH_SIZE))
+            output = processed_path(data.get('output') or f"{task_id}.csv")
+
+            # Resume after the last checkpointed batch
+            state = self.restore(task_id)
+            start = state["cursor"]["records"] if state else 0
+            totals = state["aggregates"] if state else None
+            resume_at = state["cursor"]["output_position"] if state else None
+
+            if source:
+                records = count_records(source, table)
+                batches = iter_batches(source, batch_size, table, start=start)
+            else:
+                records = int(data.get('records', 500))
+                batches = generate_batches(records, batch_size, start=start)
+            logger.info(f"⏳ Processing {records - start} records in batches of {batch_size}...")
+
+            started = time.time()
+            with BatchWriter(output, resume_at=resume_at) as writer:
+                for batch in batches:
+                    if self._is_cancelled(task_id):
+                        break
 
-            task_status[task_id].update({
-                "status": "completed",
-                "progress": 100,
-                "result": f"Processed {records} data records successfully"
-            })
-            logger.info(f"✅ Data processing {task_id} completed!")
+                    result = transform_batch(batch)
+                    writer.write(result)
+                    totals = summarize(result, totals)
+
+                    # Update progress once per batch
+                    progress = totals["records"] / records * 100 if records else 100
+                    task_store.update(task_id, progress=round(progress, 1))
+                    if self.checkpoint_due(task_id):
+                        cursor = {"records": totals["records"], "output_position": writer.position()}
+                        self.checkpoint(task_id, cursor, totals["records"], records, aggregates=totals)
+
+            processed = totals["records"] if totals else 0
+            rate = (processed - start) / max(time.time() - started, 1e-6)
+            task_store.update(task_id, totals=totals)
+
+            if self._is_cancelled(task_id):
+                task_store.update(task_id, result=f"Cancelled after {processed} of {records} records")
+                return
+
+            if task_store.set_status(
+                task_id, "completed", expected="running", match=self._attempt_match(),
+                progress=100,
+                result=f"Processed {processed} data records successfully ({rate:,.0f} records/s) -> {output}",
+                output={"path": output, "totals": totals}
+            ):
+                logger.info(f"✅ Data processing {task_id} completed!")
 
         except Exception as e:
-            task_status[task_id].update({
-                "status": "failed",
-                "result": f"Data processing failed: {str(e)}"
-            })
+            task_store.set_status(task_id, "failed", match=self._attempt_match(), result=f"Data processing failed: {str(e)}")
+
+    def _cleanup_phases(self) -> list:
+        """(label, run) for every cleanup step; run(should_stop=..., on_batch=...) returns stats"""
+        phases = []
+        for folder, days, action in CLEANUP_POLICY:
+            verb = "Archiving" if action == "archive" else "Removing"
+            phases.append((f"{verb} files older than {days} days in {folder}", partial(
+                clean_directory, folder, days, action, archive_folder=CLEANUP_ARCHIVE_FOLDER,
+                batch_size=CLEANUP_BATCH_SIZE, workers=CLEANUP_WORKERS
+            )))
+
+        # sent_at is written by SQLite's CURRENT_TIMESTAMP (UTC)
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=EMAIL_LOG_RETENTION_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+        phases.append((f"Trimming email logs older than {EMAIL_LOG_RETENTION_DAYS} days",
+                       partial(trim_rows, EMAIL_DB, "email_logs", "sent_at", cutoff)))
+
+        databases = [EMAIL_DB, SCHEDULER_DB, getattr(task_store, "database", None)]
+        for database in dict.fromkeys(filter(None, databases)):
+            phases.append((f"Vacuuming {database}", partial(incremental_vacuum, database)))
+        return phases
 
     def _cleanup_files(self, task_id: str, data: Dict):
-        """Simulate system cleanup"""
+        """Delete/archive expired files, trim old email logs and vacuum the SQLite databases"""
         try:
             logger.info("⏳ Starting system cleanup...")
-            
-            cleanup_tasks = [
-                ("Cleaning temp files", 2),
-                ("Optimizing database", 3),
-                ("Removing old logs", 1),
-                ("Clearing cache", 2)
-            ]
-            
-            for i, (task_name, duration) in enumerate(cleanup_tasks):
-                if task_status[task_id]["status"] == "cancelled":
+            phases = self._cleanup_phases()
+
+            # Resume after the last finished phase
+            state = self.restore(task_id)
+            first = state["cursor"]["phase"] if state else 0
+            stats = state["aggregates"] if state else empty_stats()
+
+            for i, (label, run) in enumerate(phases):
+                if i < first:
+                    continue
+                if self._is_cancelled(task_id):
                     break
-                    
-                logger.info(f"🧹 {task_name}...")
-                task_status[task_id]["result"] = f"Current: {task_name}"
-                
-                for j in range(duration):
-                    if task_status[task_id]["status"] == "cancelled":
-                        break
-                    time.sleep(1)
-                    overall_progress = (i + (j + 1) / duration) / len(cleanup_tasks) * 100
-                    task_status[task_id]["progress"] = round(overall_progress, 1)
-
-            task_status[task_id].update({
-                "status": "completed",
-                "progress": 100,
-                "result": "System cleanup completed successfully"
-            })
-            logger.info(f"✅ Cleanup task {task_id} completed!")
+
+                logger.info(f"🧹 {label}...")
+                task_store.update(task_id, result=f"Current: {label}")
+
+                def on_batch(phase_stats, label=label, done=stats):
+                    current = merge_stats(done, phase_stats)
+                    task_store.update(task_id, cleanup=current, result=(
+                        f"Current: {label} - {current['files_scanned']} files scanned, "
+                        f"{format_bytes(current['bytes_reclaimed'])} reclaimed"
+                    ))
+
+                stats = merge_stats(stats, run(should_stop=lambda: self._is_cancelled(task_id), on_batch=on_batch))
+                if self._is_cancelled(task_id):
+                    # Phase stopped half way: repeat it on resume (already removed files are not counted twice)
+                    self.checkpoint(task_id, {"phase": i}, i, len(phases), aggregates=stats)
+                    break
+                task_store.update(task_id, progress=round((i + 1) / len(phases) * 100, 1), cleanup=stats)
+                self.checkpoint(task_id, {"phase": i + 1}, i + 1, len(phases), aggregates=stats)
+
+            summary = (f"{format_bytes(stats['bytes_reclaimed'])} reclaimed: {stats['files_deleted']} files deleted, "
+                       f"{stats['files_archived']} archived, {stats['rows_deleted']} log rows trimmed")
+            if stats["errors"]:
+                summary += f", {stats['errors']} files could not be removed"
+
+            if self._is_cancelled(task_id):
+                task_store.update(task_id, result=f"Cancelled - {summary}")
+                return
+
+            if task_store.set_status(
+                task_id, "completed", expected="running", match=self._attempt_match(),
+                progress=100,
+                result=f"System cleanup completed - {summary}",
+                output=stats
+            ):
+                logger.info(f"✅ Cleanup task {task_id} completed! {summary}")
 
         except Exception as e:
-            task_status[task_id].update({
-                "status": "failed",
-                "result": f"Cleanup failed: {str(e)}"
-            })
+            task_store.set_status(task_id, "failed", match=self._attempt_match(), result=f"Cleanup failed: {str(e)}")
+
+    def _is_cancelled(self, task_id: str) -> bool:
+        """Check the shared store, so a cancel from any worker is seen (also sends a heartbeat)"""
+        self._heartbeat(task_id)
+        task = task_store.get(task_id, fresh=True)
+        # A re-queued task belongs to its newer attempt: the old thread stops too
+        return task is None or task["status"] in ("cancelled", "interrupted") or \
+            task.get("attempt", 0) != getattr(self._current, "attempt", 0)
 
     def cancel_task(self, task_id: str):
-        """Cancel a running task"""
-        if task_id in task_status and task_status[task_id]["status"] == "running":
-            task_status[task_id]["status"] = "cancelled"
-            return True
-        return False
+        """Cancel a queued or running task (or a whole pipeline)"""
+        task = task_store.get(task_id, fresh=True)
+        if task and task["type"] == "graph":
+            return self.graphs.cancel(task_id)
+        return task_store.set_status(task_id, "cancelled", expected=("pending", "running", "waiting"))
 
 # Initialize task manager
-task_manager = BackgroundTaskManager()
+task_manager = BackgroundTaskManager(
+    workers=TASK_WORKERS,
+    checkpoint_interval=CHECKPOINT_INTERVAL,
+    heartbeat_interval=HEARTBEAT_INTERVAL,
+    heartbeat_timeout=HEARTBEAT_TIMEOUT,
+    watchdog_interval=WATCHDOG_INTERVAL,
+    requeue_stuck=WATCHDOG_REQUEUE
+)
+task_manager.resume_unfinished()
+
+# Initialize scheduler for periodic maintenance jobs
+scheduler = TaskScheduler(
+    launcher=task_manager.start_task,
+    is_running=lambda task_id: (task_store.get(task_id, fresh=True) or {}).get("status") in ("pending", "running"),
+    database=SCHEDULER_DB
+)
+for job_name, job_type, job_schedule, job_enabled in DEFAULT_SCHEDULES:
+    scheduler.add_job(job_name, job_type, job_schedule, enabled=job_enabled)
+scheduler.start()
+
+# Graceful shutdown: stop taking tasks, let running ones checkpoint (or finish), resume them next start
+shutdown.on_stop(scheduler.stop)
+shutdown.on_stop(lambda: task_manager.stop(drain=SHUTDOWN_MODE == "drain"))
+shutdown.on_unfinished(task_manager.interrupt)
+# Then write out what is buffered: heartbeats, and the task store's WAL (task records and checkpoints)
+shutdown.on_flush(task_manager.flush)
+shutdown.on_flush(task_store.flush)
+shutdown.install()
 
 @app.route('/')
 def index():
@@ -306,24 +866,50 @@ def start_task():
         return jsonify({
             "message": f"Background task started successfully!",
             "task_id": task_id,
-            "status": "running"
+            "status": "pending"
         }), 202
         
+    except ShuttingDown as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@app.route('/start-pipeline', methods=['POST'])
+def start_pipeline():
+    """Start a task graph: {"name": ..., "nodes": {name: {"task_type", "data", "depends_on"}}}"""
+    try:
+        graph_id = task_manager.start_graph(request.get_json() or {})
+        return jsonify({
+            "message": "Pipeline started successfully!",
+            "task_id": graph_id,
+            "status": "running"
+        }), 202
+
+    except ShuttingDown as e:
+        return jsonify({"error": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+def _with_graph_progress(task: Dict, tasks_by_id: Dict[str, Dict]) -> Dict:
+    """Pipeline progress = average progress of its steps"""
+    if task["type"] == "graph" and task["status"] == "running":
+        task["progress"] = graph_progress(task, tasks_by_id)
+    return task
+
 @app.route('/tasks', methods=['GET'])
 def get_tasks():
     """Get status of all tasks"""
     tasks = []
-    for task_id, task_info in task_status.items():
+    all_tasks = task_store.list()
+    tasks_by_id = {task["id"]: task for task in all_tasks}
+    for task_info in all_tasks:
         # Calculate duration for running tasks
         duration = None
         if task_info["status"] == "running":
             start_time = datetime.strptime(task_info["start_time"], "%Y-%m-%d %H:%M:%S")
             duration = int((datetime.now() - start_time).total_seconds())
         
-        task_data = task_info.copy()
+        task_data = _with_graph_progress(task_info.copy(), tasks_by_id)
         task_data["duration"] = duration
         tasks.append(task_data)
     
@@ -334,10 +920,52 @@ def get_tasks():
 @app.route('/task/<task_id>', methods=['GET'])
 def get_task_status(task_id):
     """Get status of a specific task"""
-    if task_id not in task_status:
+    task = task_store.get(task_id)
+    if task is None:
         return jsonify({"error": "Task not found"}), 404
+
+    if task["type"] == "graph":
+        steps = {node["task_id"]: task_store.get(node["task_id"]) or {} for node in task["nodes"].values()}
+        task = _with_graph_progress(task, steps)
+        task["steps"] = {name: steps[node["task_id"]] for name, node in task["nodes"].items()}
     
-    return jsonify(task_status[task_id])
+    return jsonify(task)
+
+@app.route('/task/<task_id>/stream', methods=['GET'])
+def stream_task(task_id):
+    """Server-sent events: the task record every time it changes, until the task is finished"""
+    if task_store.get(task_id) is None:
+        return jsonify({"error": "Task not found"}), 404
+
+    def events():
+        last = None
+        while True:
+            task = task_store.get(task_id, fresh=True)
+            if task is None:
+                break
+            payload = json.dumps(task)
+            if payload != last:
+                yield f"data: {payload}\n\n"
+                last = payload
+            if task["status"] in ("completed", "failed", "cancelled", "skipped"):
+                break
+            time.sleep(TASK_STREAM_INTERVAL)
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/reports/<task_id>/download', methods=['GET'])
+def download_report(task_id):
+    """Stream a finished report file"""
+    task = task_store.get(task_id)
+    if task is None or task["type"] != "report" or task["status"] != "completed":
+        return jsonify({"error": "Report not found or not finished"}), 404
+
+    path = (task.get("output") or {}).get("path")
+    if not path or not os.path.exists(path):
+        return jsonify({"error": "Report file no longer exists"}), 404
+
+    # send_file streams the file in blocks (and answers Range / conditional requests)
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=os.path.basename(path))
 
 @app.route('/task/<task_id>/cancel', methods=['POST'])
 def cancel_task(task_id):
@@ -345,20 +973,48 @@ def cancel_task(task_id):
     if task_manager.cancel_task(task_id):
         return jsonify({"message": f"Task {task_id} cancelled successfully"})
     else:
-        return jsonify({"error": "Task not found or not running"}), 404
+        return jsonify({"error": "Task not found or already finished"}), 404
+
+@app.route('/schedules', methods=['GET'])
+def list_schedules():
+    """List scheduled jobs with their last and next run times"""
+    return jsonify(scheduler.list_jobs())
+
+@app.route('/schedules/<name>', methods=['PUT', 'PATCH'])
+def update_schedule(name):
+    """Edit a scheduled job (interval or cron, enabled, task_data)"""
+    try:
+        job = scheduler.update_job(name, request.get_json() or {})
+        return jsonify(job)
+    except KeyError:
+        return jsonify({"error": "Schedule not found"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    active_tasks = sum(1 for task in task_status.values() if task["status"] == "running")
-    
+    """Health check endpoint (reads counters only, no task scan)"""
+    metrics = task_manager.metrics.snapshot()
+
     return jsonify({
-        "status": "healthy",
-        "active_tasks": active_tasks,
-        "total_tasks": len(task_status),
+        "status": "healthy" if shutdown.accepting else "shutting down",
+        "active_tasks": metrics["workers"]["busy"],
+        "queued_tasks": metrics["queue_depth"],
+        "stuck_tasks": metrics["stuck_tasks"],
+        "workers": metrics["workers"],
         "timestamp": datetime.now().isoformat()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Queue and worker metrics: Prometheus text by default, JSON with ?format=json"""
+    wants_json = request.args.get('format') == 'json' or \
+        request.accept_mimetypes.best_match(['text/plain', 'application/json']) == 'application/json'
+    if wants_json:
+        return jsonify(task_manager.metrics.snapshot())
+
+    return Response(task_manager.metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == "__main__":
     print("🚀 Background Task Manager Started!")
     print("📊 Access the dashboard at: http://localhost:5000")
@@ -9,7 +9,10 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
+import socket
 from typing import Dict, List
+from task_store import create_task_store
+from shutdown import ShutdownCoordinator
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -29,8 +32,19 @@ EMAIL_CONFIG = {
     'sender_password': 'zqca jhdk kjdf ksnn'  # Your app password # your 16 digit apppassword from google
 }
 
-# In-memory storage for task status
-task_status: Dict[str, Dict] = {}
+# Shared task registry (stored next to the email tables by default)
+# so every worker process sees the same campaigns
+TASK_STORE_URL = os.environ.get('TASK_STORE_URL', f'sqlite:///{DATABASE}')
+task_store = create_task_store(TASK_STORE_URL, cache_ttl=float(os.environ.get('TASK_CACHE_TTL', 1.0)))
+
+# Identifies this worker process in task records (host:pid)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# On SIGTERM running campaigns stop after the email in flight, save their cursor
+# and continue on the next start (wait at most SHUTDOWN_DEADLINE seconds, below the
+# server's graceful timeout - gunicorn: 30s - or the worker is killed first)
+SHUTDOWN_DEADLINE = float(os.environ.get('SHUTDOWN_DEADLINE', 25))
+shutdown = ShutdownCoordinator(deadline=SHUTDOWN_DEADLINE)
 
 def init_database():
     """Initialize the SQLite database"""
@@ -87,6 +101,7 @@ HTML_TEMPLATE = '''
         .running { background: #17a2b8; }
         .completed { background: #28a745; }
         .failed { background: #dc3545; }
+        .interrupted { background: #fd7e14; }
         .task-info { background: #f8f9fa; padding: 15px; margin: 10px 0; border-left: 4px solid #007bff; }
         table { width: 100%; border-collapse: collapse; margin: 10px 0; }
         th, td { padding: 12px; text-align: left; border-bottom: 1px solid #ddd; }
@@ -424,9 +439,10 @@ class EmailTaskManager:
 
     def start_email_task(self, subject: str, message: str) -> str:
         """Start a bulk email task"""
+        shutdown.check_accepting()
         task_id = str(uuid.uuid4())
         
-        task_status[task_id] = {
+        task_store.create({
             "id": task_id,
             "name": f"📧 Bulk Email: {subject}",
             "type": "bulk_email",
@@ -434,52 +450,83 @@ class EmailTaskManager:
             "progress": 0,
             "start_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "result": None,
+            "owner": WORKER_ID,
             "subject": subject,
             "message": message,
             "emails_processed": 0,
             "emails_total": 0,
             "emails_success": 0,
             "emails_failed": 0
-        }
-
-        thread = threading.Thread(
-            target=self._send_bulk_emails,
-            args=(task_id, subject, message),
-            daemon=True
-        )
-        thread.start()
+        })
 
+        self._launch(task_id, subject, message)
         logger.info(f"Started bulk email task {task_id}")
         return task_id
 
+    def _launch(self, task_id: str, subject: str, message: str):
+        def run():
+            with shutdown.track(task_id):
+                self._send_bulk_emails(task_id, subject, message)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def resume_unfinished(self) -> int:
+        """Continue campaigns interrupted by a shutdown from their saved cursor"""
+        resumed = 0
+        for task in task_store.list(fresh=True):
+            if task["status"] != "interrupted" or task.get("type") != "bulk_email":
+                continue
+            # Only one starting worker wins the compare-and-set on the old owner
+            if task_store.set_status(task["id"], "running", expected="interrupted", match={"owner": task.get("owner")},
+                                     owner=WORKER_ID, resumed=True):
+                self._launch(task["id"], task["subject"], task["message"])
+                resumed += 1
+                logger.info(f"🔁 Resuming bulk email task {task['id']} after {task.get('emails_processed', 0)} emails")
+        return resumed
+
+    def stop(self):
+        """Shutdown started: running campaigns of this process stop after the email in flight"""
+        for task in task_store.list(fresh=True):
+            if task["status"] == "running" and task.get("owner") == WORKER_ID:
+                task_store.set_status(task["id"], "interrupted", expected="running", match={"owner": WORKER_ID})
+
+    def _is_cancelled(self, task_id: str) -> bool:
+        """Check the shared store, so a cancel from any worker is seen"""
+        task = task_store.get(task_id, fresh=True)
+        return task is None or task["status"] in ("cancelled", "interrupted")
+
     def _send_bulk_emails(self, task_id: str, subject: str, message: str):
         """Send bulk emails to all recipients in database"""
         try:
+            # Cursor of an interrupted run: continue after the last email handled
+            state = task_store.load_checkpoint(task_id) or {"last_id": 0, "processed": 0, "success": 0, "failed": 0}
+
             conn = get_db_connection()
             emails = conn.execute(
-                'SELECT email, name FROM emails WHERE is_active = 1'
+                'SELECT id, email, name FROM emails WHERE is_active = 1 AND id > ? ORDER BY id',
+                (state["last_id"],)
             ).fetchall()
             conn.close()
 
-            total_emails = len(emails)
-            task_status[task_id]["emails_total"] = total_emails
+            total_emails = state["processed"] + len(emails)
+            task_store.update(task_id, emails_total=total_emails)
 
             if total_emails == 0:
-                task_status[task_id].update({
-                    "status": "completed",
-                    "progress": 100,
-                    "result": "No emails found in database"
-                })
+                task_store.set_status(
+                    task_id, "completed", expected="running",
+                    progress=100,
+                    result="No emails found in database"
+                )
                 logger.info("No emails found in database for sending")
                 return
 
             logger.info(f"⏳ Starting bulk email send to {total_emails} recipients...")
 
-            success_count = 0
-            fail_count = 0
+            success_count = state["success"]
+            fail_count = state["failed"]
 
-            for index, email_row in enumerate(emails):
-                if task_status[task_id]["status"] == "cancelled":
+            for index, email_row in enumerate(emails, start=state["processed"]):
+                if self._is_cancelled(task_id):
                     break
 
                 email = email_row['email']
@@ -510,32 +557,44 @@ class EmailTaskManager:
 
                 # Update progress
                 progress = (index + 1) / total_emails * 100
-                task_status[task_id]["progress"] = round(progress, 1)
-                task_status[task_id]["emails_processed"] = index + 1
-                task_status[task_id]["emails_success"] = success_count
-                task_status[task_id]["emails_failed"] = fail_count
+                task_store.update(
+                    task_id,
+                    progress=round(progress, 1),
+                    emails_processed=index + 1,
+                    emails_success=success_count,
+                    emails_failed=fail_count
+                )
+                task_store.save_checkpoint(task_id, {
+                    "last_id": email_row['id'],
+                    "processed": index + 1,
+                    "success": success_count,
+                    "failed": fail_count
+                })
 
                 # Small delay to avoid overwhelming SMTP server
                 time.sleep(2)  # Increased delay to be safe with SMTP limits
 
-            # Final update
-            task_status[task_id].update({
-                "status": "completed",
-                "progress": 100,
-                "result": f"Sent {success_count}/{total_emails} emails successfully. Failed: {fail_count}"
-            })
-            logger.info(f"✅ Bulk email task {task_id} completed! Success: {success_count}, Failed: {fail_count}")
+            # Final update (fails if the campaign was cancelled or interrupted)
+            if task_store.set_status(
+                task_id, "completed", expected="running",
+                progress=100,
+                result=f"Sent {success_count}/{total_emails} emails successfully. Failed: {fail_count}"
+            ):
+                task_store.delete_checkpoint(task_id)
+                logger.info(f"✅ Bulk email task {task_id} completed! Success: {success_count}, Failed: {fail_count}")
 
         except Exception as e:
-            task_status[task_id].update({
-                "status": "failed",
-                "result": f"Bulk email failed: {str(e)}"
-            })
+            task_store.set_status(task_id, "failed", result=f"Bulk email failed: {str(e)}")
             logger.error(f"❌ Bulk email task {task_id} failed: {str(e)}")
 
 # Initialize task manager and database
 email_manager = EmailTaskManager()
 init_database()
+email_manager.resume_unfinished()
+shutdown.on_stop(email_manager.stop)
+# Campaign cursors, task records and email logs: copy the WAL into the database file last
+shutdown.on_flush(task_store.flush)
+shutdown.install()
 
 @app.route('/')
 def index():
@@ -650,7 +709,7 @@ def start_email_task():
 def get_tasks():
     """Get status of all tasks"""
     tasks = []
-    for task_id, task_info in task_status.items():
+    for task_info in task_store.list():
         duration = None
         if task_info["status"] == "running":
             start_time = datetime.strptime(task_info["start_time"], "%Y-%m-%d %H:%M:%S")
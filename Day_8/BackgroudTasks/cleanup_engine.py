@@ -0,0 +1,207 @@
+"""
+Filesystem and database cleanup used by the cleanup task.
+
+- clean_directory: walks a folder with os.scandir, hands the entries to a
+  thread pool in fixed-size batches and deletes (or gzip-archives) every file
+  older than the retention period
+- trim_rows: deletes old rows from a table in small batches, so writers are
+  never blocked for long
+- incremental_vacuum: switches a SQLite database to auto_vacuum=INCREMENTAL
+  (one full VACUUM, only the first time) and gives free pages back to the OS
+
+Every function takes a should_stop() callable that is checked between
+batches, and returns a stats dict that can be merged with merge_stats().
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_BATCH_SIZE = 500
+VACUUM_STEP_PAGES = 1000
+
+Entry = Tuple[str, int, float]  # path, size, mtime
+
+
+def empty_stats() -> Dict:
+    return {
+        "files_scanned": 0,
+        "files_deleted": 0,
+        "files_archived": 0,
+        "rows_deleted": 0,
+        "bytes_reclaimed": 0,
+        "errors": 0,
+    }
+
+
+def merge_stats(total: Dict, extra: Dict) -> Dict:
+    return {key: total.get(key, 0) + extra.get(key, 0) for key in empty_stats()}
+
+
+def format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def scan_batches(folder: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 skip: Optional[str] = None) -> Iterator[List[Entry]]:
+    """Yield lists of (path, size, mtime) for every regular file below `folder`"""
+    skip = os.path.abspath(skip) if skip else None
+    batch: List[Entry] = []
+    pending = [folder]
+    while pending:
+        current = pending.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    # DirEntry caches the stat result from the directory listing where the OS allows it
+                    if entry.is_dir(follow_symlinks=False):
+                        if skip is None or os.path.abspath(entry.path) != skip:
+                            pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        info = entry.stat(follow_symlinks=False)
+                        batch.append((entry.path, info.st_size, info.st_mtime))
+                        if len(batch) >= batch_size:
+                            yield batch
+                            batch = []
+        except FileNotFoundError:
+            continue
+    if batch:
+        yield batch
+
+
+def _archive(path: str, archive_path: str) -> int:
+    """gzip a file into the archive folder, remove the original; return the compressed size"""
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    partial = archive_path + ".part"
+    with open(path, "rb") as source, gzip.open(partial, "wb") as target:
+        shutil.copyfileobj(source, target, 1024 * 1024)
+    os.replace(partial, archive_path)
+    os.remove(path)
+    return os.path.getsize(archive_path)
+
+
+def clean_batch(batch: List[Entry], cutoff: float, action: str, folder: str,
+                archive_folder: Optional[str] = None) -> Dict:
+    """Delete or archive the files of one batch that were last modified before `cutoff`"""
+    stats = empty_stats()
+    stats["files_scanned"] = len(batch)
+    for path, size, mtime in batch:
+        if mtime >= cutoff:
+            continue
+        try:
+            if action == "archive":
+                relative = os.path.relpath(path, folder)
+                archive_path = os.path.join(archive_folder, os.path.basename(os.path.abspath(folder)),
+                                            relative + ".gz")
+                stats["bytes_reclaimed"] += size - _archive(path, archive_path)
+                stats["files_archived"] += 1
+            else:
+                os.remove(path)
+                stats["bytes_reclaimed"] += size
+                stats["files_deleted"] += 1
+        except OSError:
+            stats["errors"] += 1
+    return stats
+
+
+def clean_directory(folder: str, retention_days: float, action: str = "delete",
+                    archive_folder: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                    workers: int = 4, should_stop: Callable[[], bool] = lambda: False,
+                    on_batch: Callable[[Dict], None] = lambda stats: None) -> Dict:
+    """
+    Delete ("delete") or gzip into archive_folder ("archive") every file below
+    `folder` older than retention_days. Batches are processed on a thread pool;
+    at most 2 * workers batches are in flight, so memory stays bounded.
+    """
+    if action not in ("delete", "archive"):
+        raise ValueError(f"Unknown cleanup action: {action}")
+    if action == "archive" and not archive_folder:
+        raise ValueError("Archiving needs an archive folder")
+
+    stats = empty_stats()
+    if not os.path.isdir(folder):
+        return stats
+
+    cutoff = time.time() - retention_days * 86400
+    in_flight = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cleanup") as pool:
+        for batch in scan_batches(folder, batch_size, skip=archive_folder):
+            if should_stop():
+                break
+            in_flight.append(pool.submit(clean_batch, batch, cutoff, action, folder, archive_folder))
+            if len(in_flight) >= 2 * workers:
+                stats = merge_stats(stats, in_flight.pop(0).result())
+                on_batch(stats)
+        for future in in_flight:
+            stats = merge_stats(stats, future.result())
+            on_batch(stats)
+    return stats
+
+
+def trim_rows(database: str, table: str, column: str, older_than: str,
+              batch_size: int = 5000, should_stop: Callable[[], bool] = lambda: False,
+              on_batch: Callable[[Dict], None] = lambda stats: None) -> Dict:
+    """Delete rows whose `column` is before `older_than`, batch_size rows per transaction"""
+    stats = empty_stats()
+    if not os.path.exists(database):
+        return stats
+
+    conn = sqlite3.connect(database, timeout=30)
+    try:
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        if not exists:
+            return stats
+        while not should_stop():
+            cursor = conn.execute(
+                f'DELETE FROM "{table}" WHERE rowid IN '
+                f'(SELECT rowid FROM "{table}" WHERE "{column}" < ? LIMIT ?)',
+                (older_than, batch_size)
+            )
+            conn.commit()
+            if cursor.rowcount <= 0:
+                break
+            stats["rows_deleted"] += cursor.rowcount
+            on_batch(stats)
+    finally:
+        conn.close()
+    return stats
+
+
+def incremental_vacuum(database: str, step_pages: int = VACUUM_STEP_PAGES,
+                       should_stop: Callable[[], bool] = lambda: False,
+                       on_batch: Callable[[Dict], None] = lambda stats: None) -> Dict:
+    """Release free pages of a SQLite database back to the filesystem, step_pages at a time"""
+    stats = empty_stats()
+    if not os.path.exists(database):
+        return stats
+
+    conn = sqlite3.connect(database, timeout=30, isolation_level=None)
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        pages_before = conn.execute("PRAGMA page_count").fetchone()[0]
+
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # auto_vacuum can only be switched on an empty database or by a full VACUUM (once)
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            while not should_stop() and conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+                # Each step of this pragma frees one page, so run it to completion
+                conn.execute(f"PRAGMA incremental_vacuum({int(step_pages)})").fetchall()
+                stats["bytes_reclaimed"] = (pages_before - conn.execute("PRAGMA page_count").fetchone()[0]) * page_size
+                on_batch(stats)
+
+        if conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        pages_after = conn.execute("PRAGMA page_count").fetchone()[0]
+        stats["bytes_reclaimed"] = max(pages_before - pages_after, 0) * page_size
+    finally:
+        conn.close()
+    return stats
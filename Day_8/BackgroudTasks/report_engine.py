@@ -0,0 +1,181 @@
+"""
+Streaming report generation over SQLite tables.
+
+A report reads its table in rowid ranges of `chunk_size` rows. Grouped
+reports let SQLite aggregate each chunk and fold the partial results into
+one small dict (one entry per group, however many rows there are); detail
+reports copy the rows of each chunk straight to the output. Output is
+written to "<path>.part" line by line and renamed when complete, so a
+half-written report is never served.
+"""
+import csv
+import json
+import os
+import sqlite3
+from typing import Callable, Dict, Optional
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+# Measures are (kind, SQL expression); kind decides how chunk results are combined
+_SQL = {"count": "COUNT({})", "sum": "SUM({})", "min": "MIN({})", "max": "MAX({})"}
+_MERGE = {
+    "count": lambda a, b: a + b,
+    "sum": lambda a, b: b if a is None else a if b is None else a + b,
+    "min": lambda a, b: b if a is None else a if b is None else min(a, b),
+    "max": lambda a, b: b if a is None else a if b is None else max(a, b),
+}
+
+REPORTS = {
+    "email-daily": {
+        "title": "Email sends per day",
+        "source": "email",
+        "table": "email_logs",
+        "group_by": {"day": "DATE(sent_at)", "status": "status"},
+        "measures": {"emails": ("count", "*"), "first_sent": ("min", "sent_at"), "last_sent": ("max", "sent_at")},
+    },
+    "tasks-daily": {
+        "title": "Background tasks per day",
+        "source": "tasks",
+        "table": "tasks",
+        "group_by": {"day": "DATE(start_time)", "type": "json_extract(data, '$.type')", "status": "status"},
+        "measures": {"tasks": ("count", "*")},
+    },
+    "orders-by-bucket": {
+        "title": "Orders per size bucket",
+        "source": "orders",
+        "table": "processed_records",
+        "group_by": {"bucket": "bucket"},
+        "measures": {"orders": ("count", "*"), "revenue": ("sum", "total"), "tax": ("sum", "tax"),
+                     "large_orders": ("sum", "is_large")},
+    },
+    "orders": {
+        "title": "Processed orders",
+        "source": "orders",
+        "table": "processed_records",
+        "columns": {"id": "id", "total": "total", "tax": "tax", "bucket": "bucket", "is_large": "is_large"},
+    },
+}
+
+
+class ReportWriter:
+    """Write report lines to <path>.part as CSV or a JSON array; commit() renames it to <path>"""
+
+    def __init__(self, path: str, columns, fmt: str = "csv"):
+        if fmt not in ("csv", "json"):
+            raise ValueError(f"Unsupported report format: {fmt}")
+        self.path = path
+        self.partial = path + ".part"
+        self.columns = list(columns)
+        self.fmt = fmt
+        self.lines = 0
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._file = open(self.partial, "w", newline="", encoding="utf-8")
+        if fmt == "csv":
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(self.columns)
+        else:
+            self._file.write("[")
+
+    def write(self, row):
+        if self.fmt == "csv":
+            self._csv.writerow(row)
+        else:
+            self._file.write(("\n" if self.lines == 0 else ",\n") + json.dumps(dict(zip(self.columns, row))))
+        self.lines += 1
+
+    def commit(self):
+        if self.fmt == "json":
+            self._file.write("\n]\n")
+        self._file.close()
+        os.replace(self.partial, self.path)
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.partial):
+            os.remove(self.partial)
+
+
+def _sort_key(key: tuple) -> tuple:
+    # NULL groups last, and never compare None with a value
+    return tuple((value is None, value) for value in key)
+
+
+def run_report(database: str, definition: Dict, path: str, fmt: str = "csv",
+               chunk_size: int = DEFAULT_CHUNK_SIZE, should_stop: Callable[[], bool] = lambda: False,
+               on_progress: Callable[[int, int], None] = lambda done, total: None) -> Optional[Dict]:
+    """
+    Build one report into `path`. Returns {"rows": rows read, "lines": lines written, "path": path},
+    or None if should_stop() asked to stop (the partial file is removed).
+    """
+    if not os.path.exists(database):
+        raise ValueError(f"Report database not found: {database}")
+
+    table = definition["table"]
+    conn = sqlite3.connect(f"file:{database}?mode=ro", uri=True, timeout=30)
+    writer = None
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone():
+            raise ValueError(f"Table {table} not found in {database}")
+        total = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+        grouped = "group_by" in definition
+        if grouped:
+            keys, measures = definition["group_by"], definition["measures"]
+            select = ", ".join(list(keys.values()) + [_SQL[kind].format(expr) for kind, expr in measures.values()])
+            sql = (f'SELECT {select}, COUNT(*) FROM "{table}" WHERE rowid > ? AND rowid <= ? '
+                   f'GROUP BY {", ".join(str(i + 1) for i in range(len(keys)))}')
+            groups: Dict[tuple, list] = {}
+            writer = ReportWriter(path, list(keys) + list(measures), fmt)
+        else:
+            sql = f'SELECT {", ".join(definition["columns"].values())} FROM "{table}" WHERE rowid > ? AND rowid <= ? ORDER BY rowid'
+            writer = ReportWriter(path, definition["columns"], fmt)
+
+        done = 0
+        low = -1 << 62
+        on_progress(done, total)
+        while done < total:
+            if should_stop():
+                writer.discard()
+                return None
+            # Upper rowid of the next chunk (an index walk of chunk_size entries)
+            row = conn.execute(f'SELECT rowid FROM "{table}" WHERE rowid > ? ORDER BY rowid LIMIT 1 OFFSET ?',
+                               (low, chunk_size - 1)).fetchone()
+            high = row[0] if row else 1 << 62
+
+            cursor = conn.execute(sql, (low, high))
+            if grouped:
+                for result in cursor:
+                    key, values, rows = tuple(result[:len(keys)]), list(result[len(keys):-1]), result[-1]
+                    if key in groups:
+                        groups[key] = [_MERGE[kind](a, b) for (kind, _), a, b in zip(measures.values(), groups[key], values)]
+                    else:
+                        groups[key] = values
+                    done += rows
+            else:
+                while True:
+                    rows = cursor.fetchmany(1000)
+                    if not rows:
+                        break
+                    for result in rows:
+                        writer.write(result)
+                    done += len(rows)
+
+            on_progress(min(done, total), total)
+            if row is None:
+                break
+            low = high
+
+        if grouped:
+            for key in sorted(groups, key=_sort_key):
+                writer.write(list(key) + [round(value, 2) if isinstance(value, float) else value
+                                          for value in groups[key]])
+        writer.commit()
+        return {"rows": done, "lines": writer.lines, "path": path}
+    except Exception:
+        if writer is not None:
+            writer.discard()
+        raise
+    finally:
+        conn.close()
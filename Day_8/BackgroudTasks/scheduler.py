@@ -0,0 +1,372 @@
+"""
+Lightweight in-process scheduler for periodic maintenance jobs.
+
+Jobs are kept in a heap ordered by their next run time. Job definitions and
+their last/next run times live in a small SQLite table, so every gunicorn
+worker sees the same schedules and an edit made through one worker is picked
+up by the others. Before firing a job a worker has to "claim" the slot with a
+compare-and-swap UPDATE on that table - only one worker wins, the rest skip it.
+"""
+import heapq
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class IntervalSchedule:
+    """Run every N seconds (slots are aligned to the epoch so all workers agree)"""
+
+    def __init__(self, seconds: int):
+        if not isinstance(seconds, int) or isinstance(seconds, bool) or seconds <= 0:
+            raise ValueError("Interval must be a positive whole number of seconds")
+        self.seconds = seconds
+
+    def next_after(self, ts: float) -> float:
+        return (int(ts) // self.seconds + 1) * self.seconds
+
+    def to_dict(self) -> Dict:
+        return {"interval": self.seconds}
+
+
+class CronSchedule:
+    """
+    Cron-like schedule: "minute hour day-of-month month day-of-week"
+    Each field supports *, */n, a-b, a-b/n and comma separated lists.
+    Day of week: 0 = Sunday ... 6 = Saturday.
+    """
+
+    FIELDS = [("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 6)]
+
+    def __init__(self, expression: str):
+        if not isinstance(expression, str):
+            raise ValueError("Cron expression must be a string")
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Cron expression needs 5 fields, got {len(parts)}: {expression!r}")
+        self.expression = " ".join(parts)
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            self._parse_field(part, low, high, name)
+            for part, (name, low, high) in zip(parts, self.FIELDS)
+        ]
+        # Standard cron rule: if both day fields are restricted, either may match
+        self.any_day = parts[2] == "*"
+        self.any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int, name: str) -> frozenset:
+        values = set()
+        for item in field.split(","):
+            step = 1
+            if "/" in item:
+                item, step_text = item.split("/", 1)
+                step = int(step_text)
+                if step <= 0:
+                    raise ValueError(f"Invalid step in {name} field")
+            if item == "*":
+                start, end = low, high
+            elif "-" in item:
+                start, end = (int(x) for x in item.split("-", 1))
+            else:
+                start = end = int(item)
+                if step != 1:
+                    end = high
+            if start < low or end > high or start > end:
+                raise ValueError(f"{name} value out of range {low}-{high}: {field!r}")
+            values.update(range(start, end + 1, step))
+        return frozenset(values)
+
+    def _day_matches(self, dt: datetime) -> bool:
+        day_ok = dt.day in self.days
+        # Python: Monday = 0, cron: Sunday = 0
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, ts: float) -> float:
+        dt = datetime.fromtimestamp(ts).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                # Jump to the first day of the next month
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(dt):
+                dt = (dt + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if dt.hour not in self.hours:
+                dt = (dt + timedelta(hours=1)).replace(minute=0)
+                continue
+            if dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+                continue
+            return dt.timestamp()
+        raise ValueError(f"Cron expression never fires: {self.expression!r}")
+
+    def to_dict(self) -> Dict:
+        return {"cron": self.expression}
+
+
+def parse_schedule(spec: Dict):
+    """Build a schedule from {"interval": seconds} or {"cron": "m h dom mon dow"}"""
+    if spec.get("interval") is not None:
+        return IntervalSchedule(spec["interval"])
+    if spec.get("cron"):
+        return CronSchedule(spec["cron"])
+    raise ValueError("Schedule needs either 'interval' (seconds) or 'cron'")
+
+
+def _format_ts(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else None
+
+
+class TaskScheduler:
+    """
+    Fires background tasks on a schedule.
+
+    launcher(task_type, task_data) starts a task and returns its ID.
+    is_running(task_id) tells whether a previous run is still going, so a job
+    never overlaps with itself.
+    """
+
+    def __init__(self, launcher: Callable[[str, Dict], str], is_running: Callable[[str], bool],
+                 database: str = "scheduler.db", reload_interval: float = 5.0):
+        self.launcher = launcher
+        self.is_running = is_running
+        self.database = database
+        self.reload_interval = reload_interval
+        self.jobs: Dict[str, Dict] = {}
+        self._heap: List = []
+        self._versions: Dict[str, int] = {}
+        self._condition = threading.Condition()
+        self._last_reload = 0.0
+        self._thread = None
+        self._stopped = threading.Event()
+        self._init_database()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_database(self):
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schedules (
+                name TEXT PRIMARY KEY,
+                task_type TEXT NOT NULL,
+                task_data TEXT,
+                schedule TEXT NOT NULL,
+                enabled BOOLEAN DEFAULT 1,
+                next_run REAL,
+                last_run REAL,
+                last_task_id TEXT,
+                last_status TEXT,
+                updated_at REAL
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    # ----- job definitions -----
+
+    def add_job(self, name: str, task_type: str, schedule: Dict, task_data: Dict = None, enabled: bool = True):
+        """Register a job unless it already exists (existing edits are kept)"""
+        parsed = parse_schedule(schedule)
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR IGNORE INTO schedules (name, task_type, task_data, schedule, enabled, next_run, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (name, task_type, json.dumps(task_data or {}), json.dumps(parsed.to_dict()),
+             int(enabled), parsed.next_after(now), now)
+        )
+        conn.commit()
+        conn.close()
+        self._reload(force=True)
+
+    def update_job(self, name: str, changes: Dict) -> Dict:
+        """Edit schedule / enabled flag / task data of an existing job"""
+        if not isinstance(changes, dict):
+            raise ValueError("Send an object with the fields to change")
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM schedules WHERE name = ?', (name,)).fetchone()
+            if row is None:
+                raise KeyError(name)
+
+            schedule = json.loads(row["schedule"])
+            if "interval" in changes or "cron" in changes:
+                schedule = {key: changes[key] for key in ("interval", "cron") if changes.get(key) is not None}
+            parsed = parse_schedule(schedule)
+            enabled = changes.get("enabled", bool(row["enabled"]))
+            if not isinstance(enabled, bool):
+                raise ValueError("enabled must be true or false")
+            task_data = changes.get("task_data", json.loads(row["task_data"] or "{}"))
+            if not isinstance(task_data, dict):
+                raise ValueError("task_data must be an object")
+            now = time.time()
+
+            conn.execute(
+                'UPDATE schedules SET schedule = ?, enabled = ?, task_data = ?, next_run = ?, updated_at = ? '
+                'WHERE name = ?',
+                (json.dumps(parsed.to_dict()), int(enabled), json.dumps(task_data),
+                 parsed.next_after(now), now, name)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        self._reload(force=True)
+        return self._public(self.jobs[name])
+
+    def list_jobs(self) -> List[Dict]:
+        self._reload()
+        with self._condition:
+            jobs = [self._public(job) for job in self.jobs.values()]
+        return sorted(jobs, key=lambda job: job["name"])
+
+    @staticmethod
+    def _public(job: Dict) -> Dict:
+        data = {key: value for key, value in job.items() if key != "parsed"}
+        data["next_run"] = _format_ts(job["next_run"]) if job["enabled"] else None
+        data["last_run"] = _format_ts(job["last_run"])
+        return data
+
+    def _reload(self, force: bool = False):
+        """Re-read job definitions when another worker (or an endpoint) changed them"""
+        now = time.time()
+        if not force and now - self._last_reload < self.reload_interval:
+            return
+        self._last_reload = now
+
+        conn = self._connect()
+        rows = conn.execute('SELECT * FROM schedules').fetchall()
+        conn.close()
+
+        with self._condition:
+            for row in rows:
+                job = {
+                    "name": row["name"],
+                    "task_type": row["task_type"],
+                    "task_data": json.loads(row["task_data"] or "{}"),
+                    "schedule": json.loads(row["schedule"]),
+                    "enabled": bool(row["enabled"]),
+                    "next_run": row["next_run"],
+                    "last_run": row["last_run"],
+                    "last_task_id": row["last_task_id"],
+                    "last_status": row["last_status"],
+                }
+                job["parsed"] = parse_schedule(job["schedule"])
+                old = self.jobs.get(job["name"])
+                self.jobs[job["name"]] = job
+                if old is None or old["next_run"] != job["next_run"] or old["enabled"] != job["enabled"]:
+                    self._push(job)
+            self._condition.notify()
+
+    def _push(self, job: Dict):
+        """Add a heap entry; older entries for the same job become stale"""
+        version = self._versions.get(job["name"], 0) + 1
+        self._versions[job["name"]] = version
+        if job["enabled"] and job["next_run"]:
+            heapq.heappush(self._heap, (job["next_run"], version, job["name"]))
+
+    # ----- running -----
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="task-scheduler", daemon=True)
+            self._thread.start()
+            logger.info("⏰ Task scheduler started")
+
+    def stop(self):
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._reload()
+                due = self._pop_due()
+                if due:
+                    self._fire(due)
+                    continue
+                with self._condition:
+                    wait = self.reload_interval
+                    if self._heap:
+                        wait = min(wait, max(self._heap[0][0] - time.time(), 0))
+                    self._condition.wait(wait)
+            except Exception as e:
+                logger.error(f"❌ Scheduler loop error: {str(e)}")
+                time.sleep(self.reload_interval)
+
+    def _pop_due(self) -> Optional[Dict]:
+        with self._condition:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, version, name = heapq.heappop(self._heap)
+                if self._versions.get(name) == version and self.jobs[name]["enabled"]:
+                    return self.jobs[name]
+        return None
+
+    def _fire(self, job: Dict):
+        slot = job["next_run"]
+        next_run = job["parsed"].next_after(max(time.time(), slot))
+
+        # Skip this slot if the previous run is still going
+        overlapping = bool(job["last_task_id"]) and self.is_running(job["last_task_id"])
+
+        # Claim the slot - only the worker whose UPDATE matches fires the job
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                'UPDATE schedules SET next_run = ?, last_status = ? WHERE name = ? AND next_run = ? AND enabled = 1',
+                (next_run, "skipped (previous run still active)" if overlapping else "starting", job["name"], slot)
+            )
+            conn.commit()
+            claimed = cursor.rowcount == 1
+        finally:
+            conn.close()
+
+        if not claimed:
+            # Another worker fired it (or it was edited) - pick up the new state
+            self._reload(force=True)
+            return
+
+        if overlapping:
+            logger.info(f"⏭️ Skipping scheduled job {job['name']}: previous run still active")
+            self._record(job, next_run, last_status="skipped (previous run still active)")
+            return
+
+        try:
+            task_id = self.launcher(job["task_type"], dict(job["task_data"]))
+            self._record(job, next_run, last_run=time.time(), last_task_id=task_id, last_status="started")
+            logger.info(f"⏰ Scheduled job {job['name']} started task {task_id}")
+        except Exception as e:
+            self._record(job, next_run, last_run=time.time(), last_status=f"failed to start: {str(e)}")
+            logger.error(f"❌ Scheduled job {job['name']} failed to start: {str(e)}")
+
+    def _record(self, job: Dict, next_run: float, **fields):
+        conn = self._connect()
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        conn.execute(
+            f'UPDATE schedules SET {assignments} WHERE name = ?',
+            (*fields.values(), job["name"])
+        )
+        conn.commit()
+        conn.close()
+
+        with self._condition:
+            current = self.jobs.get(job["name"], job)
+            for item in {id(job): job, id(current): current}.values():
+                item.update(fields)
+                item["next_run"] = next_run
+            self._push(current)
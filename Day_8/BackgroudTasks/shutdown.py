@@ -0,0 +1,170 @@
+"""
+Graceful shutdown for apps that run background work in daemon threads.
+
+    shutdown = ShutdownCoordinator(deadline=25)
+    shutdown.on_stop(mark_tasks_interrupted)      # tell running work to stop (or finish)
+    shutdown.on_unfinished(persist_leftovers)     # work still running at the deadline
+    shutdown.on_flush(task_store.flush)           # write out anything buffered, last
+    shutdown.install()                            # SIGTERM + atexit
+
+    with shutdown.track(task_id):                 # around every piece of background work
+        ...
+
+On SIGTERM (or normal interpreter exit) the coordinator stops accepting new
+work, runs the stop hooks, waits up to `deadline` seconds for tracked work to
+finish, hands whatever is still running to the unfinished hooks and finally
+runs the flush hooks.
+
+The signal handler does not wait: it starts the shutdown on a (non-daemon)
+thread and chains to the previously installed handler right away, so the
+server begins its own graceful stop and the interpreter waits for the
+shutdown thread before exiting. Servers kill workers that take longer than
+their graceful timeout (gunicorn: 30s), so keep `deadline` below it.
+"""
+import atexit
+import logging
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class ShuttingDown(RuntimeError):
+    """New work was submitted after shutdown started"""
+
+
+class ShutdownCoordinator:
+    def __init__(self, deadline: float = 30.0):
+        self.deadline = deadline
+        self.stopping = threading.Event()
+        self._active: Dict[str, int] = {}
+        self._changed = threading.Condition()
+        self._stop_hooks: List[Callable[[], None]] = []
+        self._flush_hooks: List[Callable[[], None]] = []
+        self._unfinished_hooks: List[Callable[[List[str]], None]] = []
+        self._done = False
+        self._lock = threading.Lock()
+        self._previous = {}
+
+    # ----- registration -----
+
+    def on_stop(self, hook: Callable[[], None]):
+        self._stop_hooks.append(hook)
+        return hook
+
+    def on_flush(self, hook: Callable[[], None]):
+        self._flush_hooks.append(hook)
+        return hook
+
+    def on_unfinished(self, hook: Callable[[List[str]], None]):
+        self._unfinished_hooks.append(hook)
+        return hook
+
+    def install(self, signals=(signal.SIGTERM,)):
+        """Handle the given signals (chained to the previous handlers) and run at interpreter exit"""
+        for signum in signals:
+            try:
+                self._previous[signum] = signal.signal(signum, self._handle_signal)
+            except ValueError:
+                # signal.signal only works in the main thread (e.g. not under some WSGI servers)
+                logger.warning(f"⚠️ Could not install a handler for {signal.Signals(signum).name}")
+        atexit.register(self.shutdown, "interpreter exit")
+
+    # ----- used by the app -----
+
+    @property
+    def accepting(self) -> bool:
+        return not self.stopping.is_set()
+
+    def check_accepting(self):
+        if self.stopping.is_set():
+            raise ShuttingDown("Server is shutting down, not accepting new tasks")
+
+    @contextmanager
+    def track(self, work_id: str):
+        """Mark a piece of background work as in flight"""
+        with self._changed:
+            self._active[work_id] = self._active.get(work_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._changed:
+                self._active[work_id] -= 1
+                if not self._active[work_id]:
+                    del self._active[work_id]
+                self._changed.notify_all()
+
+    def active(self) -> List[str]:
+        with self._changed:
+            return list(self._active)
+
+    # ----- shutdown -----
+
+    def shutdown(self, reason: str = "shutdown") -> Dict:
+        """Stop, drain, flush and persist; safe to call more than once (only the first call works)"""
+        with self._lock:
+            if self._done:
+                return {}
+            self._done = True
+
+        started = time.time()
+        in_flight = self.active()
+        logger.info(f"🛑 Shutting down ({reason}): {len(in_flight)} background tasks in flight, "
+                    f"waiting up to {self.deadline:.0f}s")
+        self.stopping.set()
+        self._run_hooks(self._stop_hooks)
+
+        with self._changed:
+            self._changed.wait_for(lambda: not self._active, timeout=self.deadline)
+            unfinished = list(self._active)
+
+        if unfinished:
+            logger.warning(f"⚠️ {len(unfinished)} tasks still running at the deadline: {', '.join(unfinished)}")
+            self._run_hooks(self._unfinished_hooks, unfinished)
+        self._run_hooks(self._flush_hooks)
+        for handler in logging.getLogger().handlers:
+            handler.flush()
+
+        summary = {
+            "reason": reason,
+            "in_flight": len(in_flight),
+            "drained": len(in_flight) - len([w for w in unfinished if w in in_flight]),
+            "unfinished": unfinished,
+            "seconds": round(time.time() - started, 2),
+        }
+        logger.info(f"🛑 Shutdown complete in {summary['seconds']}s "
+                    f"({summary['drained']} drained, {len(unfinished)} left for the next start)")
+        return summary
+
+    def _run_hooks(self, hooks, *args):
+        for hook in hooks:
+            try:
+                hook(*args)
+            except Exception as e:
+                logger.error(f"❌ Shutdown hook {getattr(hook, '__name__', hook)} failed: {str(e)}")
+
+    def _handle_signal(self, signum, frame):
+        # Waiting for the deadline in here would block the main thread, and the server could
+        # kill the process before the flush hooks ran: shut down on a thread instead
+        reason = signal.Signals(signum).name
+        previous = self._previous.get(signum)
+        if callable(previous):
+            self._start(reason)
+            previous(signum, frame)
+        elif previous == signal.SIG_IGN:
+            self._start(reason)
+        else:
+            # Default action (terminate) once the shutdown is complete; a second signal terminates right away
+            signal.signal(signum, signal.SIG_DFL)
+            self._start(reason, then=lambda: os.kill(os.getpid(), signum))
+
+    def _start(self, reason: str, then: Callable[[], None] = None):
+        def run():
+            self.shutdown(reason)
+            if then is not None:
+                then()
+        threading.Thread(target=run, name="shutdown").start()
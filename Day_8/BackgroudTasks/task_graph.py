@@ -0,0 +1,246 @@
+"""
+Task dependency graphs (pipelines) for the background task manager.
+
+A graph is submitted as one job:
+
+    {
+        "name": "daily-report",
+        "nodes": {
+            "process": {"task_type": "data", "data": {"records": 5000}},
+            "cleanup": {"task_type": "cleanup"},
+            "report":  {"task_type": "report", "depends_on": ["process"]},
+            "email":   {"task_type": "email", "depends_on": ["report"]}
+        }
+    }
+
+Every node becomes a normal task record (with graph_id / node fields) that
+starts in the "waiting" state. Nodes whose dependencies are done are queued,
+so independent nodes run in parallel on the worker pool. The "output" of a
+finished node is passed to its dependents as data["inputs"][node_name].
+If a node fails or is cancelled, everything downstream of it is skipped.
+
+All graph state lives in the task store, so any worker process can move a
+graph forward when one of its nodes finishes. Node states change in one
+atomic read-modify-write of the graph record (TaskStore.modify), so two
+workers finishing sibling nodes at the same time both see each other's result.
+"""
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List
+
+FINAL_STATUSES = ("completed", "failed", "cancelled", "skipped")
+
+
+def validate_graph(nodes: Dict[str, Dict], task_types: Iterable[str]) -> List[str]:
+    """Check node types and edges; return the node names in topological order"""
+    if not isinstance(nodes, dict):
+        raise ValueError("nodes must be an object of {name: node}")
+    if not nodes:
+        raise ValueError("A graph needs at least one node")
+    task_types = set(task_types)
+    for name, node in nodes.items():
+        if not isinstance(node, dict):
+            raise ValueError(f"Node {name!r} must be an object")
+        task_type = node.get("task_type")
+        if not isinstance(task_type, str) or task_type not in task_types:
+            raise ValueError(f"Node {name!r} has unknown task type {task_type!r}")
+        depends_on = node.get("depends_on", [])
+        if not isinstance(depends_on, list) or not all(isinstance(dep, str) for dep in depends_on):
+            raise ValueError(f"Node {name!r}: depends_on must be a list of node names")
+        if not isinstance(node.get("data") or {}, dict):
+            raise ValueError(f"Node {name!r}: data must be an object")
+        for dependency in depends_on:
+            if dependency not in nodes:
+                raise ValueError(f"Node {name!r} depends on unknown node {dependency!r}")
+
+    # Kahn's algorithm: anything left over is part of a cycle
+    remaining = {name: set(node.get("depends_on", [])) for name, node in nodes.items()}
+    order = []
+    ready = sorted(name for name, deps in remaining.items() if not deps)
+    while ready:
+        name = ready.pop(0)
+        order.append(name)
+        del remaining[name]
+        for other, deps in remaining.items():
+            if name in deps:
+                deps.discard(name)
+                if not deps and other not in ready:
+                    ready.append(other)
+    if remaining:
+        raise ValueError(f"Graph has a cycle between: {', '.join(sorted(remaining))}")
+    return order
+
+
+def downstream(nodes: Dict[str, Dict], start: str) -> List[str]:
+    """All nodes that (directly or indirectly) depend on `start`"""
+    found = []
+    frontier = [start]
+    while frontier:
+        current = frontier.pop()
+        for name, node in nodes.items():
+            if current in node.get("depends_on", []) and name not in found:
+                found.append(name)
+                frontier.append(name)
+    return found
+
+
+def graph_progress(graph: Dict, node_tasks: Dict[str, Dict]) -> float:
+    """Average progress over all nodes (skipped / failed nodes count as done)"""
+    nodes = graph.get("nodes", {})
+    if not nodes:
+        return 0.0
+    total = 0.0
+    for node in nodes.values():
+        task = node_tasks.get(node["task_id"], {})
+        status = task.get("status", node.get("status"))
+        total += 100.0 if status in FINAL_STATUSES else float(task.get("progress") or 0)
+    return round(total / len(nodes), 1)
+
+
+class GraphRunner:
+    """
+    Moves graphs forward.
+
+    store: the shared task store
+    resolve(task_type) -> (display name, target): used for validation and names
+    enqueue(task_id, task_type, data): hands a node to the worker pool
+    """
+
+    def __init__(self, store, resolve: Callable, enqueue: Callable, task_types: Iterable[str], owner: str):
+        self.store = store
+        self.resolve = resolve
+        self.enqueue = enqueue
+        self.task_types = list(task_types)
+        self.owner = owner
+
+    def submit(self, spec: Dict) -> str:
+        """Create the graph and its node tasks, then queue the nodes without dependencies"""
+        if not isinstance(spec, dict):
+            raise ValueError("A pipeline must be an object with nodes")
+        nodes = spec.get("nodes") or {}
+        order = validate_graph(nodes, self.task_types)
+        graph_id = str(uuid.uuid4())
+        start_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        graph_nodes = {}
+        for name in order:
+            node = nodes[name]
+            task_id = str(uuid.uuid4())
+            display_name, _ = self.resolve(node["task_type"])
+            graph_nodes[name] = {
+                "task_id": task_id,
+                "task_type": node["task_type"],
+                "depends_on": list(node.get("depends_on", [])),
+                "status": "waiting",
+            }
+            self.store.create({
+                "id": task_id,
+                "name": f"{display_name} ({name})",
+                "type": node["task_type"],
+                "status": "waiting",
+                "progress": 0,
+                "start_time": start_time,
+                "result": None,
+                "owner": self.owner,
+                "graph_id": graph_id,
+                "node": name,
+                "data": dict(node.get("data") or {}),
+            })
+
+        self.store.create({
+            "id": graph_id,
+            "name": f"🔗 Pipeline: {spec.get('name', 'unnamed')}",
+            "type": "graph",
+            "status": "running",
+            "progress": 0,
+            "start_time": start_time,
+            "result": f"0/{len(order)} steps done",
+            "owner": self.owner,
+            "nodes": graph_nodes,
+            "order": order,
+        })
+
+        for name in order:
+            if not graph_nodes[name]["depends_on"]:
+                self._start_node(graph_id, graph_nodes[name], {})
+        return graph_id
+
+    def _start_node(self, graph_id: str, node: Dict, inputs: Dict):
+        task = self.store.get(node["task_id"], fresh=True)
+        data = dict(task.get("data") or {})
+        data["inputs"] = inputs
+        # waiting -> pending exactly once, even if two upstream nodes finish together
+        if self.store.set_status(node["task_id"], "pending", expected="waiting", data=data):
+            self.enqueue(node["task_id"], node["task_type"], data)
+
+    def node_finished(self, task: Dict):
+        """Called by the worker pool after a graph node has run"""
+        graph_id, node_name, status = task["graph_id"], task["node"], task["status"]
+        decided = {}
+
+        def record(graph: Dict) -> Dict:
+            # Runs inside the store's transaction, maybe more than once: decide here, act after the commit
+            nodes = graph["nodes"]
+            nodes[node_name]["status"] = status
+            start, skip = [], []
+            if status == "completed":
+                for name in graph["order"]:
+                    node = nodes[name]
+                    if node["status"] != "waiting" or node_name not in node["depends_on"]:
+                        continue
+                    if all(nodes[dep]["status"] == "completed" for dep in node["depends_on"]):
+                        node["status"] = "pending"
+                        start.append(name)
+            else:
+                # Failure propagates: skip everything downstream
+                for name in downstream(nodes, node_name):
+                    if nodes[name]["status"] == "waiting":
+                        nodes[name]["status"] = "skipped"
+                        skip.append(name)
+            decided.update(start=start, skip=skip)
+            return self._graph_fields(graph)
+
+        graph = self.store.modify(graph_id, record)
+        if graph is None:
+            return
+        nodes = graph["nodes"]
+        for name in decided["start"]:
+            inputs = {dep: self._output(nodes[dep]["task_id"]) for dep in nodes[name]["depends_on"]}
+            self._start_node(graph_id, nodes[name], inputs)
+        for name in decided["skip"]:
+            self.store.set_status(
+                nodes[name]["task_id"], "skipped", expected="waiting",
+                result=f"Skipped: upstream step '{node_name}' {status}"
+            )
+
+    def _output(self, task_id: str):
+        task = self.store.get(task_id, fresh=True) or {}
+        return task.get("output")
+
+    @staticmethod
+    def _graph_fields(graph: Dict) -> Dict:
+        """Fields of the graph record after a node changed: node states, step count and the final status"""
+        nodes = graph["nodes"]
+        statuses = [node["status"] for node in nodes.values()]
+        done = sum(1 for status in statuses if status == "completed")
+        fields = {"nodes": nodes, "result": f"{done}/{len(nodes)} steps done"}
+
+        # A graph cancelled meanwhile keeps its status; only the node states are recorded
+        if graph["status"] == "running" and all(status in FINAL_STATUSES for status in statuses):
+            if done == len(nodes):
+                fields["status"] = "completed"
+            elif "failed" in statuses:
+                fields["status"] = "failed"
+            else:
+                fields["status"] = "cancelled"
+            fields["progress"] = 100
+        return fields
+
+    def cancel(self, graph_id: str) -> bool:
+        """Cancel a graph: stop running nodes and skip the ones that have not started"""
+        graph = self.store.get(graph_id, fresh=True)
+        if graph is None or not self.store.set_status(graph_id, "cancelled", expected="running"):
+            return False
+        for node in graph["nodes"].values():
+            self.store.set_status(node["task_id"], "cancelled", expected=("waiting", "pending", "running"))
+        return True
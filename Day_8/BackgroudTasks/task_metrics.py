@@ -0,0 +1,198 @@
+"""
+Queue and worker instrumentation for the background task manager.
+
+Everything is kept as running counters and fixed-bucket histograms that are
+updated when a task is queued, started or finished. A scrape only reads those
+counters, so its cost does not depend on how many tasks have run.
+Numbers are per worker process (like any in-process Prometheus client).
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Iterable, List
+
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+QUEUE_WAIT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+QUANTILES = (0.5, 0.9, 0.99)
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+# Stopped by a shutdown, resumed later: not a failure
+OUTCOMES = FINAL_STATUSES + ("interrupted",)
+
+
+class Histogram:
+    """Cumulative-bucket histogram (same layout as a Prometheus histogram)"""
+
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets: List[float] = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by linear interpolation inside the bucket (like histogram_quantile)"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+    def cumulative(self) -> List[tuple]:
+        total = 0
+        result = []
+        for bound, bucket_count in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += bucket_count
+            result.append((bound, total))
+        return result
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "avg": round(self.sum / self.count, 3) if self.count else 0.0,
+            "buckets": {("+Inf" if bound == float("inf") else str(bound)): total
+                        for bound, total in self.cumulative()},
+        }
+
+
+class TaskMetrics:
+    """Counters and histograms updated by the task manager's worker pool"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.queue_depth = 0
+        self.busy = 0
+        self.stuck = 0
+        self.queue_wait = Histogram(QUEUE_WAIT_BUCKETS)
+        self.durations: Dict[str, Histogram] = {}
+        self.totals: Dict[str, Dict[str, int]] = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def _type_totals(self, task_type: str) -> Dict[str, int]:
+        if task_type not in self.totals:
+            self.totals[task_type] = {"queued": 0, "started": 0, "completed": 0, "failed": 0, "cancelled": 0,
+                                      "interrupted": 0}
+            self.durations[task_type] = Histogram(DURATION_BUCKETS)
+        return self.totals[task_type]
+
+    def task_queued(self, task_type: str):
+        with self._lock:
+            self.queue_depth += 1
+            self._type_totals(task_type)["queued"] += 1
+
+    def task_started(self, task_type: str, waited: float):
+        with self._lock:
+            self.queue_depth -= 1
+            self.busy += 1
+            self.queue_wait.observe(waited)
+            self._type_totals(task_type)["started"] += 1
+
+    def task_skipped(self, task_type: str):
+        """Task left the queue without running (cancelled while pending)"""
+        with self._lock:
+            self.queue_depth -= 1
+            self._type_totals(task_type)["cancelled"] += 1
+
+    def task_stuck(self, task_type: str):
+        """The watchdog found a running task without recent heartbeats"""
+        with self._lock:
+            self.stuck += 1
+
+    def task_finished(self, task_type: str, status: str, duration: float):
+        with self._lock:
+            self.busy -= 1
+            totals = self._type_totals(task_type)
+            totals[status if status in OUTCOMES else "failed"] += 1
+            self.durations[task_type].observe(duration)
+
+    def snapshot(self) -> Dict:
+        """JSON friendly view of all metrics"""
+        with self._lock:
+            types = {}
+            for task_type, totals in self.totals.items():
+                finished = sum(totals[status] for status in FINAL_STATUSES)
+                types[task_type] = {
+                    **totals,
+                    "failure_rate": round(totals["failed"] / finished, 4) if finished else 0.0,
+                    "duration_seconds": self.durations[task_type].to_dict(),
+                }
+            return {
+                "queue_depth": self.queue_depth,
+                "workers": {"total": self.workers, "busy": self.busy, "idle": self.workers - self.busy},
+                "queue_wait_seconds": {
+                    **{f"p{int(q * 100)}": round(self.queue_wait.quantile(q), 4) for q in QUANTILES},
+                    **self.queue_wait.to_dict(),
+                },
+                "task_types": types,
+                "stuck_tasks": self.stuck,
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+            }
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                "# HELP bg_tasks_queue_depth Tasks waiting for a worker",
+                "# TYPE bg_tasks_queue_depth gauge",
+                f"bg_tasks_queue_depth {self.queue_depth}",
+                "# HELP bg_tasks_workers Worker threads by state",
+                "# TYPE bg_tasks_workers gauge",
+                f'bg_tasks_workers{{state="busy"}} {self.busy}',
+                f'bg_tasks_workers{{state="idle"}} {self.workers - self.busy}',
+                "# HELP bg_task_queue_wait_seconds Time tasks spent in the queue",
+                "# TYPE bg_task_queue_wait_seconds histogram",
+            ]
+            lines += _histogram_lines("bg_task_queue_wait_seconds", self.queue_wait, "")
+            lines += [
+                "# HELP bg_tasks_stuck_total Running tasks flagged by the watchdog (stale heartbeat)",
+                "# TYPE bg_tasks_stuck_total counter",
+                f"bg_tasks_stuck_total {self.stuck}",
+            ]
+            lines += [
+                "# HELP bg_task_queue_wait_quantile_seconds Estimated time-in-queue percentiles",
+                "# TYPE bg_task_queue_wait_quantile_seconds gauge",
+            ]
+            lines += [f'bg_task_queue_wait_quantile_seconds{{quantile="{q}"}} {self.queue_wait.quantile(q):.6f}'
+                      for q in QUANTILES]
+
+            lines += ["# HELP bg_tasks_total Tasks by type and outcome", "# TYPE bg_tasks_total counter"]
+            for task_type, totals in self.totals.items():
+                for status, value in totals.items():
+                    lines.append(f'bg_tasks_total{{type="{task_type}",status="{status}"}} {value}')
+
+            lines += ["# HELP bg_task_failure_ratio Failed / finished tasks by type",
+                      "# TYPE bg_task_failure_ratio gauge"]
+            for task_type, totals in self.totals.items():
+                finished = sum(totals[status] for status in FINAL_STATUSES)
+                ratio = totals["failed"] / finished if finished else 0.0
+                lines.append(f'bg_task_failure_ratio{{type="{task_type}"}} {ratio:.6f}')
+
+            lines += ["# HELP bg_task_duration_seconds Task run time by type",
+                      "# TYPE bg_task_duration_seconds histogram"]
+            for task_type, histogram in self.durations.items():
+                lines += _histogram_lines("bg_task_duration_seconds", histogram, f'type="{task_type}",')
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(name: str, histogram: Histogram, labels: str) -> List[str]:
+    lines = []
+    for bound, total in histogram.cumulative():
+        le = "+Inf" if bound == float("inf") else repr(float(bound))
+        lines.append(f'{name}_bucket{{{labels}le="{le}"}} {total}')
+    label_block = f"{{{labels.rstrip(',')}}}" if labels else ""
+    lines.append(f"{name}_sum{label_block} {histogram.sum:.6f}")
+    lines.append(f"{name}_count{label_block} {histogram.count}")
+    return lines
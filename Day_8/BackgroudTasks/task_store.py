@@ -0,0 +1,328 @@
+"""
+Pluggable task registry shared between processes.
+
+With several gunicorn workers an in-memory dict only shows the tasks of the
+worker that started them. These stores keep every task record in one place:
+
+- SQLiteTaskStore: default, a SQLite database in WAL mode
+- RedisTaskStore: anything speaking the Redis protocol (redis-py client,
+  or a fakeredis client in tests)
+
+Reads are cached for a short time so dashboards polling /tasks stay cheap.
+Writes made by this process update the cache right away.
+"""
+import json
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+Statuses = Union[str, Iterable[str], None]
+
+
+def _matches(task: Dict, expected: Statuses, match: Optional[Dict]) -> bool:
+    if match and any(task.get(key) != value for key, value in match.items()):
+        return False
+    status = task.get("status")
+    if expected is None:
+        return True
+    if isinstance(expected, str):
+        return status == expected
+    return status in expected
+
+
+class TaskStore:
+    """Base class: read caching on top of the backend specific _insert/_load/_modify methods"""
+
+    def __init__(self, cache_ttl: float = 1.0):
+        self.cache_ttl = cache_ttl
+        self._cache: Dict[str, tuple] = {}
+        self._list_cache: Optional[tuple] = None
+        self._lock = threading.Lock()
+
+    # ----- public API -----
+
+    def create(self, task: Dict):
+        """Store a new task record (must contain "id")"""
+        self._insert(task)
+        self._remember(task)
+
+    def get(self, task_id: str, fresh: bool = False) -> Optional[Dict]:
+        """Return a copy of the task record, or None if it does not exist"""
+        now = time.time()
+        if not fresh:
+            with self._lock:
+                cached = self._cache.get(task_id)
+            if cached and cached[0] > now:
+                return dict(cached[1]) if cached[1] is not None else None
+
+        task = self._load(task_id)
+        with self._lock:
+            self._cache[task_id] = (now + self.cache_ttl, task)
+        return dict(task) if task is not None else None
+
+    def list(self, fresh: bool = False) -> List[Dict]:
+        """All task records, newest first"""
+        now = time.time()
+        with self._lock:
+            cached = self._list_cache
+        if not fresh and cached and cached[0] > now:
+            return [dict(task) for task in cached[1]]
+
+        tasks = self._load_all()
+        with self._lock:
+            self._list_cache = (now + self.cache_ttl, tasks)
+        return [dict(task) for task in tasks]
+
+    def update(self, task_id: str, **fields) -> bool:
+        """Merge fields into a task record. Returns False if the task does not exist"""
+        return self.set_status(task_id, None, **fields)
+
+    def set_status(self, task_id: str, status: Optional[str], expected: Statuses = None,
+                   match: Optional[Dict] = None, **fields) -> bool:
+        """
+        Atomically change a task (compare-and-set).
+        The change is only applied if the current status is in `expected`
+        and every field in `match` has the given value.
+        """
+        if status is not None:
+            fields["status"] = status
+        return self.modify(task_id, lambda task: fields if _matches(task, expected, match) else None) is not None
+
+    def modify(self, task_id: str, change: Callable[[Dict], Optional[Dict]]) -> Optional[Dict]:
+        """
+        Atomic read-modify-write: change(task) gets the current record and returns the fields
+        to merge into it, or None to leave it as is. Returns the new record (None if unchanged).
+        change() can run more than once (Redis retries on conflicts), so it must not have side effects
+        """
+        task = self._modify(task_id, change)
+        if task is not None:
+            self._remember(task)
+        return task
+
+    def save_checkpoint(self, task_id: str, state: Dict):
+        """Persist the resume state (cursor, partial aggregates) of a task"""
+        raise NotImplementedError
+
+    def load_checkpoint(self, task_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def delete_checkpoint(self, task_id: str):
+        raise NotImplementedError
+
+    def flush(self):
+        """Write out anything buffered by the backend (run last at shutdown)"""
+
+    def close(self):
+        """Release backend resources"""
+
+    # ----- cache helpers -----
+
+    def _remember(self, task: Dict):
+        with self._lock:
+            self._cache[task["id"]] = (time.time() + self.cache_ttl, task)
+            if self._list_cache:
+                expires, tasks = self._list_cache
+                if any(item["id"] == task["id"] for item in tasks):
+                    tasks = [task if item["id"] == task["id"] else item for item in tasks]
+                else:
+                    tasks = [task] + tasks
+                self._list_cache = (expires, tasks)
+
+    # ----- backend specific -----
+
+    def _insert(self, task: Dict):
+        raise NotImplementedError
+
+    def _load(self, task_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def _load_all(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def _modify(self, task_id: str, change: Callable[[Dict], Optional[Dict]]) -> Optional[Dict]:
+        """Merge the fields returned by change(task) in one transaction; return the new record or None"""
+        raise NotImplementedError
+
+
+class SQLiteTaskStore(TaskStore):
+    """Task records in a shared SQLite database (WAL mode, one connection per thread)"""
+
+    def __init__(self, database: str = "tasks.db", cache_ttl: float = 1.0):
+        super().__init__(cache_ttl)
+        self.database = database
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                start_time TEXT,
+                data TEXT NOT NULL,
+                updated_at REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_start_time ON tasks (start_time)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                task_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                updated_at REAL
+            )
+        ''')
+        conn.commit()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: transactions are opened explicitly below
+            conn = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, task: Dict):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO tasks (id, status, start_time, data, updated_at) VALUES (?, ?, ?, ?, ?)',
+            (task["id"], task.get("status", "pending"), task.get("start_time"), json.dumps(task), time.time())
+        )
+
+    def _load(self, task_id: str) -> Optional[Dict]:
+        row = self._connect().execute('SELECT data FROM tasks WHERE id = ?', (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _load_all(self) -> List[Dict]:
+        rows = self._connect().execute('SELECT data FROM tasks ORDER BY start_time DESC').fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _modify(self, task_id: str, change: Callable[[Dict], Optional[Dict]]) -> Optional[Dict]:
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock before reading, so read-modify-write is atomic
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute('SELECT data FROM tasks WHERE id = ?', (task_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            task = json.loads(row[0])
+            fields = change(task)
+            if fields is None:
+                conn.execute("ROLLBACK")
+                return None
+            task.update(fields)
+            conn.execute(
+                'UPDATE tasks SET status = ?, data = ?, updated_at = ? WHERE id = ?',
+                (task["status"], json.dumps(task), time.time(), task_id)
+            )
+            conn.execute("COMMIT")
+            return task
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def save_checkpoint(self, task_id: str, state: Dict):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO checkpoints (task_id, state, updated_at) VALUES (?, ?, ?)',
+            (task_id, json.dumps(state), time.time())
+        )
+
+    def load_checkpoint(self, task_id: str) -> Optional[Dict]:
+        row = self._connect().execute('SELECT state FROM checkpoints WHERE task_id = ?', (task_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete_checkpoint(self, task_id: str):
+        self._connect().execute('DELETE FROM checkpoints WHERE task_id = ?', (task_id,))
+
+    def flush(self):
+        """Copy the WAL into the database file, so nothing committed is left only in the -wal file"""
+        self._connect().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RedisTaskStore(TaskStore):
+    """
+    Task records as JSON strings in Redis, indexed by a sorted set on start time.
+    `client` is a redis.Redis instance (or fakeredis.FakeRedis for local testing).
+    """
+
+    def __init__(self, client, prefix: str = "tasks", cache_ttl: float = 1.0):
+        super().__init__(cache_ttl)
+        self.client = client
+        self.prefix = prefix
+        self.index_key = f"{prefix}:index"
+
+    def _key(self, task_id: str) -> str:
+        return f"{self.prefix}:{task_id}"
+
+    def _insert(self, task: Dict):
+        pipe = self.client.pipeline()
+        pipe.set(self._key(task["id"]), json.dumps(task))
+        pipe.zadd(self.index_key, {task["id"]: time.time()})
+        pipe.execute()
+
+    def _load(self, task_id: str) -> Optional[Dict]:
+        raw = self.client.get(self._key(task_id))
+        return json.loads(raw) if raw else None
+
+    def _load_all(self) -> List[Dict]:
+        task_ids = self.client.zrevrange(self.index_key, 0, -1)
+        if not task_ids:
+            return []
+        task_ids = [t.decode() if isinstance(t, bytes) else t for t in task_ids]
+        values = self.client.mget([self._key(task_id) for task_id in task_ids])
+        return [json.loads(raw) for raw in values if raw]
+
+    def _modify(self, task_id: str, change: Callable[[Dict], Optional[Dict]]) -> Optional[Dict]:
+        from redis.exceptions import WatchError
+
+        key = self._key(task_id)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    # Optimistic transaction: retry if someone else changed the key meanwhile
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    if not raw:
+                        return None
+                    task = json.loads(raw)
+                    fields = change(task)
+                    if fields is None:
+                        return None
+                    task.update(fields)
+                    pipe.multi()
+                    pipe.set(key, json.dumps(task))
+                    pipe.execute()
+                    return task
+                except WatchError:
+                    continue
+
+    def save_checkpoint(self, task_id: str, state: Dict):
+        self.client.set(f"{self.prefix}:checkpoint:{task_id}", json.dumps(state))
+
+    def load_checkpoint(self, task_id: str) -> Optional[Dict]:
+        raw = self.client.get(f"{self.prefix}:checkpoint:{task_id}")
+        return json.loads(raw) if raw else None
+
+    def delete_checkpoint(self, task_id: str):
+        self.client.delete(f"{self.prefix}:checkpoint:{task_id}")
+
+
+def create_task_store(url: str, cache_ttl: float = 1.0) -> TaskStore:
+    """
+    Build a task store from a URL:
+      sqlite:///tasks.db           - shared SQLite file (default)
+      redis://localhost:6379/0     - Redis server (needs `pip install redis`)
+    """
+    if url.startswith("sqlite:///"):
+        return SQLiteTaskStore(url[len("sqlite:///"):], cache_ttl=cache_ttl)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis
+        return RedisTaskStore(redis.Redis.from_url(url), cache_ttl=cache_ttl)
+    raise ValueError(f"Unsupported task store URL: {url}")
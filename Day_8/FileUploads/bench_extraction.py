@@ -0,0 +1,148 @@
+"""
+Throughput of the text extraction pipeline on a mixed batch of pdf, docx and txt files.
+
+    python bench_extraction.py [--documents 150] [--pages 5] [--workers 1,2,4]
+
+Generates the batch in a temporary folder (a third of each kind; text files in
+UTF-8, UTF-16 and cp1252), then reports documents per second:
+
+1. In one thread, per kind (iter_document_pages, no pool)
+2. Through TextExtractor with each number of worker processes, pool start-up excluded
+"""
+import argparse
+import os
+import tempfile
+import time
+import zipfile
+
+from extraction_jobs import TextExtractor
+from extractors import iter_document_pages, kind_for
+
+WORDS = ("extraction pipeline benchmark document page text paragraph naïve café "
+         "résumé throughput worker process stream encoding").split()
+
+
+def sentence(i: int, length: int = 12) -> str:
+    return " ".join(WORDS[(i * 7 + j) % len(WORDS)] for j in range(length))
+
+
+def write_pdf(path: str, pages: int, lines: int = 30):
+    """A minimal PDF with one Helvetica text stream per page"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>",
+               f"<< /Type /Pages /Kids [{' '.join(f'{4 + 2 * i} 0 R' for i in range(pages))}] /Count {pages} >>",
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for page in range(pages):
+        text = " ".join(f"({sentence(page * lines + line).encode('ascii', 'replace').decode()}) Tj T*"
+                        for line in range(lines))
+        stream = f"BT /F1 10 Tf 12 TL 50 780 Td {text} ET".encode()
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * page} 0 R >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream.decode()}\nendstream")
+    data, offsets = bytearray(b"%PDF-1.4\n"), []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def write_docx(path: str, pages: int, paragraphs: int = 30):
+    w = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    body = []
+    for page in range(pages):
+        body += [f"<w:p><w:r><w:t>{sentence(page * paragraphs + i)}</w:t><w:tab/><w:t>{i}</w:t></w:r></w:p>"
+                 for i in range(paragraphs)]
+        if page < pages - 1:
+            body.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", '<?xml version="1.0"?><Types xmlns="http://schemas.openxmlformats.org/'
+                         'package/2006/content-types"/>')
+        archive.writestr("word/document.xml", f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{w}">'
+                         f'<w:body>{"".join(body)}</w:body></w:document>')
+        archive.writestr("docProps/core.xml", '<?xml version="1.0"?><cp:coreProperties xmlns:cp="http://schemas.'
+                         'openxmlformats.org/package/2006/metadata/core-properties" xmlns:dc="http://purl.org/dc/'
+                         'elements/1.1/"><dc:title>Benchmark</dc:title><dc:creator>bench</dc:creator>'
+                         '</cp:coreProperties>')
+
+
+def write_txt(path: str, pages: int, encoding: str, lines: int = 30):
+    text = "\f".join("\n".join(sentence(page * lines + line) for line in range(lines)) for page in range(pages))
+    with open(path, "w", encoding=encoding, errors="replace") as f:
+        f.write(text)
+
+
+def make_batch(folder: str, documents: int, pages: int):
+    paths = []
+    encodings = ("utf-8", "utf-16", "cp1252")
+    for i in range(documents):
+        kind = ("pdf", "docx", "txt")[i % 3]
+        path = os.path.join(folder, f"doc{i}.{kind}")
+        if kind == "pdf":
+            write_pdf(path, pages)
+        elif kind == "docx":
+            write_docx(path, pages)
+        else:
+            write_txt(path, pages, encodings[(i // 3) % len(encodings)])
+        paths.append(path)
+    return paths
+
+
+def serial(paths):
+    by_kind = {}
+    for path in paths:
+        kind = kind_for(path)
+        started = time.perf_counter()
+        pages = sum(1 for _ in iter_document_pages(path, kind))
+        elapsed, count, total_pages = by_kind.get(kind, (0.0, 0, 0))
+        by_kind[kind] = (elapsed + time.perf_counter() - started, count + 1, total_pages + pages)
+    return by_kind
+
+
+def pooled(paths, workers: int) -> float:
+    extractor = TextExtractor(max_workers=workers, timeout=60)
+    # Start the worker processes before timing: spawn start-up is paid once per server, not per batch
+    warmup = [extractor.submit(paths[i % len(paths)]) for i in range(workers)]
+    while not all(job.done() for job in warmup):
+        time.sleep(0.01)
+    started = time.perf_counter()
+    jobs = [extractor.submit(path) for path in paths]
+    while not all(job.done() for job in jobs):
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    failed = [job for job in jobs if job.status != "completed"]
+    extractor.shutdown()
+    if failed:
+        raise RuntimeError(f"{len(failed)} extractions failed, e.g. {failed[0].name}: {failed[0].error}")
+    return len(paths) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--documents", type=int, default=150)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--workers", default=f"1,2,{os.cpu_count() or 4}")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = make_batch(folder, args.documents, args.pages)
+        size = sum(os.path.getsize(path) for path in paths)
+        print(f"{len(paths)} documents, {args.pages} pages each, {size / 1024 / 1024:.1f} MB")
+
+        print("1. One thread, no pool")
+        total_elapsed = 0.0
+        for kind, (elapsed, count, pages) in sorted(serial(paths).items()):
+            total_elapsed += elapsed
+            print(f"   {kind:5} {count / elapsed:8.1f} docs/s  {pages / elapsed:8.1f} pages/s")
+        print(f"   mixed {len(paths) / total_elapsed:8.1f} docs/s")
+
+        print("2. TextExtractor process pool")
+        for workers in sorted({int(w) for w in args.workers.split(",")}):
+            print(f"   {workers:2} workers {pooled(paths, workers):8.1f} docs/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark of the rate-limit storages: cost per check and the limit seen across processes.
+
+    python bench_ratelimit.py [--checks 20000] [--processes 4]
+
+1. Cost of one sliding window check (acquire_sliding_window_entry) in memory and in SQLite
+2. Overhead per Flask request: the same view without a limit, with memory storage, with SQLite
+3. Several processes hitting one key limited to 100 per minute: how many hits get through in total
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from flask import Flask
+from flask_limiter import Limiter
+from limits.storage import MemoryStorage
+
+from rate_limit_storage import SQLiteStorage
+
+
+def time_checks(storage, checks: int, clients: int = 1000) -> float:
+    """Microseconds per check, spread over `clients` keys so few of them are refused"""
+    started = time.perf_counter()
+    for i in range(checks):
+        storage.acquire_sliding_window_entry(f"bench/{i % clients}", 1000, 60)
+    return (time.perf_counter() - started) / checks * 1e6
+
+
+def time_requests(storage_uri, requests: int) -> float:
+    """Microseconds per GET through the Flask test client (no limiter if storage_uri is None)"""
+    app = Flask(__name__)
+    limiter = Limiter(lambda: "client", app=app, storage_uri=storage_uri or "memory://",
+                      strategy="sliding-window-counter", enabled=storage_uri is not None)
+
+    @app.route("/")
+    @limiter.limit("1000000 per minute")
+    def index():
+        return "ok"
+
+    client = app.test_client()
+    client.get("/")
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get("/")
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def _hit(uri: str, attempts: int, results):
+    storage = SQLiteStorage(uri)
+    results.put(sum(storage.acquire_sliding_window_entry("shared", 100, 60) for _ in range(attempts)))
+
+
+def shared_limit(uri: str, processes: int, attempts: int) -> int:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [context.Process(target=_hit, args=(uri, attempts, results)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    total = sum(results.get() for _ in workers)
+    for worker in workers:
+        worker.join()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--checks", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        uri = f"sqlite:///{os.path.join(folder, 'ratelimits.db')}"
+
+        print(f"1. Sliding window check, {args.checks} checks")
+        print(f"   memory   {time_checks(MemoryStorage(), args.checks):8.1f} µs/check")
+        print(f"   sqlite   {time_checks(SQLiteStorage(uri), args.checks):8.1f} µs/check")
+
+        print(f"2. Flask request, {args.requests} requests")
+        baseline = time_requests(None, args.requests)
+        print(f"   no limit {baseline:8.1f} µs/request")
+        for name, storage_uri in (("memory", "memory://"), ("sqlite", uri)):
+            elapsed = time_requests(storage_uri, args.requests)
+            print(f"   {name:8} {elapsed:8.1f} µs/request (+{elapsed - baseline:.1f})")
+
+        print(f"3. {args.processes} processes x 200 hits on one key, limit 100 per minute")
+        print(f"   sqlite   {shared_limit(uri, args.processes, 200)} hits allowed "
+              f"(memory storage would allow {args.processes * 100})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,499 @@
+"""
+Content-addressed storage for uploads.
+
+File contents are stored once per SHA-256 under "<folder>/blobs/<sha256>".
+Logical filenames map to blobs through a SQLite table, and every blob keeps
+a reference count of the names pointing at it:
+
+    files (name -> sha256, size, content_type, uploaded_at)
+    blobs (sha256 -> size, refcount, created_at)
+
+Uploading the same bytes under another name only adds a row. Deleting a
+name drops one reference, and the blob is removed with its last name. Both
+happen inside one write transaction, so a concurrent upload of the same
+content can never end up pointing at a removed blob.
+
+The files table doubles as the upload catalog: query() pages, sorts and
+filters it through indexes instead of scanning the folder, and reconcile()
+rebuilds its bookkeeping from what is actually on disk.
+
+Blobs are spread over subfolders so no single directory grows past a few
+thousand entries (lookups and listings of huge directories are slow):
+
+    layout="hash"   blobs/ab/cd/abcd...     first hash_levels pairs of hex digits
+    layout="date"   blobs/2024-05-01/...    day the content was first stored
+    layout="flat"   blobs/<sha256>          the original layout
+
+Each blob row records its path, so changing the layout needs no downtime:
+migrate() moves blobs over one at a time (hard link, update the row, commit)
+while the app keeps serving. The old path is unlinked only after a grace
+period, so a request that looked a path up just before the move can still
+open it, and blob_path() falls back to the other layouts for files whose
+row is out of date.
+
+Files derived from a blob (thumbnails) can be kept next to it as
+"<sha256>.<suffix>": suffixes listed in `companions` move with the blob
+and are deleted with it.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+SORT_COLUMNS = {"name", "size", "uploaded_at", "content_type"}
+_BLOB_NAME = re.compile(r"^([0-9a-f]{64})(?:\.(.+))?$")  # a blob or one of its companions
+_SQLITE_FILE = re.compile(r"\.db(-wal|-shm|-journal)?$")
+LAYOUTS = {"flat", "hash", "date"}
+
+
+def _time_bound(value: str, field: str, end_of_day: bool = False) -> Tuple[str, bool]:
+    """
+    An ISO date or timestamp as the uploaded_at string it compares against (local time,
+    datetime.isoformat()), and whether the bound is exclusive. A bare date given with
+    end_of_day=True means up to the end of that day: the next midnight, exclusive.
+    """
+    try:
+        if end_of_day and len(value) == 10:
+            return (date.fromisoformat(value) + timedelta(days=1)).isoformat() + "T00:00:00", True
+        moment = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an ISO date or timestamp, e.g. 2024-05-01 or 2024-05-01T13:30:00")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return moment.isoformat(), False
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """Logical filenames -> reference-counted blobs (SQLite in WAL mode, one connection per thread)"""
+
+    def __init__(self, folder: str, database: Optional[str] = None, layout: str = "hash", hash_levels: int = 2):
+        if layout not in LAYOUTS:
+            raise ValueError(f"layout must be one of: {', '.join(sorted(LAYOUTS))}")
+        self.folder = folder
+        self.blob_folder = os.path.join(folder, "blobs")
+        self.database = database or os.path.join(folder, "files.db")
+        self.layout = layout
+        self.hash_levels = hash_levels
+        self.migration = {"status": "idle", "checked": 0, "moved": 0, "failed": 0}
+        self.companions = set()  # suffixes of derived files kept next to each blob
+        os.makedirs(self.blob_folder, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                refcount INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                path TEXT
+            )
+        ''')
+        # Stores created before sharded layouts: their blobs are flat (path NULL)
+        if "path" not in {row["name"] for row in conn.execute('PRAGMA table_info(blobs)')}:
+            conn.execute('ALTER TABLE blobs ADD COLUMN path TEXT')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS files (
+                name TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL REFERENCES blobs (sha256),
+                size INTEGER NOT NULL,
+                content_type TEXT,
+                uploaded_at TEXT NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files (sha256)')
+        # Catalog queries: sort and filter columns
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_files_uploaded_at ON files (uploaded_at, name)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_files_size ON files (size, name)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_files_content_type ON files (content_type, uploaded_at, name)')
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: transactions are opened explicitly below
+            conn = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def layout_path(self, sha256: str, created_at: Optional[str] = None, layout: Optional[str] = None) -> str:
+        """Where `layout` (default: the configured one) puts this blob, relative to the blob folder"""
+        layout = layout or self.layout
+        if layout == "hash":
+            return os.path.join(*[sha256[i:i + 2] for i in range(0, 2 * self.hash_levels, 2)], sha256)
+        if layout == "date":
+            return os.path.join((created_at or datetime.now().isoformat())[:10], sha256)
+        return sha256
+
+    def blob_path(self, sha256: str) -> str:
+        """Path of a stored blob: the one recorded for it, or wherever another layout put it"""
+        row = self._connect().execute('SELECT path, created_at FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()
+        if row is None:
+            return os.path.join(self.blob_folder, self.layout_path(sha256))
+        recorded = os.path.join(self.blob_folder, row["path"] or sha256)
+        if os.path.exists(recorded):
+            return recorded
+        for layout in ("flat", "hash", "date"):
+            candidate = os.path.join(self.blob_folder, self.layout_path(sha256, row["created_at"], layout))
+            if os.path.exists(candidate):
+                return candidate
+        return recorded
+
+    def companion_path(self, sha256: str, suffix: str, blob: Optional[str] = None) -> str:
+        """Where a file derived from this blob is kept: next to it, as <sha256>.<suffix>"""
+        return f"{blob or self.blob_path(sha256)}.{suffix}"
+
+    def _companion_paths(self, blob: str) -> List[str]:
+        return [path for path in (f"{blob}.{suffix}" for suffix in self.companions) if os.path.exists(path)]
+
+    # ----- lookups -----
+
+    def exists(self, name: str) -> bool:
+        return self._connect().execute('SELECT 1 FROM files WHERE name = ?', (name,)).fetchone() is not None
+
+    def get(self, name: str) -> Optional[Dict]:
+        row = self._connect().execute('SELECT * FROM files WHERE name = ?', (name,)).fetchone()
+        return dict(row) if row else None
+
+    def path(self, name: str) -> Optional[str]:
+        """Path of the blob holding `name`, or None if there is no such file"""
+        entry = self.get(name)
+        return self.blob_path(entry["sha256"]) if entry else None
+
+    def names_for(self, hashes) -> Dict[str, List[str]]:
+        """sha256 -> the logical filenames storing that content (hashes without names are left out)"""
+        hashes = list(hashes)
+        names: Dict[str, List[str]] = {}
+        for i in range(0, len(hashes), 500):
+            batch = hashes[i:i + 500]
+            rows = self._connect().execute(
+                f'SELECT sha256, name FROM files WHERE sha256 IN ({",".join("?" * len(batch))}) ORDER BY name', batch)
+            for sha256, name in rows:
+                names.setdefault(sha256, []).append(name)
+        return names
+
+    def list(self) -> List[Dict]:
+        """All logical files, newest first"""
+        rows = self._connect().execute('SELECT * FROM files ORDER BY uploaded_at DESC, name').fetchall()
+        return [dict(row) for row in rows]
+
+    def query(self, page: int = 1, per_page: int = 50, sort: str = "uploaded_at", order: str = "desc",
+              name: Optional[str] = None, content_type: Optional[str] = None,
+              min_size: Optional[int] = None, max_size: Optional[int] = None,
+              since: Optional[str] = None, until: Optional[str] = None) -> Tuple[List[Dict], int]:
+        """
+        One page of the catalog and the number of matching files.
+        name: substring of the filename; content_type: exact ("application/pdf") or a prefix ending
+        in "/" ("image/"); since/until: ISO dates or timestamps, both inclusive (until=2024-05-01 covers
+        that whole day). Raises ValueError for unknown sort columns and unreadable dates.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"sort must be one of: {', '.join(sorted(SORT_COLUMNS))}")
+        if order not in ("asc", "desc"):
+            raise ValueError("order must be asc or desc")
+        conditions, params = [], []
+        if name:
+            conditions.append("name LIKE ? ESCAPE '\\'")
+            params.append("%" + re.sub(r"([%_\\])", r"\\\1", name) + "%")
+        if content_type:
+            if content_type.endswith("/"):
+                # A range instead of LIKE, so the content_type index is used
+                conditions.append("content_type >= ? AND content_type < ?")
+                params += [content_type, content_type[:-1] + "0"]  # "0" sorts right after "/"
+            else:
+                conditions.append("content_type = ?")
+                params.append(content_type)
+        bounds = [("size", ">=", min_size), ("size", "<=", max_size)]
+        if since:
+            bounds.append(("uploaded_at", ">=", _time_bound(since, "since")[0]))
+        if until:
+            until, exclusive = _time_bound(until, "until", end_of_day=True)
+            bounds.append(("uploaded_at", "<" if exclusive else "<=", until))
+        for column, operator, value in bounds:
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        conn = self._connect()
+        total = conn.execute(f'SELECT COUNT(*) FROM files {where}', params).fetchone()[0]
+        rows = conn.execute(f'SELECT * FROM files {where} ORDER BY {sort} {order}, name {order} LIMIT ? OFFSET ?',
+                            params + [per_page, (page - 1) * per_page]).fetchall()
+        return [dict(row) for row in rows], total
+
+    def stats(self) -> Dict:
+        """What deduplication saves: bytes uploaded (logical) vs bytes on disk (stored)"""
+        conn = self._connect()
+        files, logical = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files').fetchone()
+        blobs, stored = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs').fetchone()
+        return {
+            "files": files,
+            "blobs": blobs,
+            "duplicates": files - blobs,
+            "logical_bytes": logical,
+            "stored_bytes": stored,
+            "saved_bytes": logical - stored,
+            "dedup_ratio": round(logical / stored, 2) if stored else 1.0,
+            "layout": self.layout,
+            "migration": dict(self.migration),
+        }
+
+    # ----- changes -----
+
+    def add(self, name: str, upload, content_type: Optional[str] = None) -> Dict:
+        """
+        Store a finished upload (streaming_upload.UploadedFile) under `name`.
+        If the content is already stored the upload is discarded and the blob gains
+        a reference. Raises FileExistsError if the name is taken (the upload is left as is).
+        """
+        upload.close()
+        # The extension decides the type; the client's Content-Type header is only a fallback
+        content_type = content_type or mimetypes.guess_type(name)[0] or upload.content_type
+        entry = self._link(name, upload.sha256, upload.size, content_type, lambda path: upload.move_to(path))
+        if entry["deduplicated"]:
+            upload.discard()
+        return entry
+
+    def add_file(self, name: str, path: str, content_type: Optional[str] = None,
+                 sha256: Optional[str] = None) -> Dict:
+        """Move an existing file on the same filesystem into the store under `name` (hashed unless sha256 is given)"""
+        content_type = content_type or mimetypes.guess_type(name)[0] or "application/octet-stream"
+        entry = self._link(name, sha256 or file_sha256(path), os.path.getsize(path), content_type,
+                           lambda target: os.replace(path, target))
+        if entry["deduplicated"]:
+            os.remove(path)
+        return entry
+
+    def _link(self, name: str, sha256: str, size: int, content_type: Optional[str], move) -> Dict:
+        conn = self._connect()
+        uploaded_at = datetime.now().isoformat()
+        # BEGIN IMMEDIATE: no delete can drop the blob between the lookup and the new reference
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute('SELECT 1 FROM files WHERE name = ?', (name,)).fetchone():
+                raise FileExistsError(name)
+            known = conn.execute('SELECT 1 FROM blobs WHERE sha256 = ?', (sha256,)).fetchone() is not None
+            if known:
+                conn.execute('UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ?', (sha256,))
+            else:
+                relative = self.layout_path(sha256, uploaded_at)
+                path = os.path.join(self.blob_folder, relative)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                move(path)
+                conn.execute('INSERT INTO blobs (sha256, size, refcount, created_at, path) VALUES (?, ?, 1, ?, ?)',
+                             (sha256, size, uploaded_at, relative))
+            conn.execute('INSERT INTO files (name, sha256, size, content_type, uploaded_at) VALUES (?, ?, ?, ?, ?)',
+                         (name, sha256, size, content_type, uploaded_at))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {"name": name, "sha256": sha256, "size": size, "content_type": content_type,
+                "uploaded_at": uploaded_at, "deduplicated": known}
+
+    def delete(self, name: str) -> bool:
+        """Remove a logical file; its blob goes when no other name references it. False if unknown"""
+        conn = self._connect()
+        trash = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute('SELECT sha256 FROM files WHERE name = ?', (name,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return False
+            sha256 = row["sha256"]
+            blob = self.blob_path(sha256)
+            conn.execute('DELETE FROM files WHERE name = ?', (name,))
+            conn.execute('UPDATE blobs SET refcount = refcount - 1 WHERE sha256 = ?', (sha256,))
+            refcount = conn.execute('SELECT refcount FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()[0]
+            if refcount <= 0:
+                conn.execute('DELETE FROM blobs WHERE sha256 = ?', (sha256,))
+                # Rename first and unlink after the commit, so a failed commit can put it back
+                trash = os.path.join(self.folder, f".delete-{uuid.uuid4().hex}")
+                if os.path.exists(blob):
+                    os.replace(blob, trash)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            if trash and os.path.exists(trash):
+                os.replace(trash, blob)
+            raise
+        if trash and os.path.exists(trash):
+            os.remove(trash)
+            for companion in self._companion_paths(blob):
+                os.remove(companion)
+        return True
+
+    def import_folder(self, folder: Optional[str] = None) -> int:
+        """Adopt plain files left in `folder` (uploads stored before this store existed). Returns the count"""
+        folder = folder or self.folder
+        database = os.path.abspath(self.database)
+        imported = 0
+        for entry in os.scandir(folder):
+            if entry.name.startswith('.') or not entry.is_file() or os.path.abspath(entry.path).startswith(database) \
+                    or _SQLITE_FILE.search(entry.name):
+                continue  # partial uploads, folders, files.db and other SQLite databases kept next to the uploads
+            try:
+                self.add_file(entry.name, entry.path)
+                imported += 1
+            except FileExistsError:
+                pass
+        return imported
+
+    def reconcile(self, prune: bool = False) -> Dict:
+        """
+        Rebuild the catalog bookkeeping from disk: adopt plain files left in the folder, drop
+        names whose blob is gone, fix sizes and reference counts, and report blobs no name
+        points at (removed with prune=True). Returns what was changed.
+        """
+        report = {"imported": self.import_folder(), "missing_blobs": 0, "dropped_files": 0,
+                  "sizes_fixed": 0, "paths_fixed": 0, "refcounts_fixed": 0, "orphan_blobs": 0,
+                  "stale_copies": 0, "pruned": 0}
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sha256, size, recorded in conn.execute('SELECT sha256, size, path FROM blobs').fetchall():
+                path = self.blob_path(sha256)
+                relative = os.path.relpath(path, self.blob_folder)
+                if os.path.exists(path) and relative != (recorded or sha256):
+                    report["paths_fixed"] += 1
+                    conn.execute('UPDATE blobs SET path = ? WHERE sha256 = ?', (relative, sha256))
+                if not os.path.exists(path):
+                    report["missing_blobs"] += 1
+                    report["dropped_files"] += conn.execute('DELETE FROM files WHERE sha256 = ?', (sha256,)).rowcount
+                    conn.execute('DELETE FROM blobs WHERE sha256 = ?', (sha256,))
+                elif os.path.getsize(path) != size:
+                    report["sizes_fixed"] += 1
+                    conn.execute('UPDATE blobs SET size = ? WHERE sha256 = ?', (os.path.getsize(path), sha256))
+                    conn.execute('UPDATE files SET size = ? WHERE sha256 = ?', (os.path.getsize(path), sha256))
+            report["dropped_files"] += conn.execute(
+                'DELETE FROM files WHERE sha256 NOT IN (SELECT sha256 FROM blobs)').rowcount
+            report["refcounts_fixed"] = conn.execute(
+                'UPDATE blobs SET refcount = (SELECT COUNT(*) FROM files WHERE files.sha256 = blobs.sha256) '
+                'WHERE refcount != (SELECT COUNT(*) FROM files WHERE files.sha256 = blobs.sha256)').rowcount
+            # A blob without names is an orphan: forget it here, its file is handled below
+            conn.execute('DELETE FROM blobs WHERE refcount = 0')
+            known = {sha256: path or sha256 for sha256, path in conn.execute('SELECT sha256, path FROM blobs')}
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        for folder, _, filenames in os.walk(self.blob_folder):
+            for filename in filenames:
+                match = _BLOB_NAME.match(filename)
+                if not match:
+                    continue
+                sha256, suffix = match.groups()
+                path = os.path.join(folder, filename)
+                if sha256 not in known:
+                    report["orphan_blobs"] += 1
+                elif os.path.relpath(path, self.blob_folder) != known[sha256] + (f".{suffix}" if suffix else ""):
+                    report["stale_copies"] += 1  # left behind by an interrupted migration
+                else:
+                    continue
+                if prune:
+                    os.remove(path)
+                    report["pruned"] += 1
+        return report
+
+    # ----- layout migration -----
+
+    def migrate(self, batch_size: int = 200, grace: float = 60, pause: float = 0.0) -> Dict:
+        """
+        Move every blob to the configured layout while the store stays in use. Each blob is
+        hard-linked at its new path and its row updated in a short transaction; the old path is
+        unlinked `grace` seconds later. Safe to run from several processes at once. Returns the counts.
+        """
+        self.migration = {"status": "running", "checked": 0, "moved": 0, "failed": 0}
+        started = time.time()
+        stale: "deque[Tuple[float, str]]" = deque()  # (when it may go, old path)
+        last = ""
+        while True:
+            rows = self._connect().execute('SELECT sha256 FROM blobs WHERE sha256 > ? ORDER BY sha256 LIMIT ?',
+                                           (last, batch_size)).fetchall()
+            if not rows:
+                break
+            for row in rows:
+                last = row["sha256"]
+                self.migration["checked"] += 1
+                try:
+                    old = self._move_blob(last)
+                except OSError as e:
+                    self.migration["failed"] += 1
+                    logger.error(f"❌ Could not move blob {last}: {str(e)}")
+                    continue
+                if old:
+                    self.migration["moved"] += 1
+                    stale.append((time.time() + grace, old))
+            while stale and stale[0][0] <= time.time():
+                self._remove_stale(stale.popleft()[1])
+            if pause:
+                time.sleep(pause)  # leave the disk to the requests for a moment
+        for due, old in stale:
+            time.sleep(max(due - time.time(), 0))
+            self._remove_stale(old)
+        self.migration["status"] = "finished"
+        if self.migration["moved"] or self.migration["failed"]:
+            logger.info(f"🗂️ Moved {self.migration['moved']} blobs to the {self.layout} layout "
+                        f"in {time.time() - started:.1f}s ({self.migration['failed']} failed)")
+        return dict(self.migration)
+
+    def _move_blob(self, sha256: str) -> Optional[str]:
+        """Put one blob at its layout path. Returns its old path if it moved"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute('SELECT path, created_at FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()
+            target = self.layout_path(sha256, row["created_at"]) if row else None
+            if row is None or row["path"] == target:
+                conn.execute("ROLLBACK")
+                return None
+            old = self.blob_path(sha256)
+            new = os.path.join(self.blob_folder, target)
+            os.makedirs(os.path.dirname(new), exist_ok=True)
+            if not os.path.exists(new):
+                # A hard link: the blob is at both paths until the old one is removed
+                os.link(old, new)
+            for companion in self._companion_paths(old):
+                if not os.path.exists(new + companion[len(old):]):
+                    os.link(companion, new + companion[len(old):])
+            conn.execute('UPDATE blobs SET path = ? WHERE sha256 = ?', (target, sha256))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return old if os.path.abspath(old) != os.path.abspath(new) else None
+
+    def _remove_stale(self, path: str):
+        try:
+            for companion in self._companion_paths(path):
+                os.remove(companion)
+            os.remove(path)
+            # Drop shard folders the move left empty
+            folder = os.path.dirname(path)
+            while os.path.abspath(folder) != os.path.abspath(self.blob_folder) and not os.listdir(folder):
+                os.rmdir(folder)
+                folder = os.path.dirname(folder)
+        except OSError:
+            pass  # already gone, or the folder gained a file
@@ -0,0 +1,106 @@
+"""
+Serve stored files with Range and conditional request support.
+
+send_stored_file() answers GET/HEAD for one file on disk:
+
+- ETag (strong, the content hash) and Last-Modified; If-None-Match and
+  If-Modified-Since give a 304 without opening the file
+- Range: bytes=start-end gives a 206 with Content-Range (416 when the range
+  is outside the file); If-Range falls back to the full file if it changed
+- the body is the server's wsgi.file_wrapper around the open file, so
+  servers that support it (gunicorn uses os.sendfile) copy the file to the
+  socket in the kernel without passing it through Python buffers
+
+werkzeug's own range support wraps the body in a Python iterator, which
+turns zero-copy off. So ranges are handled here: the file is positioned at
+the range start and only Content-Length limits how much is sent. gunicorn
+honours that, and so does every server for ranges that end at the end of
+the file. Other servers get a bounded generator for ranges inside the file.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import quote
+
+from flask import Response, request
+from werkzeug.http import http_date, is_resource_modified
+
+BLOCK_SIZE = 64 * 1024
+
+
+def _read_range(f, length: int):
+    try:
+        while length > 0:
+            data = f.read(min(BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
+
+
+def _file_body(f, length: int, to_end: bool):
+    """The response body for `length` bytes from the current position of f"""
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+    # Only gunicorn's wrapper is known to stop at Content-Length; any wrapper is fine up to EOF
+    bounded = request.environ.get("SERVER_SOFTWARE", "").startswith("gunicorn")
+    if file_wrapper is not None and (to_end or bounded):
+        return file_wrapper(f, BLOCK_SIZE)
+    return _read_range(f, length)
+
+
+def send_stored_file(path: str, download_name: str, mimetype: Optional[str] = None,
+                     etag: Optional[str] = None, last_modified: Optional[datetime] = None,
+                     as_attachment: bool = True, max_age: int = 0, immutable: bool = False) -> Response:
+    """
+    Response for the file at `path` (etag defaults to size + mtime, last_modified to the mtime).
+    immutable: the URL names this exact content, so shared caches may keep it for max_age
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = etag or f"{stat.st_mtime_ns:x}-{size:x}"
+    last_modified = (last_modified or datetime.fromtimestamp(stat.st_mtime, timezone.utc)).replace(microsecond=0)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.astimezone(timezone.utc)
+
+    headers = {
+        "ETag": f'"{etag}"',
+        "Last-Modified": http_date(last_modified),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": f"public, max-age={max_age}, immutable" if immutable else f"private, max-age={max_age}",
+        "Content-Disposition": f"{'attachment' if as_attachment else 'inline'}; "
+                               f"filename*=UTF-8''{quote(download_name)}",
+    }
+    mimetype = mimetype or "application/octet-stream"
+
+    # 304: the client's copy is current
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return Response(status=304, headers=headers)
+
+    start, stop, status = 0, size, 200
+    byte_range = request.range
+    if byte_range is not None and byte_range.units == "bytes" and len(byte_range.ranges) == 1:
+        # If-Range: only send part of the file if the client's copy is the current one
+        if_range = request.if_range
+        current = (if_range.etag is None and if_range.date is None) or \
+            (if_range.etag is not None and if_range.etag == etag) or \
+            (if_range.date is not None and if_range.date >= last_modified)
+        if current:
+            satisfiable = byte_range.range_for_length(size)
+            if satisfiable is None:
+                return Response(status=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+            start, stop = satisfiable
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+
+    length = stop - start
+    headers["Content-Length"] = str(length)
+    if request.method == "HEAD":
+        return Response(status=status, headers=headers, mimetype=mimetype)
+
+    f = open(path, "rb")
+    if start:
+        f.seek(start)
+    return Response(_file_body(f, length, stop == size), status=status, headers=headers,
+                    mimetype=mimetype, direct_passthrough=True)
@@ -0,0 +1,293 @@
+"""
+Document text extraction on a process pool.
+
+    extractor = TextExtractor(max_workers=2, timeout=60, max_pages=2000, max_memory_mb=512)
+    job = extractor.submit("uploads/blobs/<sha256>", name="report.pdf")   # returns at once
+    extractor.get(job.id).to_dict()   # status, pages_done / pages_total, metadata, text when completed
+
+Every format in extractors.py (pdf, docx, txt) goes through the same pool.
+Parsing is CPU bound (PyPDF2 is pure Python), so it runs in separate
+processes instead of the request thread. Worker processes report every
+finished page through a queue, which a listener thread applies to the job
+records. Limits, each enforced inside the worker process:
+
+- timeout: seconds per file (SIGALRM where available, otherwise checked between pages)
+- max_pages: larger documents fail (PDFs before any page is parsed)
+- max_chars: text beyond this is cut off
+- max_memory_mb: address-space limit of each worker process (Unix only)
+
+With a TextCache, finished extractions (page texts and metadata) are stored
+by content hash and a later submit() or iter_pages() for the same bytes
+never parses the file again.
+"""
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from extractors import ExtractionLimit, PageRanges, format_pages, iter_document_pages, kind_for, page_numbers
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+_progress = None  # progress queue of this worker process
+
+
+class ExtractionTimeout(Exception):
+    """The file took longer than the per-file timeout"""
+
+
+# ----- worker process side -----
+
+def _init_worker(progress, max_memory_mb: Optional[int]):
+    global _progress
+    _progress = progress
+    # Ctrl+C is handled by the parent, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if max_memory_mb and resource is not None:
+        limit = max_memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _on_alarm(signum, frame):
+    raise ExtractionTimeout()
+
+
+def _extract(job_id: str, path: str, kind: str, timeout: float, max_pages: int, max_chars: int) -> Dict:
+    started = time.monotonic()
+    alarm = hasattr(signal, "setitimer")
+    if alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        texts: List[str] = []
+        metadata: Dict = {}
+        for number, total, text in iter_document_pages(path, kind, max_pages=max_pages, max_chars=max_chars,
+                                                       metadata=metadata):
+            texts.append(text)
+            _progress.put((job_id, number, total))
+            if time.monotonic() - started > timeout:
+                raise ExtractionTimeout()
+        return {"pages": len(texts), "texts": texts, "metadata": metadata}
+    except ExtractionTimeout:
+        raise ExtractionTimeout(f"Extraction took longer than {timeout:g}s") from None
+    except MemoryError:
+        raise ExtractionLimit("Extraction went over the worker memory limit") from None
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+# ----- app side -----
+
+class ExtractionJob:
+    """Status, progress and result of one document"""
+
+    def __init__(self, path: str, name: str, kind: str):
+        self.id = str(uuid.uuid4())
+        self.path = path
+        self.name = name
+        self.kind = kind
+        self.status = "queued"
+        self.pages_done = 0
+        self.pages_total: Optional[int] = None
+        self.text: Optional[str] = None
+        self.metadata: Dict = {}
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cached = False
+        self.sha256: Optional[str] = None
+
+    def done(self) -> bool:
+        return self.status in ("completed", "failed", "timeout")
+
+    def to_dict(self, include_text: bool = True) -> Dict:
+        result = {
+            "id": self.id,
+            "name": self.name,
+            "kind": self.kind,
+            "status": self.status,
+            "pages_done": self.pages_done,
+            "pages_total": self.pages_total,
+            "progress": round(100 * self.pages_done / self.pages_total, 1) if self.pages_total else 0,
+            "error": self.error,
+            "cached": self.cached,
+            "metadata": self.metadata,
+            "duration": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None,
+        }
+        if include_text:
+            result["text"] = self.text
+        return result
+
+
+class TextExtractor:
+    """Process pool for document text extraction; the last keep_finished jobs stay queryable by ID"""
+
+    def __init__(self, max_workers: int = 2, timeout: float = 60, max_pages: int = 2000,
+                 max_memory_mb: Optional[int] = 512, keep_finished: int = 1000, cache=None,
+                 max_chars: int = 20_000_000):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.max_chars = max_chars
+        self.max_memory_mb = max_memory_mb
+        self.keep_finished = keep_finished
+        self.cache = cache  # text_cache.TextCache, or None
+        self._hooks: List[Callable[[ExtractionJob, List[str]], None]] = []
+        # spawn: never fork the threaded web server
+        self._context = multiprocessing.get_context("spawn")
+        self._progress = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: "OrderedDict[str, ExtractionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        # Started on first use, and again if a worker process died (e.g. killed by the OOM killer)
+        if self._executor is None:
+            if self._progress is None:
+                self._progress = self._context.Queue()
+                threading.Thread(target=self._listen, args=(self._progress,), daemon=True,
+                                 name="extraction-progress").start()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self._context,
+                                                 initializer=_init_worker,
+                                                 initargs=(self._progress, self.max_memory_mb))
+        return self._executor
+
+    def on_complete(self, hook: Callable[[ExtractionJob, List[str]], None]):
+        """Call hook(job, page texts) for every completed job, cached ones included"""
+        self._hooks.append(hook)
+        return hook
+
+    def _completed(self, job: ExtractionJob, texts: List[str]):
+        for hook in self._hooks:
+            try:
+                hook(job, texts)
+            except Exception as e:
+                logger.error(f"❌ Completion hook {getattr(hook, '__name__', hook)} failed for {job.name}: {str(e)}")
+
+    def submit(self, path: str, name: Optional[str] = None, sha256: Optional[str] = None,
+               kind: Optional[str] = None) -> ExtractionJob:
+        """
+        Queue a document (kind defaults to the extension of name); with its sha256 a cached
+        extraction completes the job right away. Raises ValueError for formats without an extractor
+        """
+        kind = kind or kind_for(name or path)
+        if kind is None:
+            raise ValueError(f"No text extractor for {name or path}")
+        job = ExtractionJob(path, name or path, kind)
+        job.sha256 = sha256
+        cached = self._cached(sha256)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_old()
+            if cached is not None:
+                job.started_at = job.finished_at = time.time()
+                job.text = format_pages(cached["texts"])
+                job.pages_done = job.pages_total = cached["pages"]
+                job.metadata = cached.get("metadata") or {}
+                job.cached = True
+                job.status = "completed"
+            else:
+                future = self._pool().submit(_extract, job.id, path, kind, self.timeout, self.max_pages,
+                                             self.max_chars)
+        if cached is not None:
+            self._completed(job, cached["texts"])
+        else:
+            future.add_done_callback(lambda f: self._finished(job, f))
+        return job
+
+    def iter_pages(self, path: str, kind: str, sha256: Optional[str] = None,
+                   pages: Optional[PageRanges] = None) -> Iterator[Tuple[int, Optional[int], str]]:
+        """iter_document_pages() in the calling thread, served from the text cache when this content was extracted before"""
+        cached = self._cached(sha256)
+        if cached is None:
+            return iter_document_pages(path, kind, pages, max_pages=self.max_pages, max_chars=self.max_chars)
+        texts = cached["texts"]
+        return ((number, len(texts), texts[number - 1]) for number in page_numbers(pages, len(texts)))
+
+    def _cached(self, sha256: Optional[str]) -> Optional[Dict]:
+        if self.cache is None or not sha256:
+            return None
+        try:
+            return self.cache.get(sha256)
+        except Exception as e:
+            logger.warning(f"⚠️ Text cache lookup failed: {str(e)}")
+            return None
+
+    def _listen(self, progress):
+        # The queue is passed in: shutdown() clears self._progress while this thread may still be reading
+        while True:
+            message = progress.get()
+            if message is None:
+                break
+            job_id, done, total = message
+            job = self.get(job_id)
+            if job is None or job.done():
+                continue
+            if job.status == "queued":
+                job.status = "running"
+                job.started_at = time.time()
+            job.pages_done, job.pages_total = done, total
+
+    def _finished(self, job: ExtractionJob, future):
+        job.finished_at = time.time()
+        job.started_at = job.started_at or job.finished_at
+        error = future.exception()
+        if error is None:
+            result = future.result()
+            job.text = format_pages(result["texts"])
+            job.pages_done = job.pages_total = result["pages"]
+            job.metadata = result["metadata"]
+            job.status = "completed"
+            logger.info(f"📄 Extracted {result['pages']} pages from {job.name} in "
+                        f"{job.finished_at - job.started_at:.2f}s")
+            if self.cache is not None and job.sha256:
+                try:
+                    self.cache.put(job.sha256, result["texts"], result["metadata"])
+                except Exception as e:
+                    logger.warning(f"⚠️ Could not cache the text of {job.name}: {str(e)}")
+            self._completed(job, result["texts"])
+            return
+
+        job.status = "timeout" if isinstance(error, ExtractionTimeout) else "failed"
+        job.error = str(error) or type(error).__name__
+        if isinstance(error, BrokenProcessPool):
+            job.error = "Worker process died (out of memory?)"
+            with self._lock:
+                self._executor = None
+        logger.error(f"❌ Text extraction of {job.name} {job.status}: {job.error}")
+
+    def _forget_old(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done()]
+        for job_id in finished[:max(len(finished) - self.keep_finished, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[ExtractionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[ExtractionJob]:
+        """All tracked jobs, newest first"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+        if self._progress is not None:
+            self._progress.put(None)
+            self._progress = None
@@ -0,0 +1,302 @@
+"""
+Text extractors for uploaded documents, one per file type.
+
+    for number, total, text in iter_document_pages("uploads/blobs/ab/cd/<sha256>", "docx", metadata=meta):
+        ...   # meta is filled in as the document is read: kind, title, author, encoding, pages, words...
+
+Every extractor is a generator registered for its file extensions with
+@extractor(...). It yields (page number, page count or None, raw text) one
+page at a time, reading the file as a stream:
+
+- pdf:  PyPDF2, parsing only the requested pages
+- docx: word/document.xml is read straight out of the zip with iterparse,
+        dropping each paragraph once its text is taken, so memory does not
+        grow with the document. Pages end at page breaks
+- txt:  decoded incrementally in 64KB chunks after detecting the encoding
+        (BOM, UTF-8, UTF-16 without BOM, then charset_normalizer if it is
+        installed, else cp1252). Pages end at form feeds
+
+iter_document_pages() normalizes every page the same way (Unicode NFKC,
+\\n line ends, no control characters, runs of blanks squeezed) and
+enforces the page and size limits. Adding a format means registering one
+more generator.
+"""
+import codecs
+import re
+import unicodedata
+import xml.etree.ElementTree as ET
+import zipfile
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import PyPDF2
+
+try:
+    from charset_normalizer import from_bytes as detect_charset
+except ImportError:  # optional: without it, text that is not UTF-8 or UTF-16 is read as cp1252
+    detect_charset = None
+
+# Part of the text cache and search index keys: bump the first part when extracted text changes
+EXTRACTOR_VERSION = f"2-pypdf2-{PyPDF2.__version__}"
+
+TEXT_CHUNK_SIZE = 64 * 1024
+DOCX_MAX_XML_BYTES = 256 * 1024 * 1024  # uncompressed document.xml; protects against zip bombs
+
+PageRanges = List[Tuple[int, Optional[int]]]
+PageIterator = Iterator[Tuple[int, Optional[int], str]]
+
+EXTRACTORS: Dict[str, Callable[..., PageIterator]] = {}
+
+
+class ExtractionLimit(Exception):
+    """The file is over a configured limit (e.g. too many pages)"""
+
+
+def extractor(*extensions: str):
+    """Register a page generator fn(path, metadata, pages, max_pages) for these file extensions"""
+    def register(fn):
+        for extension in extensions:
+            EXTRACTORS[extension] = fn
+        return fn
+    return register
+
+
+def kind_for(filename: str) -> Optional[str]:
+    """The extractor name for a filename ("pdf", "docx", "txt"), or None if it has no text to extract"""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return extension if extension in EXTRACTORS else None
+
+
+# ----- page ranges -----
+
+def parse_page_ranges(spec: Optional[str]) -> Optional[PageRanges]:
+    """
+    "10-20,25,30-" -> [(10, 20), (25, 25), (30, None)] (1-based, inclusive, None = to the end).
+    None or "" means all pages. Raises ValueError for malformed ranges.
+    """
+    if not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        start, dash, end = part.strip().partition("-")
+        try:
+            first = int(start)
+            last = (int(end) if end else None) if dash else first
+        except ValueError:
+            raise ValueError(f"Invalid page range: {part.strip()!r}") from None
+        if first < 1 or (last is not None and last < first):
+            raise ValueError(f"Invalid page range: {part.strip()!r}")
+        ranges.append((first, last))
+    return ranges
+
+
+def page_numbers(ranges: Optional[PageRanges], total: int) -> Iterator[int]:
+    if ranges is None:
+        yield from range(1, total + 1)
+        return
+    seen = set()
+    for first, last in ranges:
+        for number in range(first, min(last or total, total) + 1):
+            if number not in seen:
+                seen.add(number)
+                yield number
+
+
+def _wanted(number: int, ranges: Optional[PageRanges]) -> bool:
+    return ranges is None or any(first <= number and (last is None or number <= last) for first, last in ranges)
+
+
+# ----- normalization -----
+
+_CONTROL = re.compile(r"[\x00-\x08\x0b-\x1f\x7f-\x9f\u200b\ufeff]")  # keeps \t and \n
+_BLANKS = re.compile(r"[ \t\xa0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def normalize_text(text: str) -> str:
+    """One form for every extractor: NFKC (ligatures, full-width forms), \\n line ends, squeezed blanks"""
+    text = unicodedata.normalize("NFKC", text.replace("\r\n", "\n").replace("\r", "\n"))
+    text = _BLANKS.sub(" ", _CONTROL.sub("", text))
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+def format_pages(texts: List[str]) -> str:
+    """Page texts -> one document with "--- Page n ---" headers (a single join)"""
+    text = "".join(f"--- Page {number} ---\n{page}\n\n" for number, page in enumerate(texts, start=1))
+    return text if text.strip() else "No readable text found"
+
+
+# ----- extractors -----
+
+@extractor("pdf")
+def iter_pdf_pages(path: str, metadata: Dict, pages: Optional[PageRanges] = None,
+                   max_pages: Optional[int] = None) -> PageIterator:
+    """Only the requested pages are parsed. Raises ExtractionLimit before parsing any if there are too many"""
+    with open(path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        total = len(reader.pages)
+        if max_pages and total > max_pages:
+            raise ExtractionLimit(f"PDF has {total} pages, the limit is {max_pages}")
+        try:
+            info = reader.metadata or {}
+            metadata.update({key: str(info[field]) for key, field in
+                             (("title", "/Title"), ("author", "/Author"), ("subject", "/Subject"),
+                              ("creator", "/Creator"), ("producer", "/Producer"), ("created", "/CreationDate"))
+                             if info.get(field)})
+        except Exception:
+            pass  # broken document info does not stop the text
+        metadata["encrypted"] = reader.is_encrypted
+        for number in page_numbers(pages, total):
+            yield number, total, reader.pages[number - 1].extract_text()
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DOCX_PROPERTIES = {
+    "{http://purl.org/dc/elements/1.1/}title": "title",
+    "{http://purl.org/dc/elements/1.1/}creator": "author",
+    "{http://purl.org/dc/elements/1.1/}subject": "subject",
+    "{http://schemas.openxmlformats.org/package/2006/metadata/core-properties}lastModifiedBy": "modified_by",
+    "{http://purl.org/dc/terms/}created": "created",
+    "{http://purl.org/dc/terms/}modified": "modified",
+    "{http://schemas.openxmlformats.org/officeDocument/2006/extended-properties}Application": "creator",
+    "{http://schemas.openxmlformats.org/officeDocument/2006/extended-properties}Pages": "rendered_pages",
+}
+
+
+def _docx_properties(archive: zipfile.ZipFile) -> Dict:
+    properties = {}
+    for name in ("docProps/core.xml", "docProps/app.xml"):
+        try:
+            info = archive.getinfo(name)
+        except KeyError:
+            continue
+        if info.file_size > 1024 * 1024:
+            continue
+        for element in ET.fromstring(archive.read(info)):
+            if element.tag in _DOCX_PROPERTIES and element.text:
+                properties[_DOCX_PROPERTIES[element.tag]] = element.text.strip()
+    return properties
+
+
+@extractor("docx")
+def iter_docx_pages(path: str, metadata: Dict, pages: Optional[PageRanges] = None,
+                    max_pages: Optional[int] = None) -> PageIterator:
+    """Streams word/document.xml: runs of text, tabs and breaks; a page ends at each page break"""
+    with zipfile.ZipFile(path) as archive:
+        try:
+            info = archive.getinfo("word/document.xml")
+        except KeyError:
+            raise ValueError("Not a Word document (no word/document.xml)") from None
+        if info.file_size > DOCX_MAX_XML_BYTES:
+            raise ExtractionLimit(f"Document XML is {info.file_size} bytes, the limit is {DOCX_MAX_XML_BYTES}")
+        metadata.update(_docx_properties(archive))
+        # Word's page count when the file was last saved: an estimate until the end is reached
+        total = int(metadata["rendered_pages"]) if metadata.get("rendered_pages", "").isdigit() else None
+
+        number, parts, depth, body = 1, [], 0, None
+        with archive.open(info) as xml:
+            for event, element in ET.iterparse(xml, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if element.tag == _W + "body":
+                        body = element
+                    continue
+                depth -= 1
+                tag = element.tag
+                if tag == _W + "t":
+                    parts.append(element.text or "")
+                elif tag == _W + "tab" or tag == _W + "tc":
+                    parts.append("\t")
+                elif tag == _W + "cr" or tag == _W + "p" or tag == _W + "tr":
+                    parts.append("\n")
+                elif tag == _W + "br" and element.get(_W + "type") != "page":
+                    parts.append("\n")
+                if (tag == _W + "br" and element.get(_W + "type") == "page") or tag == _W + "lastRenderedPageBreak":
+                    # Both mark the same break when Word saved after paginating: skip empty pages
+                    if "".join(parts).strip():
+                        if _wanted(number, pages):
+                            yield number, total and max(total, number), "".join(parts)
+                        number, parts = number + 1, []
+                if depth == 2 and body is not None:
+                    body.clear()  # a finished top-level paragraph or table: free it
+        if "".join(parts).strip() or number == 1:
+            if _wanted(number, pages):
+                yield number, number, "".join(parts)
+
+
+def detect_encoding(sample: bytes) -> str:
+    """Guess the encoding of text from its first bytes"""
+    for bom, encoding in ((codecs.BOM_UTF32_LE, "utf-32"), (codecs.BOM_UTF32_BE, "utf-32"),
+                          (codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"),
+                          (codecs.BOM_UTF16_BE, "utf-16")):
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # final=False: the sample may end inside a multi-byte character
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    # Mostly-ASCII UTF-16 without a BOM: every other byte is zero
+    if len(sample) >= 4:
+        if sample[1::2].count(0) > len(sample) // 4:
+            return "utf-16-le"
+        if sample[0::2].count(0) > len(sample) // 4:
+            return "utf-16-be"
+    if detect_charset is not None:
+        best = detect_charset(sample).best()
+        if best is not None:
+            return best.encoding
+    return "cp1252"
+
+
+@extractor("txt")
+def iter_text_pages(path: str, metadata: Dict, pages: Optional[PageRanges] = None,
+                    max_pages: Optional[int] = None) -> PageIterator:
+    """Decodes the file chunk by chunk; a page ends at each form feed (\\f)"""
+    with open(path, "rb") as f:
+        chunk = f.read(TEXT_CHUNK_SIZE)
+        metadata["encoding"] = encoding = detect_encoding(chunk)
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        number, buffer = 1, ""
+        while chunk:
+            buffer += decoder.decode(chunk)
+            *finished, buffer = buffer.split("\f")
+            for text in finished:
+                if _wanted(number, pages):
+                    yield number, None, text
+                number += 1
+            chunk = f.read(TEXT_CHUNK_SIZE)
+        buffer += decoder.decode(b"", final=True)
+        if _wanted(number, pages):
+            yield number, number, buffer
+
+
+def iter_document_pages(path: str, kind: str, pages: Optional[PageRanges] = None,
+                        max_pages: Optional[int] = None, max_chars: Optional[int] = None,
+                        metadata: Optional[Dict] = None) -> PageIterator:
+    """
+    Normalized (page number, page count or None, text) of a document, one page at a time.
+    metadata (a dict) receives what the file says about itself plus pages, characters and words
+    at the end. Raises ExtractionLimit over max_pages; text beyond max_chars is cut off.
+    """
+    if kind not in EXTRACTORS:
+        raise ValueError(f"No text extractor for {kind!r} files")
+    metadata = {} if metadata is None else metadata
+    metadata["kind"] = kind
+    count = characters = words = 0
+    for number, total, text in EXTRACTORS[kind](path, metadata, pages, max_pages):
+        if max_pages and number > max_pages:
+            raise ExtractionLimit(f"Document has more than {max_pages} pages")
+        text = normalize_text(text)
+        if max_chars and characters + len(text) > max_chars:
+            text = text[:max_chars - characters]
+            metadata["truncated"] = True
+        count += 1
+        characters += len(text)
+        words += len(text.split())
+        metadata.update(pages=count, characters=characters, words=words)
+        yield number, total, text
+        if metadata.get("truncated"):
+            return
+    metadata.update(pages=count, characters=characters, words=words)
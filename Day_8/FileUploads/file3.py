@@ -1,9 +1,25 @@
-from flask import Flask, request, render_template_string, redirect, url_for, flash, jsonify
+from flask import Flask, Response, request, render_template_string, redirect, url_for, flash, jsonify
 import os
+import re
+import json
+import time
+import click
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from werkzeug.utils import secure_filename
-import PyPDF2
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 import logging
 from datetime import datetime
+from blob_store import BlobStore
+from downloads import send_stored_file
+from extraction_jobs import TextExtractor
+from extractors import EXTRACTOR_VERSION, ExtractionLimit, kind_for, parse_page_ranges
+from resumable import ResumableUploads, SessionError
+from search_index import BackgroundIndexer, SearchIndex
+from text_cache import TextCache
+from thumbnails import ThumbnailGenerator, is_image
+from streaming_upload import UploadRejected, stream_upload
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,19 +31,95 @@ UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Uploads are stored by content hash: identical files are kept once (uploads/blobs/ab/cd/<sha256>)
+# and logical filenames map to them through uploads/files.db
+BLOB_LAYOUT = "hash"      # "hash" (fan-out by hash prefix), "date" (one folder per day) or "flat"
+BLOB_HASH_LEVELS = 2      # hash layout: 2 levels of 256 folders each
+store = BlobStore(UPLOAD_FOLDER, layout=BLOB_LAYOUT, hash_levels=BLOB_HASH_LEVELS)
+# Not in the extraction worker processes: they re-import this file as __mp_main__ when it runs as a script
+if __name__ != '__mp_main__':
+    imported = store.import_folder()
+    if imported:
+        logger.info(f"Moved {imported} existing uploads into the blob store")
+    # Blobs stored under another layout move over in the background; both paths resolve meanwhile
+    threading.Thread(target=store.migrate, daemon=True, name="blob-migration").start()
+
 # Security configurations
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx'}
 
+# Text extraction (pdf, docx, txt) runs on a process pool, not in the upload request
+EXTRACT_WORKERS = 2
+EXTRACT_TIMEOUT = 60            # seconds per file
+EXTRACT_MAX_PAGES = 2000
+EXTRACT_MAX_CHARS = 10_000_000  # text beyond this is not extracted or indexed
+EXTRACT_MAX_MEMORY_MB = 512     # per worker process (Unix only)
+# Extracted text is cached by content hash, so re-uploads and re-views skip parsing
+TEXT_CACHE_FOLDER = os.path.join(UPLOAD_FOLDER, 'text-cache')
+TEXT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+text_cache = TextCache(TEXT_CACHE_FOLDER, max_bytes=TEXT_CACHE_MAX_BYTES, version=EXTRACTOR_VERSION)
+extractor = TextExtractor(max_workers=EXTRACT_WORKERS, timeout=EXTRACT_TIMEOUT, max_pages=EXTRACT_MAX_PAGES,
+                          max_chars=EXTRACT_MAX_CHARS, max_memory_mb=EXTRACT_MAX_MEMORY_MB, cache=text_cache)
+
+# Resumable uploads: any size, sent in chunks of up to RESUMABLE_CHUNK_SIZE
+RESUMABLE_MAX_SIZE = 10 * 1024 ** 3   # 10GB
+RESUMABLE_CHUNK_SIZE = 8 * 1024 * 1024
+RESUMABLE_EXPIRY = 24 * 3600          # seconds without a chunk before a session is dropped
+SHA256_HEX = re.compile(r'[0-9a-fA-F]{64}')
+sessions = ResumableUploads(UPLOAD_FOLDER, max_size=RESUMABLE_MAX_SIZE, expiry=RESUMABLE_EXPIRY)
+
+# Full-text search: extracted text is indexed per page (SQLite FTS5) on a background thread
+SEARCH_DB = os.path.join(UPLOAD_FOLDER, 'search.db')
+search_index = SearchIndex(SEARCH_DB)
+indexer = BackgroundIndexer(search_index)
+
+# Image thumbnails and previews (WebP, several sizes) are made after the upload and kept next to the blob
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600   # named by content hash, so browsers can keep them
+thumbnails = ThumbnailGenerator(store, max_workers=THUMBNAIL_WORKERS)
+
+# Batch uploads: many files in one request (field "files"); each file is stored and its
+# background work started on a thread pool while the rest of the body is still arriving
+BATCH_MAX_SIZE = 512 * 1024 * 1024   # whole request; MAX_CONTENT_LENGTH still applies per file
+BATCH_MAX_FILES = 100
+BATCH_WORKERS = 4
+batch_pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch-upload")
+
+@extractor.on_complete
+def index_extracted_text(job, texts):
+    if job.sha256:
+        indexer.submit(job.sha256, EXTRACTOR_VERSION, lambda: texts, job.name)
+
+def index_file(filename, entry):
+    """
+    Queue a stored document (pdf, docx, txt) for text extraction; the extractor's completion
+    hook indexes the text for search. Returns the extraction job, or None for other files
+    """
+    if kind_for(filename) is None:
+        return None
+    return extractor.submit(store.blob_path(entry['sha256']), filename, sha256=entry['sha256'])
+
+def after_upload(filename, entry):
+    """Background work for a newly stored file: thumbnails for images, text extraction and indexing for documents"""
+    if is_image(filename):
+        thumbnails.submit(entry['sha256'], filename)
+    return index_file(filename, entry)
+
 # Rate limiting - CORRECTED VERSION
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+import rate_limit_storage  # registers the sqlite:// storage scheme
+
+# Counters live in SQLite so every worker process counts against the same limits
+RATELIMIT_DB = os.path.join(UPLOAD_FOLDER, 'ratelimits.db')
 
 # Initialize Limiter correctly
 limiter = Limiter(
     get_remote_address,
     app=app,
-    default_limits=["200 per day", "50 per hour"]
+    default_limits=["200 per day", "50 per hour"],
+    storage_uri=f"sqlite:///{RATELIMIT_DB}",
+    strategy="sliding-window-counter"
 )
 
 HTML_FORM = '''
@@ -59,18 +151,70 @@ HTML_FORM = '''
         <input type="file" name="file" required>
         <input type="submit" value="Upload">
     </form>
+    <form id="batch-form">
+        <input type="file" name="files" multiple required>
+        <input type="submit" value="Upload several files">
+    </form>
+    <ul id="batch-results"></ul>
+    <script>
+        document.getElementById('batch-form').addEventListener('submit', event => {
+            event.preventDefault();
+            const results = document.getElementById('batch-results');
+            results.textContent = '⏳ Uploading...';
+            fetch('/uploads/batch', {method: 'POST', body: new FormData(event.target)})
+                .then(r => r.json()).then(batch => {
+                    results.textContent = batch.error ? `❌ ${batch.error}` : '';
+                    for (const file of batch.files || []) {
+                        const item = document.createElement('li');
+                        item.textContent = file.status === 'stored'
+                            ? `✅ ${file.name} (${file.size} bytes${file.deduplicated ? ', deduplicated' : ''})`
+                            : `❌ ${file.name}: ${file.error}`;
+                        results.appendChild(item);
+                    }
+                })
+                .catch(() => { results.textContent = '❌ Upload failed, please try again later.'; });
+        });
+    </script>
     
-    {% if pdf_content %}
+    {% if filename %}
     <div class="file-info">
         <h3>📁 File Information:</h3>
-        <p><strong>Filename:</strong> {{ filename }}</p>
+        <p><strong>Filename:</strong> <a href="/files/{{ filename }}">{{ filename }}</a></p>
         <p><strong>Saved at:</strong> {{ file_path }}</p>
         <p><strong>File size:</strong> {{ file_size }} bytes</p>
+        <p><strong>SHA-256:</strong> {{ sha256 }}</p>
+        {% if deduplicated %}<p>♻️ Same content was already stored, no extra disk space used.</p>{% endif %}
+        {% if thumbnail %}<p><a href="{{ preview }}"><img src="{{ thumbnail }}" alt="{{ filename }}"></a></p>{% endif %}
     </div>
+    {% endif %}
+    {% if job_id %}
     <div class="pdf-content">
-        <h3>📄 PDF Content:</h3>
-        <pre>{{ pdf_content }}</pre>
+        <h3>📄 Document text:</h3>
+        <p id="pdf-status">⏳ Extracting text (job {{ job_id }})...</p>
+        <p>Stream it: <a href="/files/{{ filename }}/text">plain text</a> ·
+           <a href="/files/{{ filename }}/text?format=ndjson">NDJSON per page</a>
+           (add <code>&pages=10-20</code> for a page range)</p>
+        <pre id="pdf-text"></pre>
     </div>
+    <script>
+        function pollExtraction() {
+            fetch('/extract/{{ job_id }}').then(r => r.json()).then(job => {
+                const status = document.getElementById('pdf-status');
+                if (job.status === 'completed') {
+                    status.textContent = job.cached ? `✅ ${job.pages_total} pages (from the text cache)`
+                                                    : `✅ ${job.pages_total} pages extracted in ${job.duration}s`;
+                    document.getElementById('pdf-text').textContent = job.text;
+                } else if (job.status === 'failed' || job.status === 'timeout') {
+                    status.textContent = `❌ Extraction ${job.status}: ${job.error}`;
+                } else {
+                    const pages = job.pages_total ? ` page ${job.pages_done}/${job.pages_total}` : '';
+                    status.textContent = `⏳ Extracting text (${job.status}${pages})...`;
+                    setTimeout(pollExtraction, 1500);
+                }
+            });
+        }
+        pollExtraction();
+    </script>
     {% endif %}
 </body>
 </html>
@@ -81,42 +225,12 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def read_pdf_content(filepath):
-    """
-    Extract text content from PDF file
-    Returns: String containing PDF text content
-    """
-    try:
-        with open(filepath, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            text_content = ""
-            
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text_content += f"--- Page {page_num + 1} ---\n"
-                text_content += page.extract_text() + "\n\n"
-            
-            return text_content if text_content.strip() else "No readable text found in PDF"
-    
-    except Exception as e:
-        logger.error(f"Error reading PDF: {str(e)}")
-        return f"Error reading PDF file: {str(e)}"
-
 def get_file_storage_path(filename):
     """
-    Generate secure file storage path
-    You can modify this to organize files in subdirectories
+    Path of the stored content for a logical filename (None if there is no such file)
+    Files with the same content share one blob in the store
     """
-    # Option 1: Store all files in uploads folder
-    base_path = app.config['UPLOAD_FOLDER']
-    
-    # Option 2: Organize by date (uncomment to use)
-    # today = datetime.now().strftime("%Y-%m-%d")
-    # date_folder = os.path.join(base_path, today)
-    # os.makedirs(date_folder, exist_ok=True)
-    # return os.path.join(date_folder, filename)
-    
-    return os.path.join(base_path, filename)
+    return store.path(filename)
 
 @app.after_request
 def add_security_headers(response):
@@ -132,97 +246,521 @@ def upload_form():
     """Display the upload form"""
     return render_template_string(HTML_FORM)
 
+def accept_upload(field, filename):
+    """Called by stream_upload before a file part is read: validate name and type early"""
+    if field != 'file' or not filename:
+        return False
+    if not allowed_file(filename):
+        allowed_types = ', '.join(ALLOWED_EXTENSIONS)
+        raise UploadRejected(f'Invalid file type. Allowed types: {allowed_types}')
+    # Prevent overwriting existing files
+    if store.exists(secure_filename(filename)):
+        raise UploadRejected('File with this name already exists. Please rename your file.')
+    return True
+
 @app.route('/', methods=['POST'])
 @limiter.limit("10 per minute")  # Limit uploads to 10 per minute per IP
 def upload_file():
-    """Handle file upload and PDF processing"""
+    """Handle file upload and document processing"""
     try:
-        # Check if file was submitted
-        if 'file' not in request.files:
+        # Stream the body to disk in chunks (hashing on the way) instead of
+        # letting werkzeug spool it to a temp file that is then copied again
+        _, files = stream_upload(
+            request.stream,
+            request.headers.get('Content-Type', ''),
+            app.config['UPLOAD_FOLDER'],
+            max_file_size=app.config['MAX_CONTENT_LENGTH'],
+            accept=accept_upload
+        )
+
+        # Check if a file was submitted
+        if not files:
             flash('No file selected', 'error')
             return redirect(request.url)
-        
-        file = request.files['file']
-        
-        # Check if file has a filename
-        if file.filename == '':
-            flash('No file selected', 'error')
+
+        upload = files[0]
+        for extra in files[1:]:
+            extra.discard()
+
+        # Secure the filename and store the content (once per hash)
+        filename = secure_filename(upload.filename)
+        try:
+            entry = store.add(filename, upload)
+        except FileExistsError:
+            # Another upload took the name while this one was streaming
+            upload.discard()
+            flash('File with this name already exists. Please rename your file.', 'error')
             return redirect(request.url)
-        
-        # Validate file
-        if file and allowed_file(file.filename):
-            # Secure the filename
-            filename = secure_filename(file.filename)
-            
-            # Generate storage path
-            filepath = get_file_storage_path(filename)
-            
-            # Prevent overwriting existing files
-            if os.path.exists(filepath):
-                flash('File with this name already exists. Please rename your file.', 'error')
-                return redirect(request.url)
-            
-            # Save the file
-            file.save(filepath)
-            logger.info(f"File saved successfully: {filepath}")
-            
-            # Get file information
-            file_size = os.path.getsize(filepath)
-            
-            # Read PDF content if it's a PDF file
-            pdf_content = ""
-            if filename.lower().endswith('.pdf'):
-                pdf_content = read_pdf_content(filepath)
-                flash('PDF uploaded and content extracted successfully!', 'success')
-            else:
-                flash('File uploaded successfully!', 'success')
-            
-            # Display results
-            return render_template_string(HTML_FORM, 
-                                        pdf_content=pdf_content,
-                                        filename=filename,
-                                        file_path=filepath,
-                                        file_size=file_size)
+
+        filepath = get_file_storage_path(filename)
+        logger.info(f"File saved successfully: {filename} -> {filepath} ({upload.size} bytes, "
+                    f"sha256 {upload.sha256}{', deduplicated' if entry['deduplicated'] else ''})")
+
+        # Thumbnails, text extraction and search indexing run in the background;
+        # the page polls /extract/<job_id>
+        job = after_upload(filename, entry)
+        job_id = job.id if job else None
+        if job:
+            flash('Document uploaded, extracting its text in the background.', 'success')
         else:
-            allowed_types = ', '.join(ALLOWED_EXTENSIONS)
-            flash(f'Invalid file type. Allowed types: {allowed_types}', 'error')
-            return redirect(request.url)
-    
+            flash('File uploaded successfully!', 'success')
+
+        # Display results
+        return render_template_string(HTML_FORM,
+                                    job_id=job_id,
+                                    filename=filename,
+                                    file_path=filepath,
+                                    file_size=upload.size,
+                                    sha256=upload.sha256,
+                                    deduplicated=entry['deduplicated'],
+                                    thumbnail=thumbnail_url(filename, entry),
+                                    preview=thumbnail_url(filename, entry, 'preview'))
+
+    except UploadRejected as e:
+        flash(str(e), 'error')
+        return redirect(request.url)
+
+    except RequestEntityTooLarge:
+        raise
+
     except Exception as e:
         logger.error(f"Upload error: {str(e)}")
         flash('An error occurred during file upload.', 'error')
         return redirect(request.url)
 
+def store_batch_file(filename, upload):
+    """Runs on batch_pool: move one received file into the store and start its background work"""
+    try:
+        entry = store.add(filename, upload)
+    except Exception:
+        upload.discard()
+        raise
+    logger.info(f"Batch file saved: {filename} ({upload.size} bytes, sha256 {entry['sha256']}"
+                f"{', deduplicated' if entry['deduplicated'] else ''})")
+    return entry, after_upload(filename, entry)
+
+@app.route('/uploads/batch', methods=['POST'])
+@limiter.limit("5 per minute")
+def upload_batch():
+    """
+    Upload many files in one multipart request (field "files", up to BATCH_MAX_FILES).
+    Each file is checked when its part starts and stored as soon as it is received; one bad
+    file does not fail the others. Returns a manifest in request order with a status per file:
+    stored, rejected, too_large or failed. ?wait=N waits up to N seconds for text extraction
+    """
+    started = time.perf_counter()
+    request.max_content_length = BATCH_MAX_SIZE  # per-request limit: Flask >= 3.1
+    manifest, receiving, futures = [], {}, []
+
+    def reject(item, error, status='rejected'):
+        item.update(status=status, error=error)
+        return False
+
+    def accept(field, filename):
+        if field != 'files' or not filename:
+            return False
+        name = secure_filename(filename)
+        item = {'name': name or filename, 'status': 'receiving'}
+        manifest.append(item)
+        if len(manifest) > BATCH_MAX_FILES:
+            return reject(item, f'Too many files, send at most {BATCH_MAX_FILES} per batch')
+        if not name:
+            return reject(item, 'Invalid file name')
+        if not allowed_file(name):
+            return reject(item, f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}")
+        if name in receiving:
+            return reject(item, 'The same file name appears twice in this batch')
+        if store.exists(name):
+            return reject(item, 'File with this name already exists. Please rename your file.')
+        receiving[name] = item
+        return True
+
+    def on_file(upload):
+        item = receiving[secure_filename(upload.filename)]
+        item['status'] = 'processing'
+        futures.append((item, batch_pool.submit(store_batch_file, item['name'], upload)))
+
+    def on_oversized(upload):
+        limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+        reject(receiving[secure_filename(upload.filename)], f'File too large. Maximum size is {limit_mb}MB.',
+               status='too_large')
+
+    error = None
+    try:
+        stream_upload(request.stream, request.headers.get('Content-Type', ''), app.config['UPLOAD_FOLDER'],
+                      max_file_size=app.config['MAX_CONTENT_LENGTH'], accept=accept,
+                      on_file=on_file, on_oversized=on_oversized)
+    except RequestEntityTooLarge:
+        error = (f'Batch too large, send at most {BATCH_MAX_SIZE // (1024 * 1024)}MB per request', 413)
+    except HTTPException as e:
+        error = (e.description, e.code)
+
+    # Files received before an error are still stored: wait for them so the manifest is complete
+    jobs = []
+    for item, future in futures:
+        try:
+            entry, job = future.result()
+        except FileExistsError:
+            # Another upload took the name while this one was streaming
+            reject(item, 'File with this name already exists. Please rename your file.')
+            continue
+        except Exception as e:
+            logger.error(f"Batch upload error for {item['name']}: {str(e)}")
+            reject(item, 'An error occurred while storing the file.', status='failed')
+            continue
+        item.update(status='stored', size=entry['size'], sha256=entry['sha256'],
+                    deduplicated=entry['deduplicated'], content_type=entry['content_type'],
+                    job_id=job.id if job else None, thumbnail=thumbnail_url(item['name'], entry))
+        if job:
+            jobs.append((item, job))
+    for item in manifest:
+        if item['status'] == 'receiving':
+            reject(item, 'The upload was interrupted', status='failed')
+
+    deadline = time.monotonic() + min(request.args.get('wait', 0, type=float), EXTRACT_TIMEOUT)
+    while time.monotonic() < deadline and not all(job.done() for _, job in jobs):
+        time.sleep(0.1)
+    for item, job in jobs:
+        item['extraction'] = job.status
+
+    stored = sum(1 for item in manifest if item['status'] == 'stored')
+    logger.info(f"Batch upload: {stored} of {len(manifest)} files stored")
+    body = {'files': manifest, 'stored': stored, 'failed': len(manifest) - stored,
+            'took_ms': round((time.perf_counter() - started) * 1000, 2)}
+    if error:
+        return jsonify({'error': error[0], **body}), error[1]
+    if not manifest:
+        return jsonify({'error': 'No files selected (send them in the "files" field)', **body}), 400
+    return jsonify(body), 201 if stored == len(manifest) else 207 if stored else 400
+
+def thumbnail_url(filename, entry, size='thumb'):
+    """URL of an image's rendition (None for other files); it is made on first request if not there yet"""
+    if not is_image(filename):
+        return None
+    return url_for('serve_thumbnail', sha256=entry['sha256'], size=size)
+
 @app.route('/files', methods=['GET'])
 @limiter.limit("30 per minute")  # Limit file listing
 def list_files():
-    """API endpoint to list all uploaded files"""
+    """
+    API endpoint to list uploaded files from the catalog (no directory scan)
+    ?page=1&per_page=50&sort=uploaded_at|name|size|content_type&order=desc|asc
+    Filters: ?name=<substring>&type=application/pdf|image/&min_size=&max_size=&since=&until=
+    """
     try:
-        files = []
-        for filename in os.listdir(app.config['UPLOAD_FOLDER']):
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            if os.path.isfile(filepath):
-                files.append({
-                    'name': filename,
-                    'size': os.path.getsize(filepath),
-                    'upload_time': datetime.fromtimestamp(os.path.getctime(filepath)).isoformat()
-                })
-        return jsonify({'files': files})
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 50, type=int)
+        if page < 1 or not 1 <= per_page <= 500:
+            return jsonify({'error': 'page must be >= 1 and per_page between 1 and 500'}), 400
+        entries, total = store.query(
+            page=page,
+            per_page=per_page,
+            sort=request.args.get('sort', 'uploaded_at'),
+            order=request.args.get('order', 'desc'),
+            name=request.args.get('name'),
+            content_type=request.args.get('type'),
+            min_size=request.args.get('min_size', type=int),
+            max_size=request.args.get('max_size', type=int),
+            since=request.args.get('since'),
+            until=request.args.get('until')
+        )
+        files = [{
+            'name': entry['name'],
+            'size': entry['size'],
+            'content_type': entry['content_type'],
+            'sha256': entry['sha256'],
+            'upload_time': entry['uploaded_at'],
+            'thumbnail': thumbnail_url(entry['name'], entry)
+        } for entry in entries]
+        return jsonify({'files': files, 'total': total, 'page': page, 'per_page': per_page,
+                        'pages': (total + per_page - 1) // per_page})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/files/<filename>', methods=['GET'])
+@limiter.limit("120 per minute")
+def download_file(filename):
+    """
+    Download a stored file: Range/If-Range for partial downloads, ETag (the content hash) and
+    Last-Modified for 304s, sent through the server's file wrapper (sendfile). ?inline=1 to display it
+    """
+    entry = store.get(filename)
+    if entry is None:
+        return jsonify({'error': 'File not found'}), 404
+    return send_stored_file(store.blob_path(entry['sha256']), filename,
+                            mimetype=entry['content_type'],
+                            etag=entry['sha256'],
+                            last_modified=datetime.fromisoformat(entry['uploaded_at']),
+                            as_attachment=not request.args.get('inline'))
+
+@app.route('/thumbnails/<sha256>/<size>.webp', methods=['GET'])
+@limiter.limit("600 per minute")  # a gallery page loads one per image
+def serve_thumbnail(sha256, size):
+    """
+    A thumbnail or preview of a stored image (size: thumb, small or preview). The URL names the
+    content, so it is served as immutable and cached for a year
+    """
+    if not store.names_for([sha256]):
+        return jsonify({'error': 'File not found'}), 404
+    try:
+        path = thumbnails.get(sha256, size)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if path is None:
+        return jsonify({'error': 'No preview for this file'}), 404
+    return send_stored_file(path, f"{sha256[:16]}-{size}.webp", mimetype='image/webp',
+                            etag=f"{sha256}-{size}", as_attachment=False,
+                            max_age=THUMBNAIL_MAX_AGE, immutable=True)
+
+@app.route('/files/<filename>', methods=['DELETE'])
+@limiter.limit("30 per minute")
+def delete_file(filename):
+    """Delete a logical file; its content is removed once no other file shares it"""
+    entry = store.get(filename)
+    if entry is None or not store.delete(filename):
+        return jsonify({'error': 'File not found'}), 404
+    if not store.names_for([entry['sha256']]):
+        search_index.remove(entry['sha256'])  # content is gone, so are its search hits
+    logger.info(f"File deleted: {filename}")
+    return jsonify({'message': f'{filename} deleted'})
+
+@app.route('/files/stats', methods=['GET'])
+@limiter.limit("30 per minute")
+def storage_stats():
+    """Disk space saved by storing identical files once"""
+    return jsonify({**store.stats(), 'text_cache': text_cache.stats(), 'thumbnails': thumbnails.stats(),
+                    'search': {**search_index.stats(), 'pending': indexer.pending}})
+
+@app.route('/files/search', methods=['GET'])
+@limiter.limit("60 per minute")
+def search_files():
+    """Full-text search over uploaded documents: ?q=words (prefix*)&limit=20&offset=0"""
+    query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', 20, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    if not query:
+        return jsonify({'error': 'Missing search query (?q=)'}), 400
+    if not 1 <= limit <= 100 or offset < 0:
+        return jsonify({'error': 'limit must be between 1 and 100 and offset >= 0'}), 400
+
+    started = time.perf_counter()
+    hits = search_index.search(query, limit=limit, offset=offset)
+    names = store.names_for({hit['sha256'] for hit in hits})
+    results = [{
+        'name': names[hit['sha256']][0],
+        'names': names[hit['sha256']],
+        'page': hit['page'],
+        'snippet': hit['snippet'],
+        'score': hit['score']
+    } for hit in hits if hit['sha256'] in names]  # skip content deleted since it was indexed
+    return jsonify({'query': query, 'results': results,
+                    'took_ms': round((time.perf_counter() - started) * 1000, 2),
+                    'pending': indexer.pending})
+
+@app.route('/files/<filename>/text', methods=['GET'])
+@limiter.limit("30 per minute")
+def stream_document_text(filename):
+    """
+    Stream the text of a stored document (pdf, docx, txt) one page at a time
+    ?format=text (default) or ndjson (one JSON object per page), ?pages=10-20,25 to parse only those pages
+    """
+    entry = store.get(filename)
+    if entry is None:
+        return jsonify({'error': 'File not found'}), 404
+    kind = kind_for(filename)
+    if kind is None:
+        return jsonify({'error': 'Text streaming is only available for PDF, Word (docx) and text files'}), 400
+    fmt = request.args.get('format', 'text')
+    if fmt not in ('text', 'ndjson'):
+        return jsonify({'error': 'format must be text or ndjson'}), 400
+    try:
+        pages = parse_page_ranges(request.args.get('pages'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    page_iter = extractor.iter_pages(get_file_storage_path(filename), kind, entry['sha256'], pages)
+    try:
+        # Open the document and parse the first page before the response starts, so errors get a status code
+        first = next(page_iter, None)
+    except ExtractionLimit as e:
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        logger.error(f"Error reading {filename}: {str(e)}")
+        return jsonify({'error': f'Error reading {kind} file: {str(e)}'}), 422
+
+    def generate():
+        try:
+            for number, total, text in chain([first] if first else [], page_iter):
+                if fmt == 'ndjson':
+                    yield json.dumps({'page': number, 'pages': total, 'text': text}) + '\n'
+                else:
+                    yield f"--- Page {number} ---\n{text}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming {filename}: {str(e)}")
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'text/plain'
+    return Response(generate(), mimetype=mimetype)
+
+@app.route('/extract/<job_id>', methods=['GET'])
+@limiter.limit("120 per minute")  # the upload page polls this while extracting
+def extraction_status(job_id):
+    """Progress of a text extraction job, with the text and document metadata once it is completed"""
+    job = extractor.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Extraction job not found'}), 404
+    return jsonify(job.to_dict(include_text=job.status == 'completed'))
+
+@app.route('/uploads', methods=['POST'])
+@limiter.limit("10 per minute")
+def create_upload_session():
+    """Start a resumable upload: {"filename", "size", "sha256" (optional, checked at the end)}"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Send a JSON object with filename and size'}), 400
+    raw_name, size = data.get('filename'), data.get('size')
+    filename = secure_filename(raw_name) if isinstance(raw_name, str) else ''
+    if not filename or not isinstance(size, int) or isinstance(size, bool):
+        return jsonify({'error': 'filename (string) and size (whole bytes) are required'}), 400
+    sha256, content_type = data.get('sha256'), data.get('content_type')
+    if sha256 is not None and not (isinstance(sha256, str) and SHA256_HEX.fullmatch(sha256)):
+        return jsonify({'error': 'sha256 must be 64 hex characters'}), 400
+    if content_type is not None and not isinstance(content_type, str):
+        return jsonify({'error': 'content_type must be a string'}), 400
+    try:
+        accept_upload('file', filename)
+        session = sessions.create(filename, size, content_type=content_type, sha256=sha256)
+    except UploadRejected as e:
+        return jsonify({'error': str(e)}), 400
+    except SessionError as e:
+        return jsonify({'error': str(e)}), e.status
+    logger.info(f"Resumable upload started: {filename} ({size} bytes, session {session['id']})")
+    return jsonify({**session, 'chunk_size': RESUMABLE_CHUNK_SIZE}), 201
+
+@app.route('/uploads/<session_id>', methods=['GET'])
+@limiter.limit("600 per minute")
+def upload_session_status(session_id):
+    """Received ranges and the offset to resume from after a dropped connection"""
+    try:
+        return jsonify(sessions.get(session_id))
+    except SessionError as e:
+        return jsonify({'error': str(e)}), e.status
+
+@app.route('/uploads/<session_id>', methods=['PUT'])
+@limiter.limit("600 per minute")  # one request per chunk
+def upload_chunk(session_id):
+    """Write the request body at ?offset=N (optional X-Chunk-SHA256 header with its hex digest)"""
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'offset is required'}), 400
+    if request.content_length is None:
+        return jsonify({'error': 'Content-Length is required'}), 411
+    if request.content_length > RESUMABLE_CHUNK_SIZE:
+        return jsonify({'error': f'Chunk too large, send at most {RESUMABLE_CHUNK_SIZE} bytes per request'}), 413
+    try:
+        session = sessions.write_chunk(session_id, offset, request.stream, request.content_length,
+                                       checksum=request.headers.get('X-Chunk-SHA256'))
+    except SessionError as e:
+        return jsonify({'error': str(e)}), e.status
+    return jsonify(session)
+
+@app.route('/uploads/<session_id>/complete', methods=['POST'])
+@limiter.limit("10 per minute")
+def complete_upload(session_id):
+    """Verify the file and move it into the store in one step"""
+    try:
+        finished = sessions.finish(session_id)
+    except SessionError as e:
+        return jsonify({'error': str(e)}), e.status
+    try:
+        entry = store.add_file(finished['filename'], finished['path'],
+                               content_type=finished['content_type'], sha256=finished['sha256'])
+    except FileExistsError:
+        sessions.release(session_id)
+        return jsonify({'error': 'File with this name already exists.'}), 409
+    except Exception:
+        sessions.release(session_id)
+        raise
+    sessions.remove(session_id)
+    logger.info(f"Resumable upload finished: {entry['name']} ({entry['size']} bytes, sha256 {entry['sha256']}"
+                f"{', deduplicated' if entry['deduplicated'] else ''})")
+    job = after_upload(entry['name'], entry)
+    return jsonify({**entry, 'job_id': job.id if job else None,
+                    'thumbnail': thumbnail_url(entry['name'], entry)}), 201
+
+@app.route('/uploads/<session_id>', methods=['DELETE'])
+@limiter.limit("30 per minute")
+def abort_upload(session_id):
+    """Cancel a resumable upload and free its space"""
+    if not sessions.remove(session_id):
+        return jsonify({'error': 'Upload session not found'}), 404
+    return jsonify({'message': 'Upload cancelled'})
+
+@app.cli.command("reconcile")
+@click.option('--prune', is_flag=True, help='Also delete blobs that no filename points at and '
+                                            'copies left behind by an interrupted migration')
+def reconcile_catalog(prune):
+    """Rebuild the upload catalog from the files on disk"""
+    report = store.reconcile(prune=prune)
+    for key, value in report.items():
+        print(f"{key:>16}: {value}")
+
+@app.cli.command("migrate-blobs")
+@click.option('--grace', default=5.0, help='Seconds before an old blob path is removed')
+def migrate_blobs(grace):
+    """Move every blob to the configured layout (BLOB_LAYOUT)"""
+    report = store.migrate(grace=grace)
+    print(f"Checked {report['checked']} blobs, moved {report['moved']} to the {BLOB_LAYOUT} layout "
+          f"({report['failed']} failed)")
+
+@app.cli.command("thumbnails")
+def make_thumbnails():
+    """Make the missing thumbnails and previews of every stored image"""
+    futures = [thumbnails.submit(entry['sha256'], entry['name']) for entry in store.list() if is_image(entry['name'])]
+    for future in futures:
+        try:
+            future.result()
+        except Exception:
+            pass  # logged by the generator
+    print(f"Checked {len(futures)} images: {thumbnails.generated} rendered, {thumbnails.failed} failed")
+    thumbnails.shutdown()
+
+@app.cli.command("reindex")
+def reindex_files():
+    """Index every stored document (pdf, docx, txt) that is not in the search index yet"""
+    jobs = []
+    for entry in store.list():
+        if kind_for(entry['name']) and not search_index.has(entry['sha256'], EXTRACTOR_VERSION):
+            jobs.append(index_file(entry['name'], entry))
+    print(f"Queued {len(jobs)} documents for extraction")
+    while not all(job.done() for job in jobs):
+        time.sleep(0.5)
+    indexer.join()
+    print(f"Indexed {indexer.indexed} documents ({indexer.failed} failed): {search_index.stats()}")
+    extractor.shutdown()
+
 # Error handlers
+# JSON API routes: errors are answered in JSON, not with a flash message and a redirect
+API_PATHS = ('/uploads', '/files', '/thumbnails', '/extract')
+
 @app.errorhandler(413)
 def too_large(e):
+    if request.path == '/uploads/batch':
+        return jsonify({'error': f'Batch too large, send at most {BATCH_MAX_SIZE // (1024 * 1024)}MB per request'}), 413
+    if request.path.startswith(API_PATHS):
+        return jsonify({'error': f"Request too large, send at most {app.config['MAX_CONTENT_LENGTH']} bytes"}), 413
     flash('File too large. Maximum size is 16MB.', 'error')
     return redirect(request.url)
 
 @app.errorhandler(429)
 def ratelimit_handler(e):
+    if request.path.startswith(API_PATHS):
+        return jsonify({'error': f'Too many requests ({e.description}), please try again later'}), 429
     flash('Too many upload attempts. Please try again later.', 'error')
     return redirect(request.url)
 
 if __name__ == '__main__':
-    # Install required packages: pip install flask werkzeug PyPDF2 flask-limiter
+    # Install required packages: pip install "flask>=3.1" werkzeug PyPDF2 "flask-limiter>=3.10" pillow
     print("📁 Upload folder location:", os.path.abspath(UPLOAD_FOLDER))
     app.run(debug=False, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""
+Rate-limit storage shared by all worker processes (SQLite in WAL mode).
+
+flask-limiter's default storage is a dict in each process, so with N
+gunicorn workers every client really gets N times the configured limit.
+Importing this module registers a "sqlite" storage scheme with limits:
+
+    limiter = Limiter(get_remote_address, app=app,
+                      storage_uri="sqlite:///uploads/ratelimits.db",   # sqlite:////abs/path for an absolute one
+                      strategy="sliding-window-counter")
+
+One table holds every counter, keyed like the other limits storages:
+
+    counters  key -> count, expires_at
+
+The sliding window counter keeps one counter per window and weights the
+previous window by how much of it still overlaps the last `expiry` seconds.
+A check-and-increment is one short BEGIN IMMEDIATE transaction, so two
+processes can never both take the last slot. Counters are not worth an
+fsync: synchronous=OFF keeps a hit in the tens of microseconds, and an OS
+crash can at worst forget the last few hits. Expired counters are deleted
+every cleanup_interval seconds by whichever request notices first.
+
+bench_ratelimit.py measures the cost per check against the in-memory storage.
+"""
+import os
+import sqlite3
+import threading
+import time
+from math import floor
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """Fixed and sliding window counters in one SQLite file (one connection per thread and process)"""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False,
+                 cleanup_interval: float = 60, **options):
+        # sqlite:///relative/path.db or sqlite:////absolute/path.db, as in SQLAlchemy
+        self.database = urlparse(uri).path[1:] if uri else "ratelimits.db"
+        if not self.database:
+            raise ValueError(f"No database path in {uri!r}")
+        self.cleanup_interval = float(cleanup_interval)
+        self._next_cleanup = time.time() + self.cleanup_interval
+        self._local = threading.local()
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS counters (
+                key TEXT PRIMARY KEY,
+                count INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_counters_expires_at ON counters (expires_at)')
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        # A connection must not cross a fork (gunicorn --preload): reopen it in the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _maybe_cleanup(self, now: float):
+        if now >= self._next_cleanup:
+            self._next_cleanup = now + self.cleanup_interval
+            self.expire(now)
+
+    def _incr(self, conn, key: str, expiry: float, amount: int, now: float) -> int:
+        # One statement, so atomic on its own: restart the counter if it expired, otherwise add to it
+        return conn.execute('''
+            INSERT INTO counters (key, count, expires_at) VALUES (?1, ?2, ?3 + ?4)
+            ON CONFLICT (key) DO UPDATE SET
+                count = CASE WHEN expires_at <= ?3 THEN excluded.count ELSE count + excluded.count END,
+                expires_at = CASE WHEN expires_at <= ?3 THEN excluded.expires_at ELSE expires_at END
+            RETURNING count
+        ''', (key, amount, now, expiry)).fetchone()[0]
+
+    # ----- fixed window -----
+
+    def incr(self, key: str, expiry: float, amount: int = 1) -> int:
+        now = time.time()
+        self._maybe_cleanup(now)
+        return self._incr(self._connect(), key, expiry, amount, now)
+
+    def get(self, key: str) -> int:
+        row = self._connect().execute('SELECT count FROM counters WHERE key = ? AND expires_at > ?',
+                                      (key, time.time())).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        now = time.time()
+        row = self._connect().execute('SELECT expires_at FROM counters WHERE key = ? AND expires_at > ?',
+                                      (key, now)).fetchone()
+        return row[0] if row else now
+
+    def clear(self, key: str) -> None:
+        self._connect().execute('DELETE FROM counters WHERE key = ?', (key,))
+
+    # ----- sliding window counter -----
+
+    def _window(self, conn, key: str, expiry: int, now: float) -> Tuple[str, int, float, int, float]:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        counts = dict(conn.execute('SELECT key, count FROM counters WHERE key IN (?, ?) AND expires_at > ?',
+                                   (previous_key, current_key, now)))
+        previous_count = counts.get(previous_key, 0)
+        current_count = counts.get(current_key, 0)
+        # Seconds of the previous window still inside the sliding window, and until the current one ends
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return current_key, previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        self._maybe_cleanup(now)
+        conn = self._connect()
+        # BEGIN IMMEDIATE: the check and the increment happen under one write lock across processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current_key, previous_count, previous_ttl, current_count, _ = self._window(conn, key, expiry, now)
+            acquired = floor(previous_count * previous_ttl / expiry + current_count) + amount <= limit
+            if acquired:
+                # The current window's counter is needed until the end of the next window
+                self._incr(conn, current_key, 2 * expiry, amount, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return acquired
+
+    def get_sliding_window(self, key: str, expiry: int) -> Tuple[int, float, int, float]:
+        return self._window(self._connect(), key, expiry, time.time())[1:]
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self._connect().execute('DELETE FROM counters WHERE key IN (?, ?)', (previous_key, current_key))
+
+    # ----- maintenance -----
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Delete expired counters. Returns how many"""
+        return self._connect().execute('DELETE FROM counters WHERE expires_at <= ?',
+                                       (now or time.time(),)).rowcount
+
+    def check(self) -> bool:
+        try:
+            self._connect().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        return self._connect().execute('DELETE FROM counters').rowcount
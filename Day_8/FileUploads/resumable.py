@@ -0,0 +1,269 @@
+"""
+Resumable uploads in chunks, for files of any size.
+
+    POST   /uploads                 {"filename", "size", "sha256"?}  -> session id
+    PUT    /uploads/<id>?offset=N   chunk bytes (X-Chunk-SHA256: hex digest, optional)
+    GET    /uploads/<id>            received ranges and the contiguous offset to resume from
+    POST   /uploads/<id>/complete   verify and move the file into the store atomically
+    DELETE /uploads/<id>            abort
+
+A session owns one sparse file, "<folder>/.resumable-<id>.part", created at
+its final size. Each chunk is streamed from the request in small pieces and
+written at its offset, so memory use does not depend on file or chunk size.
+Chunks may arrive in any order or in parallel. The byte ranges received
+are kept in SQLite, so sessions survive restarts and are shared by all
+worker processes. A chunk whose checksum does not match is not recorded and
+can simply be sent again; if it overwrote bytes received earlier, that range
+is no longer recorded either, so finish() never accepts the damaged bytes.
+Sessions count the chunks being written; finish() waits for none and then
+marks the session "finishing", after which no chunk or second finish is
+accepted, so the bytes hashed are the bytes moved into the store. (A worker
+that dies in the middle of a chunk leaves the count up until the session
+expires.)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+PIECE_SIZE = 1024 * 1024
+
+
+class SessionError(Exception):
+    """A request the session cannot accept; status is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def merge_ranges(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Add [start, end) to sorted, non-overlapping ranges"""
+    merged = []
+    for low, high in sorted(ranges + [[start, end]]):
+        if merged and low <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], high)
+        else:
+            merged.append([low, high])
+    return merged
+
+
+def subtract_ranges(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """Remove [start, end) from sorted, non-overlapping ranges"""
+    remaining = []
+    for low, high in ranges:
+        if low < start:
+            remaining.append([low, min(high, start)])
+        if high > end:
+            remaining.append([max(low, end), high])
+    return remaining
+
+
+class ResumableUploads:
+    """Upload sessions in SQLite (WAL mode, one connection per thread) plus their sparse part files"""
+
+    def __init__(self, folder: str, database: Optional[str] = None,
+                 max_size: int = 10 * 1024 ** 3, expiry: float = 24 * 3600):
+        self.folder = folder
+        self.database = database or os.path.join(folder, "sessions.db")
+        self.max_size = max_size
+        self.expiry = expiry
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                content_type TEXT,
+                sha256 TEXT,
+                received TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                state TEXT NOT NULL DEFAULT 'open',
+                writing INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        columns = {row["name"] for row in conn.execute('PRAGMA table_info(sessions)')}
+        if "state" not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN state TEXT NOT NULL DEFAULT 'open'")
+        if "writing" not in columns:
+            conn.execute('ALTER TABLE sessions ADD COLUMN writing INTEGER NOT NULL DEFAULT 0')
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def part_path(self, session_id: str) -> str:
+        return os.path.join(self.folder, f".resumable-{session_id}.part")
+
+    def _describe(self, row) -> Dict:
+        received = json.loads(row["received"])
+        # Where a sequential client resumes: the end of the range starting at 0
+        offset = received[0][1] if received and received[0][0] == 0 else 0
+        return {
+            "id": row["id"],
+            "filename": row["filename"],
+            "size": row["size"],
+            "offset": offset,
+            "received": received,
+            "received_bytes": sum(high - low for low, high in received),
+            "complete": received == [[0, row["size"]]] or row["size"] == 0,
+            "state": row["state"],
+            "expires_at": row["updated_at"] + self.expiry,
+        }
+
+    def _row(self, session_id: str):
+        row = self._connect().execute('SELECT * FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        if row is None:
+            raise SessionError("Upload session not found", 404)
+        return row
+
+    # ----- API -----
+
+    def create(self, filename: str, size: int, content_type: Optional[str] = None,
+               sha256: Optional[str] = None) -> Dict:
+        if size < 0:
+            raise SessionError("size must be >= 0")
+        if size > self.max_size:
+            raise SessionError(f"File too large, the limit is {self.max_size} bytes", 413)
+        self.expire()
+        session_id = uuid.uuid4().hex
+        # A sparse file at its final size: chunks are written in place, unwritten ranges take no disk
+        with open(self.part_path(session_id), "wb") as f:
+            f.truncate(size)
+        now = time.time()
+        self._connect().execute(
+            'INSERT INTO sessions (id, filename, size, content_type, sha256, received, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (session_id, filename, size, content_type, sha256.lower() if sha256 else None, "[]", now, now))
+        return self.get(session_id)
+
+    def get(self, session_id: str) -> Dict:
+        return self._describe(self._row(session_id))
+
+    def write_chunk(self, session_id: str, offset: int, stream, length: int,
+                    checksum: Optional[str] = None) -> Dict:
+        """Write `length` bytes read from `stream` at `offset`; recorded only if complete and the checksum matches"""
+        row = self._row(session_id)
+        if offset < 0 or offset + length > row["size"]:
+            raise SessionError(f"Chunk {offset}-{offset + length} is outside the file (size {row['size']})", 416)
+
+        self._update(session_id, self._start_writing)
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            try:
+                f = open(self.part_path(session_id), "r+b")
+            except FileNotFoundError:
+                raise SessionError("Upload session not found", 404)
+            with f:
+                f.seek(offset)
+                while written < length:
+                    piece = stream.read(min(PIECE_SIZE, length - written))
+                    if not piece:
+                        break
+                    f.write(piece)
+                    digest.update(piece)
+                    written += len(piece)
+            if written != length:
+                raise SessionError(f"Chunk ended after {written} of {length} bytes, send it again")
+            if checksum and digest.hexdigest() != checksum.lower():
+                raise SessionError("Chunk checksum does not match, send it again", 422)
+        except Exception:
+            # A resend of a range received earlier has overwritten good bytes: that range is missing again
+            self._end_writing(session_id, lambda received: subtract_ranges(received, offset, offset + written)
+                              if written else received)
+            raise
+
+        self._end_writing(session_id, lambda received: merge_ranges(received, offset, offset + length)
+                          if length else received)
+        return self.get(session_id)
+
+    def _update(self, session_id: str, change) -> Dict:
+        """Apply change(row) -> {column: value} to one session; BEGIN IMMEDIATE makes it one step for all processes"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            fields = change(self._row(session_id))
+            fields["updated_at"] = time.time()
+            conn.execute(f'UPDATE sessions SET {", ".join(f"{key} = ?" for key in fields)} WHERE id = ?',
+                         (*fields.values(), session_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return fields
+
+    @staticmethod
+    def _start_writing(row) -> Dict:
+        if row["state"] != "open":
+            raise SessionError("Upload is being completed, no more chunks are accepted", 409)
+        return {"writing": row["writing"] + 1}
+
+    def _end_writing(self, session_id: str, change):
+        self._update(session_id, lambda row: {"received": json.dumps(change(json.loads(row["received"]))),
+                                              "writing": row["writing"] - 1})
+
+    def _start_finishing(self, row) -> Dict:
+        if row["state"] != "open":
+            raise SessionError("Upload is already being completed", 409)
+        if row["writing"]:
+            raise SessionError("Chunks are still being written, try again when they are done", 409)
+        session = self._describe(row)
+        if not session["complete"]:
+            missing = session["size"] - session["received_bytes"]
+            raise SessionError(f"Upload incomplete: {missing} bytes missing", 409)
+        return {"state": "finishing"}
+
+    def finish(self, session_id: str) -> Dict:
+        """
+        Check that every byte arrived and the whole-file hash matches the one declared at creation.
+        Returns the session with "path" (the part file) and "sha256"; the caller moves the file
+        into place and then calls remove(), or release() if it could not.
+        """
+        self._update(session_id, self._start_finishing)
+        row = self._row(session_id)
+        path = self.part_path(session_id)
+        digest = hashlib.sha256()
+        try:
+            with open(path, "rb") as f:
+                for piece in iter(lambda: f.read(PIECE_SIZE), b""):
+                    digest.update(piece)
+        except FileNotFoundError:
+            self.release(session_id)
+            raise SessionError("Upload data is gone, start a new upload", 410)
+        if row["sha256"] and digest.hexdigest() != row["sha256"]:
+            self.release(session_id)
+            raise SessionError("File checksum does not match the sha256 given when the upload started", 422)
+        return {**self._describe(row), "path": path, "sha256": digest.hexdigest(),
+                "content_type": row["content_type"]}
+
+    def release(self, session_id: str):
+        """Reopen a session whose completion failed, so chunks can be resent or it can be completed again"""
+        self._update(session_id, lambda row: {"state": "open"})
+
+    def remove(self, session_id: str) -> bool:
+        """Forget a session and delete its part file (if it was not moved away)"""
+        deleted = self._connect().execute('DELETE FROM sessions WHERE id = ?', (session_id,)).rowcount
+        if os.path.exists(self.part_path(session_id)):
+            os.remove(self.part_path(session_id))
+        return bool(deleted)
+
+    def expire(self) -> int:
+        """Drop sessions without activity for `expiry` seconds. Returns how many"""
+        rows = self._connect().execute('SELECT id FROM sessions WHERE updated_at < ?',
+                                       (time.time() - self.expiry,)).fetchall()
+        for row in rows:
+            self.remove(row["id"])
+        return len(rows)
@@ -0,0 +1,187 @@
+"""
+Full-text search over extracted document text (SQLite FTS5).
+
+Text is indexed per page and per content hash, so duplicate uploads are
+indexed once and hits carry page numbers:
+
+    documents  id, sha256 -> pages, extractor version, indexed_at
+    pages      FTS5 (text), porter stemming, ranked by bm25;
+               rowid = document id * PAGE_SLOTS + page number
+
+Encoding the document in the rowid lets re-indexing and removal delete a
+document's pages by rowid range, instead of scanning the whole table.
+
+Indexing is incremental: content that is already indexed with the same
+extractor version is skipped. BackgroundIndexer runs it on a thread that is
+fed from the upload pipeline, so uploads never wait for the index.
+"""
+import html
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# snippet() markers, replaced by <mark> after the rest of the snippet is HTML-escaped
+_OPEN, _CLOSE = "\x02", "\x03"
+_TERM = re.compile(r'[\w\-\']+\*?', re.UNICODE)
+PAGE_SLOTS = 100_000  # more pages than any indexed document has
+
+
+def make_query(text: str) -> str:
+    """
+    Plain search words -> FTS5 query: every word must match ("pdf parser" -> "pdf" AND "parser").
+    A trailing * keeps prefix search ("extract*"). Other FTS5 syntax is not passed through.
+    """
+    terms = []
+    for term in _TERM.findall(text):
+        prefix = term.endswith("*")
+        word = term.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+class SearchIndex:
+    """FTS5 index of page texts by content hash (WAL mode, one connection per thread)"""
+
+    def __init__(self, database: str):
+        self.database = database
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5("
+                     "text, tokenize = 'porter unicode61', prefix = '2 3 4')")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                sha256 TEXT NOT NULL UNIQUE,
+                pages INTEGER NOT NULL,
+                version TEXT NOT NULL,
+                indexed_at REAL NOT NULL
+            )
+        ''')
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def has(self, sha256: str, version: str) -> bool:
+        row = self._connect().execute('SELECT version FROM documents WHERE sha256 = ?', (sha256,)).fetchone()
+        return row is not None and row[0] == version
+
+    def add(self, sha256: str, texts: List[str], version: str):
+        """(Re)index the page texts of one document in a single transaction"""
+        texts = texts[:PAGE_SLOTS - 1]
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute('SELECT id FROM documents WHERE sha256 = ?', (sha256,)).fetchone()
+            if row:
+                doc_id = row[0]
+                self._delete_pages(conn, doc_id)
+                conn.execute('UPDATE documents SET pages = ?, version = ?, indexed_at = ? WHERE id = ?',
+                             (len(texts), version, time.time(), doc_id))
+            else:
+                doc_id = conn.execute('INSERT INTO documents (sha256, pages, version, indexed_at) VALUES (?, ?, ?, ?)',
+                                      (sha256, len(texts), version, time.time())).lastrowid
+            conn.executemany('INSERT INTO pages (rowid, text) VALUES (?, ?)',
+                             [(doc_id * PAGE_SLOTS + number, text)
+                              for number, text in enumerate(texts, start=1) if text.strip()])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _delete_pages(self, conn, doc_id: int):
+        conn.execute('DELETE FROM pages WHERE rowid BETWEEN ? AND ?',
+                     (doc_id * PAGE_SLOTS, doc_id * PAGE_SLOTS + PAGE_SLOTS - 1))
+
+    def remove(self, sha256: str):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute('SELECT id FROM documents WHERE sha256 = ?', (sha256,)).fetchone()
+            if row:
+                self._delete_pages(conn, row[0])
+                conn.execute('DELETE FROM documents WHERE id = ?', (row[0],))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def search(self, text: str, limit: int = 20, offset: int = 0) -> List[Dict]:
+        """Best matching pages first: [{"sha256", "page", "snippet" (HTML, matches in <mark>), "score"}]"""
+        query = make_query(text)
+        if not query:
+            return []
+        conn = self._connect()
+        rows = conn.execute(
+            f"SELECT rowid, snippet(pages, 0, '{_OPEN}', '{_CLOSE}', ' … ', 16), bm25(pages) "
+            'FROM pages WHERE pages MATCH ? ORDER BY rank LIMIT ? OFFSET ?',
+            (query, limit, offset)
+        ).fetchall()
+        doc_ids = {rowid // PAGE_SLOTS for rowid, _, _ in rows}
+        hashes = dict(conn.execute(
+            f'SELECT id, sha256 FROM documents WHERE id IN ({",".join("?" * len(doc_ids))})', list(doc_ids)))
+        return [{
+            "sha256": hashes[rowid // PAGE_SLOTS],
+            "page": rowid % PAGE_SLOTS,
+            "snippet": html.escape(snippet).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>"),
+            # bm25() is lower-is-better and negative; flip it so higher means more relevant
+            "score": round(-score, 6),
+        } for rowid, snippet, score in rows if rowid // PAGE_SLOTS in hashes]
+
+    def stats(self) -> Dict:
+        conn = self._connect()
+        documents = conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+        pages = conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+        return {"documents": documents, "pages": pages}
+
+
+class BackgroundIndexer:
+    """One daemon thread that indexes documents handed to submit(), skipping content already indexed"""
+
+    def __init__(self, index: SearchIndex):
+        self.index = index
+        self.indexed = 0
+        self.failed = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="search-indexer")
+        self._thread.start()
+
+    def submit(self, sha256: str, version: str, load_texts: Callable[[], List[str]], name: Optional[str] = None):
+        """Queue a document; load_texts() runs on the indexer thread only if it is not indexed yet"""
+        self._queue.put((sha256, version, load_texts, name or sha256))
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            sha256, version, load_texts, name = self._queue.get()
+            try:
+                if not self.index.has(sha256, version):
+                    started = time.time()
+                    texts = load_texts()
+                    self.index.add(sha256, texts, version)
+                    self.indexed += 1
+                    logger.info(f"🔎 Indexed {name} ({len(texts)} pages) in {time.time() - started:.2f}s")
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"❌ Indexing {name} failed: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """Wait until everything queued so far is indexed"""
+        self._queue.join()
@@ -0,0 +1,153 @@
+"""
+Stream multipart uploads straight to disk.
+
+Werkzeug's form parser spools every file part into a temporary file and
+file.save() then copies it to its final place, so each upload is written
+twice. stream_upload() feeds the request body through werkzeug's sans-IO
+MultipartDecoder instead and writes each file part in fixed-size chunks to a
+".part" file inside the upload folder, computing SHA-256 on the way. The size
+limit is checked as the bytes arrive. Moving the finished part file into
+place is a rename on the same filesystem, so the data is written only once.
+
+For batch uploads, on_file() hands over each file as soon as its part is
+complete, so it can be stored and processed while the rest of the body is
+still arriving, and on_oversized() turns a file over the size limit into a
+per-file failure instead of failing the whole request.
+"""
+import hashlib
+import os
+import uuid
+from typing import Callable, Dict, List, Optional, Tuple
+
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+CHUNK_SIZE = 256 * 1024
+MAX_FIELD_SIZE = 64 * 1024  # plain form fields are kept in memory
+
+
+class UploadRejected(ValueError):
+    """The upload was refused before its data was stored (bad name, type, ...)"""
+
+
+class UploadedFile:
+    """A file part written to disk while it was received"""
+
+    def __init__(self, field: str, filename: str, content_type: str, path: str):
+        self.field = field
+        self.filename = filename
+        self.content_type = content_type
+        self.path = path
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = open(path, "wb")
+
+    def write(self, data: bytes):
+        self._file.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def move_to(self, path: str):
+        """Rename the finished file to its final location (same filesystem, no copy)"""
+        self.close()
+        os.replace(self.path, path)
+        self.path = path
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def stream_upload(stream, content_type: str, folder: str, max_file_size: int,
+                  accept: Optional[Callable[[str, str], bool]] = None,
+                  chunk_size: int = CHUNK_SIZE,
+                  on_file: Optional[Callable[[UploadedFile], None]] = None,
+                  on_oversized: Optional[Callable[[UploadedFile], None]] = None) -> Tuple[Dict[str, str], List[UploadedFile]]:
+    """
+    Read a multipart/form-data body from `stream`.
+
+    accept(field, filename) is called when a file part starts, before any of its
+    data is read: return False to skip the part, or raise UploadRejected.
+    on_file(upload) is called as soon as a file part is complete; the caller then
+    owns that file. on_oversized(upload) is called instead of raising
+    RequestEntityTooLarge when a file goes over max_file_size: the part is
+    removed and the rest of its data skipped.
+    Returns (form fields, files written to "<folder>/.upload-*.part"). On any
+    error the part files written so far are removed, except those handed to on_file.
+    """
+    mimetype, options = parse_options_header(content_type)
+    if mimetype != "multipart/form-data" or "boundary" not in options:
+        raise BadRequest("Expected a multipart/form-data upload")
+
+    # No max_form_memory_size: werkzeug applies it to every part, file data included
+    decoder = MultipartDecoder(options["boundary"].encode())
+    fields: Dict[str, str] = {}
+    files: List[UploadedFile] = []
+    handed_over = set()
+    current: Optional[UploadedFile] = None
+    field_name, value = None, bytearray()
+    eof = False
+
+    try:
+        while True:
+            try:
+                event = decoder.next_event()
+            except ValueError:
+                raise BadRequest("The multipart body is malformed")
+            if isinstance(event, NeedData):
+                if eof:
+                    raise BadRequest("Upload ended before the multipart body was complete")
+                chunk = stream.read(chunk_size)
+                eof = not chunk
+                decoder.receive_data(chunk or None)
+            elif isinstance(event, File):
+                # Skipped parts have neither a file nor a field: their data is dropped
+                if accept is None or accept(event.name, event.filename):
+                    part_path = os.path.join(folder, f".upload-{uuid.uuid4().hex}.part")
+                    current = UploadedFile(event.name, event.filename,
+                                           event.headers.get("Content-Type", "application/octet-stream"), part_path)
+                    files.append(current)
+            elif isinstance(event, Field):
+                field_name, value = event.name, bytearray()
+            elif isinstance(event, Data):
+                if current is not None:
+                    current.write(event.data)
+                    if current.size > max_file_size:
+                        if on_oversized is None:
+                            raise RequestEntityTooLarge()
+                        current.discard()
+                        files.remove(current)
+                        on_oversized(current)
+                        current = None  # the rest of this part is dropped like a skipped part
+                elif field_name is not None:
+                    value += event.data
+                    if len(value) > MAX_FIELD_SIZE:
+                        raise RequestEntityTooLarge()
+                if not event.more_data:
+                    if current is not None:
+                        current.close()
+                        if on_file is not None:
+                            handed_over.add(id(current))
+                            on_file(current)
+                    elif field_name is not None:
+                        fields[field_name] = value.decode("utf-8", "replace")
+                    current, field_name = None, None
+            elif isinstance(event, Epilogue):
+                break
+    except Exception:
+        for upload in files:
+            if id(upload) not in handed_over:
+                upload.discard()
+        raise
+
+    return fields, files
@@ -0,0 +1,112 @@
+"""
+On-disk cache of extracted document text.
+
+Entries are keyed by the SHA-256 of the file content plus the extractor
+version, so duplicate uploads share one entry. Changing the extractor makes
+old entries unreachable, and they age out. Each entry is one JSON file with
+the text of every page:
+
+    <folder>/<sha256>-<version>.json    {"version": ..., "pages": n, "texts": [...], "metadata": {...}}
+
+A small SQLite index (WAL mode, shared by all worker processes) records the
+size and last use of each entry. Once the total goes over max_bytes, the
+least recently used entries are removed.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+
+class TextCache:
+    """Extracted page texts by content hash, LRU-evicted under a byte budget"""
+
+    def __init__(self, folder: str, max_bytes: int = 256 * 1024 * 1024, version: str = "1"):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(folder, exist_ok=True)
+        self.database = os.path.join(folder, "index.db")
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)')
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _key(self, sha256: str) -> str:
+        return f"{sha256}-{self.version}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, f"{key}.json")
+
+    def get(self, sha256: str) -> Optional[Dict]:
+        """{"pages": n, "texts": [...], "metadata": {...}} for this content, or None"""
+        key = self._key(sha256)
+        conn = self._connect()
+        if conn.execute('SELECT 1 FROM entries WHERE key = ?', (key,)).fetchone() is None:
+            self.misses += 1
+            return None
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            # Evicted by another process in the meantime, or damaged
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            self.misses += 1
+            return None
+        conn.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+        self.hits += 1
+        return entry
+
+    def put(self, sha256: str, texts: List[str], metadata: Optional[Dict] = None):
+        """Store the page texts (and document metadata) of this content and evict old entries if over budget"""
+        key = self._key(sha256)
+        path = self._path(key)
+        partial = os.path.join(self.folder, f".{key}-{uuid.uuid4().hex}.part")
+        with open(partial, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "pages": len(texts), "texts": texts, "metadata": metadata or {}}, f)
+        os.replace(partial, path)
+        self._connect().execute('INSERT OR REPLACE INTO entries (key, size, last_used) VALUES (?, ?, ?)',
+                                (key, os.path.getsize(path), time.time()))
+        self.evict()
+
+    def evict(self) -> int:
+        """Remove least recently used entries until the cache fits max_bytes. Returns how many"""
+        conn = self._connect()
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        evicted = 0
+        for key, size in conn.execute('SELECT key, size FROM entries ORDER BY last_used').fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+            total -= size
+            evicted += 1
+        return evicted
+
+    def stats(self) -> Dict:
+        entries, size = self._connect().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes, "version": self.version,
+                "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,143 @@
+"""
+Thumbnails and web previews of uploaded images (Pillow).
+
+Every stored image gets one WebP rendition per size, written next to its
+blob as a companion file, so it moves and is deleted with the blob:
+
+    blobs/ab/cd/<sha256>                  the original
+    blobs/ab/cd/<sha256>.thumb.webp       longest edge 160px
+    blobs/ab/cd/<sha256>.small.webp       480px
+    blobs/ab/cd/<sha256>.preview.webp     1280px
+
+Renditions are made after the upload, on a thread pool: Pillow decodes and
+resamples in C with the GIL released, so threads run in parallel without
+the start-up cost of worker processes. JPEGs are decoded directly at a
+reduced scale (Image.draft), and each size is shrunk from the previous,
+larger one instead of from the original. Renditions are named by content
+hash, so they can be served with long-lived, immutable cache headers.
+"""
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+RENDITIONS = {"thumb": 160, "small": 480, "preview": 1280}  # name -> longest edge in pixels
+
+
+def is_image(filename: str) -> bool:
+    return filename.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS
+
+
+def render(source: str, targets: Dict[str, str], sizes: Dict[str, int],
+           quality: int = 80, max_pixels: int = 50_000_000) -> Dict[str, tuple]:
+    """
+    Write a WebP rendition of the image at `source` for every size (name -> longest edge) to
+    targets[name]. Returns name -> (width, height). Raises ValueError for images over max_pixels.
+    """
+    with Image.open(source) as image:
+        if image.width * image.height > max_pixels:
+            raise ValueError(f"Image is {image.width}x{image.height}, the limit is {max_pixels} pixels")
+        largest = max(sizes.values())
+        # JPEG: decode at 1/2, 1/4 or 1/8 scale straight away if that is still large enough
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)  # also loads the first frame of animated GIFs
+        if image.mode not in ("RGB", "RGBA"):
+            transparent = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if transparent else "RGB")
+
+        dimensions = {}
+        for name, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+            image.thumbnail((edge, edge), Image.LANCZOS, reducing_gap=3.0)
+            partial = os.path.join(os.path.dirname(targets[name]), f".{uuid.uuid4().hex}.part")
+            try:
+                image.save(partial, "WEBP", quality=quality, method=4)
+                os.replace(partial, targets[name])
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+            dimensions[name] = image.size
+        return dimensions
+
+
+class ThumbnailGenerator:
+    """Renditions of stored images, made on a thread pool and kept next to their blobs"""
+
+    def __init__(self, store, sizes: Optional[Dict[str, int]] = None, max_workers: int = 2,
+                 quality: int = 80, max_pixels: int = 50_000_000):
+        self.store = store  # blob_store.BlobStore
+        self.sizes = sizes or RENDITIONS
+        self.quality = quality
+        self.max_pixels = max_pixels
+        self.generated = 0
+        self.failed = 0
+        store.companions.update(self.suffix(name) for name in self.sizes)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnails")
+        self._pending: Dict[str, Future] = {}
+        self._unreadable = set()  # content that failed once is not decoded again on every request
+        self._lock = threading.RLock()  # a finished future runs its done callback (_forget) inside submit()
+
+    @staticmethod
+    def suffix(size: str) -> str:
+        return f"{size}.webp"
+
+    def path(self, sha256: str, size: str) -> Optional[str]:
+        """Path of an existing rendition, or None"""
+        path = self.store.companion_path(sha256, self.suffix(size))
+        return path if os.path.exists(path) else None
+
+    def submit(self, sha256: str, name: Optional[str] = None) -> Future:
+        """Make the missing renditions of a stored image in the background (once per content)"""
+        with self._lock:
+            future = self._pending.get(sha256)
+            if future is None:
+                future = self._executor.submit(self._generate, sha256, name or sha256)
+                self._pending[sha256] = future
+                future.add_done_callback(lambda f: self._forget(sha256))
+            return future
+
+    def _forget(self, sha256: str):
+        with self._lock:
+            self._pending.pop(sha256, None)
+
+    def get(self, sha256: str, size: str, timeout: float = 30) -> Optional[str]:
+        """Path of a rendition, waiting for it to be made if needed. None if the image cannot be rendered"""
+        if size not in self.sizes:
+            raise ValueError(f"size must be one of: {', '.join(self.sizes)}")
+        path = self.path(sha256, size)
+        if path is None and sha256 not in self._unreadable:
+            try:
+                self.submit(sha256).result(timeout=timeout)
+            except Exception:
+                return None
+            path = self.path(sha256, size)
+        return path
+
+    def _generate(self, sha256: str, name: str):
+        blob = self.store.blob_path(sha256)
+        targets = {size: self.store.companion_path(sha256, self.suffix(size), blob) for size in self.sizes}
+        if all(os.path.exists(target) for target in targets.values()):
+            return
+        try:
+            dimensions = render(blob, targets, self.sizes, self.quality, self.max_pixels)
+        except Exception as e:
+            self.failed += 1
+            self._unreadable.add(sha256)
+            logger.error(f"❌ Thumbnails of {name} failed: {str(e)}")
+            raise
+        self.generated += 1
+        logger.info(f"🖼️ Made {len(dimensions)} renditions of {name}: "
+                    f"{', '.join(f'{size} {w}x{h}' for size, (w, h) in dimensions.items())}")
+
+    def stats(self) -> Dict:
+        return {"generated": self.generated, "failed": self.failed, "pending": len(self._pending),
+                "sizes": self.sizes}
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)